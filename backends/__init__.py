@@ -0,0 +1,30 @@
+"""
+Networking and scheduling backends.
+
+The rest of the server talks to the event loop through the backend chosen with the --backend option, rather than using a particular library directly:
+
+from backends import backend
+backend.call_from_thread(func, *args)
+
+Every backend module provides:
+name - The name of the backend.
+clock - An object with a callLater method, for passing to Deferred.addTimeout.
+call_later(delay, func, *args, **kwargs) - Call func after delay seconds. Returns an object with active and cancel methods. Must be called from the event loop thread.
+call_from_thread(func, *args, **kwargs) - Call func from the event loop thread. Can be called from any thread.
+looping_call(interval, func) - Call func every interval seconds with the number of intervals which have passed since it was last called. Returns an object with a stop method. Must be called from the event loop thread.
+lookup_name(address, timeout, callback) - Call callback with the host name for address, or None if it cannot be found. Must be called from the event loop thread.
+lookup_address(host, timeout, callback) - Call callback with an address for host, or None if it cannot be found. Must be called from the event loop thread.
+listen(port, factory) - Listen for connections on port, building protocols with the Twisted-style factory. Returns an object with a getHost method.
+add_shutdown_hook(phase, func) - Call func 'before' or 'after' the event loop stops.
+run() - Run the event loop until stop is called.
+stop() - Stop the event loop. Can be called from any thread.
+
+Protocols are always Twisted protocols, so the asyncio backend wraps its transports to look like Twisted ones.
+"""
+
+import options
+
+if options.args.backend == 'asyncio':
+ from backends import asyncio_backend as backend
+else:
+ from backends import twisted_backend as backend
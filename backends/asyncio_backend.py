@@ -0,0 +1,190 @@
+"""
+The asyncio backend.
+
+Uses uvloop if it is installed. Connections are handled by asyncio, with Protocol and Transport adapting them so the server's Twisted protocols work unchanged.
+"""
+
+import asyncio, logging, signal, socket
+from functools import partial
+from twisted.internet.address import IPv4Address, IPv6Address
+from twisted.internet.error import ConnectionDone, ConnectionLost
+from twisted.python.failure import Failure
+
+try:
+ import uvloop
+except ImportError:
+ uvloop = None
+
+logger = logging.getLogger('Asyncio Backend')
+
+name = 'asyncio' if uvloop is None else 'asyncio (uvloop)'
+
+loop = asyncio.new_event_loop() if uvloop is None else uvloop.new_event_loop()
+asyncio.set_event_loop(loop)
+
+shutdown_hooks = {'before': [], 'after': []}
+
+def address(sockaddr):
+ """Convert an address from asyncio into a Twisted address."""
+ host, port = sockaddr[:2]
+ return (IPv6Address if ':' in host else IPv4Address)('TCP', host, port)
+
+class DelayedCall(object):
+ """Looks like Twisted's DelayedCall."""
+ def __init__(self, delay, func, *args, **kwargs):
+  self.called = False
+  self.handle = loop.call_later(delay, self.fire, partial(func, *args, **kwargs))
+ 
+ def fire(self, func):
+  self.called = True
+  func()
+ 
+ def active(self):
+  return not (self.called or self.handle.cancelled())
+ 
+ def cancel(self):
+  self.handle.cancel()
+
+class Clock(object):
+ """Enough of IReactorTime for Deferred.addTimeout."""
+ def callLater(self, delay, func, *args, **kwargs):
+  return call_later(delay, func, *args, **kwargs)
+
+clock = Clock()
+
+class LoopingCall(object):
+ """Calls func every interval seconds, passing the number of intervals since the last call like Twisted's LoopingCall.withCount."""
+ def __init__(self, interval, func):
+  self.interval = interval
+  self.func = func
+  self.started = loop.time()
+  self.count = 0 # The number of intervals which have been accounted for.
+  self.schedule()
+ 
+ def schedule(self):
+  self.handle = loop.call_at(self.started + (self.count + 1) * self.interval, self.fire)
+ 
+ def fire(self):
+  count = max(1, int((loop.time() - self.started) / self.interval) - self.count)
+  self.count += count
+  try:
+   self.func(count)
+  except Exception as e:
+   logger.exception(e)
+  self.schedule()
+ 
+ def stop(self):
+  self.handle.cancel()
+
+class Transport(object):
+ """Makes an asyncio transport look enough like a Twisted TCP transport for the server's protocols."""
+ def __init__(self, transport, protocol):
+  self.transport = transport
+  self.protocol = protocol
+  self.host = address(transport.get_extra_info('sockname'))
+  self.peer = address(transport.get_extra_info('peername'))
+  self.hostname = self.peer.host
+  self.disconnecting = False
+ 
+ def write(self, data):
+  if not self.disconnecting:
+   self.transport.write(data)
+ 
+ def writeSequence(self, data):
+  self.write(b''.join(data))
+ 
+ def loseConnection(self):
+  """Disconnect once everything written so far has been sent."""
+  self.disconnecting = True
+  self.transport.close()
+ 
+ def abortConnection(self):
+  """Disconnect straight away, throwing away anything which hasn't been sent."""
+  self.disconnecting = True
+  self.transport.abort()
+ 
+ def getHost(self):
+  return self.host
+ 
+ def getPeer(self):
+  return self.peer
+
+class Protocol(asyncio.Protocol):
+ """Passes events from asyncio to a protocol built by a Twisted-style factory."""
+ def __init__(self, factory):
+  self.factory = factory
+  self.protocol = None
+ 
+ def connection_made(self, transport):
+  self.protocol = self.factory.buildProtocol(address(transport.get_extra_info('peername')))
+  if self.protocol is None:
+   transport.abort()
+  else:
+   self.protocol.makeConnection(Transport(transport, self.protocol))
+ 
+ def data_received(self, data):
+  self.protocol.dataReceived(data)
+ 
+ def connection_lost(self, exc):
+  if self.protocol is not None:
+   self.protocol.connectionLost(Failure(ConnectionDone() if exc is None else ConnectionLost(str(exc))))
+
+class Port(object):
+ """A listening asyncio server."""
+ def __init__(self, server):
+  self.server = server
+ 
+ def getHost(self):
+  return address(self.server.sockets[0].getsockname())
+ 
+ def stopListening(self):
+  self.server.close()
+
+def call_later(delay, func, *args, **kwargs):
+ return DelayedCall(delay, func, *args, **kwargs)
+
+def call_from_thread(func, *args, **kwargs):
+ loop.call_soon_threadsafe(partial(func, *args, **kwargs))
+
+def looping_call(interval, func):
+ return LoopingCall(interval, func)
+
+def _lookup(coroutine, timeout, convert, callback):
+ """Pass the result of coroutine to callback after passing it through convert, or None if it fails or takes longer than timeout seconds."""
+ def done(task):
+  if task.cancelled() or task.exception() is not None:
+   callback(None)
+  else:
+   callback(convert(task.result()))
+ loop.create_task(asyncio.wait_for(coroutine, timeout)).add_done_callback(done)
+
+def lookup_name(address, timeout, callback):
+ _lookup(loop.getnameinfo((address, 0), socket.NI_NAMEREQD), timeout, lambda result: result[0], callback)
+
+def lookup_address(host, timeout, callback):
+ _lookup(loop.getaddrinfo(host, None, type = socket.SOCK_STREAM), timeout, lambda result: result[0][4][0], callback)
+
+def listen(port, factory):
+ return Port(loop.run_until_complete(loop.create_server(lambda: Protocol(factory), host = '0.0.0.0', port = port, reuse_address = True)))
+
+def add_shutdown_hook(phase, func):
+ shutdown_hooks[phase].append(func)
+
+def _stop():
+ """Run the before hooks, then stop the loop once the connections they closed have been cleaned up."""
+ for func in shutdown_hooks['before']:
+  func()
+ loop.call_soon(loop.stop)
+
+def run():
+ for sig in (signal.SIGINT, signal.SIGTERM):
+  try:
+   loop.add_signal_handler(sig, stop)
+  except (NotImplementedError, RuntimeError):
+   pass # Windows, or not the main thread.
+ loop.run_forever()
+ for func in shutdown_hooks['after']:
+  func()
+
+def stop():
+ loop.call_soon_threadsafe(_stop)
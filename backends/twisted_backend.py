@@ -0,0 +1,42 @@
+"""The Twisted reactor backend."""
+
+import ipaddress
+from twisted.internet import reactor
+from twisted.internet.task import LoopingCall
+from twisted.names import client
+
+name = 'twisted'
+
+clock = reactor
+
+def call_later(delay, func, *args, **kwargs):
+ return reactor.callLater(delay, func, *args, **kwargs)
+
+def call_from_thread(func, *args, **kwargs):
+ reactor.callFromThread(func, *args, **kwargs)
+
+def looping_call(interval, func):
+ l = LoopingCall.withCount(func)
+ l.start(interval, now = False)
+ return l
+
+def lookup_name(address, timeout, callback):
+ d = client.lookupPointer(ipaddress.ip_address(address).reverse_pointer, timeout = (timeout,))
+ d.addCallback(lambda result: str(result[0][0].payload.name))
+ d.addCallbacks(callback, lambda failure: callback(None))
+
+def lookup_address(host, timeout, callback):
+ d = client.getHostByName(host, timeout = (timeout,))
+ d.addCallbacks(callback, lambda failure: callback(None))
+
+def listen(port, factory):
+ return reactor.listenTCP(port, factory)
+
+def add_shutdown_hook(phase, func):
+ reactor.addSystemEventTrigger(phase, 'shutdown', func)
+
+def run():
+ reactor.run()
+
+def stop():
+ reactor.callFromThread(reactor.stop)
@@ -0,0 +1,171 @@
+"""
+Host bans and connection limits.
+
+Bans can be single addresses or whole networks in CIDR notation (like 10.0.0.0/8). They are stored in a binary prefix tree, so checking an address takes at most one step per bit of the address no matter how many bans there are.
+
+The bans themselves are kept as strings in server_config['banned_hosts'] so they are saved with the database. Call rebuild after that list is replaced.
+
+As well as bans, admit enforces a limit on the number of connections from each address at once, and on how quickly an address can make new connections.
+"""
+
+import logging, ipaddress, threading, db
+from collections import OrderedDict
+from time import time
+
+logger = logging.getLogger('Bans')
+
+class Node(object):
+ """A node in a BanTree."""
+ __slots__ = ['children', 'network']
+ def __init__(self):
+  self.children = [None, None] # The nodes for the next bit being 0 or 1.
+  self.network = None # The network which is banned if the search reaches this node.
+
+def bits(address, length):
+ """Yield the first length bits of address, most significant first."""
+ value = int(address)
+ for x in range(address.max_prefixlen - 1, address.max_prefixlen - 1 - length, -1):
+  yield (value >> x) & 1
+
+class BanTree(object):
+ """A binary prefix tree of banned networks."""
+ def __init__(self):
+  self.clear()
+ 
+ def clear(self):
+  self.roots = {4: Node(), 6: Node()} # One tree per IP version.
+  self.size = 0 # The number of networks in the tree.
+ 
+ def add(self, network):
+  """Add network to the tree. Return False if it was already there."""
+  node = self.roots[network.version]
+  for bit in bits(network.network_address, network.prefixlen):
+   if node.children[bit] is None:
+    node.children[bit] = Node()
+   node = node.children[bit]
+  if node.network == network:
+   return False
+  node.network = network
+  self.size += 1
+  return True
+ 
+ def remove(self, network):
+  """Remove network from the tree. Return False if it wasn't there."""
+  node = self.roots[network.version]
+  for bit in bits(network.network_address, network.prefixlen):
+   node = node.children[bit]
+   if node is None:
+    return False
+  if node.network != network:
+   return False
+  node.network = None
+  self.size -= 1
+  return True
+ 
+ def match(self, address):
+  """Return the widest banned network which contains address, or None if address is not banned."""
+  node = self.roots[address.version]
+  for bit in bits(address, address.max_prefixlen):
+   if node.network is not None:
+    return node.network
+   node = node.children[bit]
+   if node is None:
+    return None
+  return node.network
+
+tree = BanTree()
+lock = threading.Lock() # Used when changing bans and connection counts.
+
+connections = {} # address: number of open connections.
+rates = OrderedDict() # address: [allowance, last connection time] for the connection rate limit, oldest connection first.
+
+def parse(text):
+ """Return an ip_network from text, which can be an address or a network in CIDR notation. Raises ValueError if text is neither."""
+ return ipaddress.ip_network(text.strip(), strict = False)
+
+def describe(network):
+ """Return network as a string, leaving off the prefix for single addresses."""
+ if network.prefixlen == network.max_prefixlen:
+  return str(network.network_address)
+ return str(network)
+
+def matches(text, network):
+ """Return True if text is a valid ban for network."""
+ try:
+  return parse(text) == network
+ except ValueError:
+  return False
+
+def rebuild():
+ """Rebuild the tree from server_config['banned_hosts']."""
+ with lock:
+  tree.clear()
+  for text in db.server_config['banned_hosts']:
+   try:
+    tree.add(parse(text))
+   except ValueError:
+    logger.warning('Ignoring invalid ban: %s.', text)
+ logger.info('Banned networks: %s.', tree.size)
+
+def ban(network):
+ """Ban network. Return False if it was already banned."""
+ with lock:
+  if not tree.add(network):
+   return False
+  db.server_config['banned_hosts'].append(describe(network))
+ logger.info('Banned %s.', describe(network))
+ return True
+
+def unban(network):
+ """Remove the ban on network. Return False if it wasn't banned."""
+ with lock:
+  if not tree.remove(network):
+   return False
+  db.server_config['banned_hosts'][:] = [x for x in db.server_config['banned_hosts'] if not matches(x, network)]
+ logger.info('Unbanned %s.', describe(network))
+ return True
+
+def banned(address):
+ """Return the banned network which contains address (an ip_address or string), or None."""
+ if not isinstance(address, (ipaddress.IPv4Address, ipaddress.IPv6Address)):
+  address = ipaddress.ip_address(address)
+ return tree.match(address)
+
+def prune(before):
+ """Forget the rate limit for addresses which haven't connected since before. The allowance is never negative, so an address which hasn't connected for a whole period is full again. Must be called with lock held."""
+ while rates:
+  address, (allowance, last) = next(iter(rates.items()))
+  if last > before:
+   break
+  del rates[address]
+
+def admit(address):
+ """Decide whether a new connection from address should be allowed. Returns None if it is, in which case release must be called with the same address when the connection is lost. Otherwise returns the reason it isn't."""
+ network = banned(address)
+ if network is not None:
+  return 'banned by %s' % describe(network)
+ now = time()
+ with lock:
+  limit = db.server_config['max_connections_per_host']
+  if limit and connections.get(address, 0) >= limit:
+   return 'already has %s connection%s' % (limit, '' if limit == 1 else 's')
+  rate, period = db.server_config['connection_rate'], db.server_config['connection_rate_period']
+  if rate and period:
+   prune(now - period)
+   allowance, last = rates.pop(address, (rate, now))
+   allowance = min(rate, allowance + (now - last) * rate / float(period))
+   if allowance < 1:
+    rates[address] = [allowance, now]
+    return 'more than %s connection%s in %s second%s' % (rate, '' if rate == 1 else 's', period, '' if period == 1 else 's')
+   rates[address] = [allowance - 1, now]
+  connections[address] = connections.get(address, 0) + 1
+ return None
+
+def release(address):
+ """A connection from address which was admitted has been lost."""
+ with lock:
+  count = connections.get(address, 0) - 1
+  if count > 0:
+   connections[address] = count
+  else:
+   connections.pop(address, None)
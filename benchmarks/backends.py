@@ -0,0 +1,66 @@
+"""
+Compare the server's backends.
+
+For each backend a server is started, as many players as possible log in at once, then every player sends commands one after another for a while. Reports how many connections were established, and the command latency.
+
+Usage:
+ python benchmarks/backends.py [-b BACKEND]... [-n CONNECTIONS] [-c COMMANDS] [-w WORKERS] [-x COMMAND]
+"""
+
+import sys
+from argparse import ArgumentParser
+
+parser = ArgumentParser(description = 'Benchmark connection count and command latency for each backend.')
+parser.add_argument('-b', '--backend', dest = 'backends', action = 'append', choices = ['twisted', 'asyncio'], help = 'A backend to benchmark (can be given more than once, defaults to all of them)')
+parser.add_argument('-n', '--connections', type = int, default = 500, help = 'The number of players to log in at once')
+parser.add_argument('-c', '--commands', type = int, default = 20, help = 'The number of commands each player sends')
+parser.add_argument('-w', '--workers', type = int, default = 8, help = 'The number of command workers the server uses (0 executes commands on the event loop thread)')
+parser.add_argument('-x', '--command', default = '@uptime', help = 'The command to send')
+args = parser.parse_args()
+del sys.argv[1:] # Don't let options.py see our arguments.
+
+import asyncio, harness
+from time import time
+
+async def login(client, uid):
+ """Connect and log in, returning True on success."""
+ try:
+  await client.connect()
+  await client.login(uid)
+  return True
+ except (OSError, ConnectionError):
+  return False
+
+async def play(client):
+ """Send the commands, returning the latency of each one."""
+ timings = []
+ for x in range(args.commands):
+  timings.append(await client.command(args.command))
+ return timings
+
+async def run(port):
+ clients = [harness.Client(port) for x in range(args.connections)]
+ started = time()
+ results = await asyncio.gather(*[login(c, 'bot%s' % x) for x, c in enumerate(clients)])
+ login_time = time() - started
+ clients = [c for c, result in zip(clients, results) if result]
+ started = time()
+ timings = sorted(sum(await asyncio.gather(*[play(c) for c in clients]), []))
+ elapsed = time() - started
+ for c in clients:
+  c.close()
+ return (len(clients), login_time, timings, elapsed)
+
+if __name__ == '__main__':
+ dump_file = harness.temporary_dump()
+ print('Creating %s players.' % args.connections)
+ harness.seed(dump_file, args.connections)
+ for backend in args.backends or ['twisted', 'asyncio']:
+  port = harness.free_port()
+  server = harness.Server(port, dump_file, '-b', backend, '-w', str(args.workers))
+  try:
+   connected, login_time, timings, elapsed = asyncio.run(run(port))
+   memory = server.memory()
+  finally:
+   server.stop()
+  print('%s: %s/%s connected in %.2fs, %s commands in %.2fs (%.0f/s), p50 %.2fms, p99 %.2fms, max %.2fms, %.1fMB resident.' % (backend, connected, args.connections, login_time, len(timings), elapsed, len(timings) / elapsed if elapsed else 0, harness.percentile(timings, 0.5) * 1000, harness.percentile(timings, 0.99) * 1000, timings[-1] * 1000 if timings else 0, memory / 1048576.0))
@@ -0,0 +1,80 @@
+"""
+Benchmark dumping and loading a large world.
+
+Builds a world of zones, rooms and objects (100,000 objects by default), then times db.dump and db.load. Before objects had ids, every reference was written with db.objects.index, so dumping a world this size took hours; use -c to time that for a smaller world.
+
+Usage:
+ python benchmarks/database.py [-n OBJECTS] [-r OBJECTS_PER_ROOM] [-c OBJECTS]
+"""
+
+import sys, os.path
+from argparse import ArgumentParser
+from time import time
+
+parser = ArgumentParser(description = 'Benchmark dumping and loading the database.')
+parser.add_argument('-n', '--objects', type = int, default = 100000, help = 'The number of objects in the world')
+parser.add_argument('-r', '--room-size', type = int, default = 20, help = 'The number of objects in each room')
+parser.add_argument('-c', '--compare', type = int, default = 0, help = 'Also time dumping references with list.index, the way it used to be done, for this many objects')
+args = parser.parse_args()
+del sys.argv[1:] # Don't let options.py see our arguments.
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import logging, server, db, objects, shutil
+from harness import temporary_dump
+
+logging.getLogger().setLevel('WARNING')
+
+def build(count, room_size):
+ """Create a world with count objects in it."""
+ zone = None
+ room = None
+ for x in range(count):
+  if x % (room_size * 50) == 0:
+   zone = objects.ZoneObject('Zone %s' % x)
+  elif x % room_size == 1:
+   room = objects.RoomObject('Room %s' % x)
+   room.move(zone)
+  else:
+   o = objects.BaseObject('Object %s' % x)
+   o.move(room or zone)
+
+def time_dump_and_load(filename):
+ count = len(db.objects)
+ started = time()
+ db.dump(filename)
+ dumped = time() - started
+ size = os.path.getsize(filename)
+ db.clear()
+ started = time()
+ db.load(filename)
+ loaded = time() - started
+ assert len(db.objects) >= count, (len(db.objects), count)
+ return dumped, loaded, size
+
+def old_dump_object_property(everything, p):
+ """How references were dumped before objects had ids."""
+ if type(p) == list:
+  return [old_dump_object_property(everything, x) for x in p]
+ elif isinstance(p, objects.BaseObject):
+  return everything.index(p)
+ return p
+
+def time_old_dump():
+ everything = list(db.objects)
+ started = time()
+ for o in everything:
+  for p in o.dump_object_properties:
+   old_dump_object_property(everything, getattr(o, p))
+ return time() - started
+
+if __name__ == '__main__':
+ filename = temporary_dump()
+ if args.compare:
+  build(args.compare, args.room_size)
+  print('%s objects: list.index references %.2fs, id references (whole dump) %.2fs.' % (len(db.objects), time_old_dump(), time_dump_and_load(filename)[0]))
+  db.clear()
+ build(args.objects, args.room_size)
+ dumped, loaded, size = time_dump_and_load(filename)
+ print('%s objects: dumped in %.2fs, loaded in %.2fs (%.1fMB).' % (args.objects, dumped, loaded, size / 1024.0 / 1024))
+ shutil.rmtree(os.path.dirname(filename))
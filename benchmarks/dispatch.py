@@ -0,0 +1,74 @@
+"""
+Benchmark finding the command for a line as the number of commands grows.
+
+Compares trying every regexp in turn, the way commands used to be found, with dispatch.Dispatcher.
+
+Usage:
+ python benchmarks/dispatch.py [-c COUNTS] [-l LINES]
+"""
+
+import sys, os.path, random, re
+from argparse import ArgumentParser
+from time import time
+
+parser = ArgumentParser(description = 'Benchmark command dispatch with many commands.')
+parser.add_argument('-c', '--counts', default = '30,100,300,1000,3000', help = 'Comma-separated numbers of commands to try')
+parser.add_argument('-l', '--lines', type = int, default = 20000, help = 'The number of lines to dispatch for each count')
+args = parser.parse_args()
+del sys.argv[1:] # Don't let options.py see our arguments.
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import dispatch
+
+def make_commands(count):
+ """Return [(expr, line), ...] for count commands in the styles the server uses, with a line which each one matches."""
+ commands = [
+  ('''^(?:say |"|')([^$]*)$''', 'say Hello.'),
+  (r'^(?:!|shout )([^$]*)$', '!Hello everyone.'),
+  (r'^\.([^$]*)$', '.'),
+  (r'^(?:eval|;)([^$]*)$', ';1 + 1'),
+ ]
+ x = 0
+ while len(commands) < count:
+  style = x % 3
+  if style == 0:
+   commands.append(('^@command%s$' % x, '@command%s' % x))
+  elif style == 1:
+   commands.append((r'^@?verb%s ([^$]+)$' % x, 'verb%s something' % x))
+  else:
+   commands.append((r'^@(set|get)%s ([^$]+)$' % x, '@get%s thing' % x))
+  x += 1
+ return commands[:count]
+
+def scan(commands, line):
+ """The way commands used to be found."""
+ for pattern, func in commands:
+  m = pattern.match(line)
+  if m:
+   return func
+
+def index(dispatcher, line):
+ """The way commands are found now."""
+ for pattern, func in dispatcher.candidates(line):
+  m = pattern.match(line)
+  if m:
+   return func
+
+if __name__ == '__main__':
+ print('%8s %12s %12s' % ('Commands', 'Scan us', 'Index us'))
+ for count in [int(x) for x in args.counts.split(',')]:
+  commands = make_commands(count)
+  compiled = [(re.compile(expr), x) for x, (expr, line) in enumerate(commands)]
+  dispatcher = dispatch.Dispatcher()
+  for pattern, func in compiled:
+   dispatcher.add(pattern, func)
+  lines = [random.choice(commands)[1] for x in range(args.lines)]
+  lines += ['not a command'] * (args.lines // 10)
+  timings = []
+  for func, target in [(scan, compiled), (index, dispatcher)]:
+   started = time()
+   for line in lines:
+    func(target, line)
+   timings.append((time() - started) / len(lines) * 1000000)
+  print('%8s %12.2f %12.2f' % (count, timings[0], timings[1]))
@@ -0,0 +1,68 @@
+"""
+Benchmark the database formats.
+
+Builds the same world as benchmarks/database.py, then dumps and loads it in every format, reporting the size of the file and how long each took. Dumps are timed with server_config['copy_dumps'] off (objects are written as they are read) and on (the world is copied first, so it is paused for less time).
+
+With -m, the peak memory used while dumping and loading is measured with tracemalloc as well, and compared with the memory used by the world. This makes everything several times slower.
+
+Usage:
+ python benchmarks/formats.py [-n OBJECTS] [-r OBJECTS_PER_ROOM] [-m]
+"""
+
+import sys, os.path
+from argparse import ArgumentParser
+from time import time
+
+parser = ArgumentParser(description = 'Benchmark the database formats.')
+parser.add_argument('-n', '--objects', type = int, default = 100000, help = 'The number of objects in the world')
+parser.add_argument('-r', '--room-size', type = int, default = 20, help = 'The number of objects in each room')
+parser.add_argument('-m', '--memory', action = 'store_true', help = 'Measure peak memory with tracemalloc')
+args = parser.parse_args()
+del sys.argv[1:] # Don't let options.py see our arguments.
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import logging, server, db, serializers, shutil, tracemalloc, gc
+from harness import temporary_dump
+from database import build
+
+logging.getLogger().setLevel('WARNING')
+
+def measure(func, *arguments):
+ """Call func(*arguments), returning its result and the peak memory it used in megabytes (0 if not measuring memory)."""
+ if not args.memory:
+  return func(*arguments), 0.0
+ tracemalloc.reset_peak()
+ before = tracemalloc.get_traced_memory()[0]
+ result = func(*arguments)
+ return result, (tracemalloc.get_traced_memory()[1] - before) / 1024.0 / 1024
+
+def load(filename):
+ started = time()
+ db.load(filename)
+ return time() - started
+
+if __name__ == '__main__':
+ directory = os.path.dirname(temporary_dump())
+ if args.memory:
+  tracemalloc.start()
+ build(args.objects, args.room_size)
+ count = len(db.objects)
+ world = tracemalloc.get_traced_memory()[0] / 1024.0 / 1024 if args.memory else 0.0
+ print('%s objects%s:' % (count, ' (%.1fMB)' % world if args.memory else ''))
+ json_size = None
+ for name, serializer in sorted(serializers.serializers.items(), key = lambda item: item[0] != 'json'):
+  filename = os.path.join(directory, 'db' + serializer.extensions[0])
+  for copy in (False, True):
+   db.server_config['copy_dumps'] = copy
+   result, peak = measure(db.dump, filename)
+   print('%s dump%s: paused for %.2fs, took %.2fs%s.' % (name, ' (copying)' if copy else '', result['paused'], result['duration'], ', %.1fMB peak' % peak if args.memory else ''))
+  size = result['size']
+  json_size = json_size or size
+  db.clear()
+  gc.collect()
+  world_left = tracemalloc.get_traced_memory()[0] / 1024.0 / 1024 if args.memory else 0.0 # Whatever clearing the world didn't free.
+  loaded, peak = measure(load, filename)
+  assert len(db.objects) >= count, (len(db.objects), count)
+  print('%s load: took %.2fs%s. The file is %.1fMB (%.0f%% of JSON).' % (name, loaded, ', %.1fMB peak for a %.1fMB world' % (peak, tracemalloc.get_traced_memory()[0] / 1024.0 / 1024 - world_left) if args.memory else '', size / 1024.0 / 1024, size * 100.0 / json_size))
+ shutil.rmtree(directory)
@@ -0,0 +1,132 @@
+"""
+Helpers for benchmarks which run a real server and talk to it over the network.
+
+Scripts using this module must parse their own arguments and clear sys.argv before importing it, like the other benchmarks.
+"""
+
+import sys, os, os.path, asyncio, socket, subprocess, tempfile
+from time import time, sleep
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, root)
+
+def seed(dump_file, players, prefix = 'bot', password = 'password'):
+ """Create a database in dump_file with players which can log in as prefix0, prefix1... using password. Limits which would get in the way of a benchmark are turned off."""
+ import logging, server, db, objects, passwords, bcrypt
+ logging.getLogger().setLevel('WARNING')
+ with open(dump_file, 'w') as f:
+  f.write('{}')
+ db.load(dump_file)
+ db.server_config['max_connections_per_host'] = 0
+ db.server_config['connection_rate'] = 0
+ hash = passwords.to_password(password, bcrypt.gensalt(4)) # Logins shouldn't be what is being measured.
+ if hasattr(hash, 'decode'):
+  hash = hash.decode()
+ for x in range(players):
+  p = objects.PlayerObject('Bot %s' % x)
+  p.uid = '%s%s' % (prefix, x)
+  p._pwd = hash
+  p.move(db.objects_config['start_room'])
+ db.dump(dump_file)
+
+class Server(object):
+ """A server running in a child process."""
+ def __init__(self, port, dump_file, *args):
+  self.port = port
+  self.log = tempfile.TemporaryFile()
+  self.process = subprocess.Popen([sys.executable, 'main.py', '-p', str(port), '-d', dump_file, '-l', 'warning'] + list(args), cwd = root, stdout = self.log, stderr = subprocess.STDOUT)
+  started = time()
+  while True:
+   try:
+    socket.create_connection(('127.0.0.1', port)).close()
+    break
+   except socket.error:
+    if self.process.poll() is not None or time() - started > 30:
+     self.stop()
+     raise RuntimeError('The server did not start:\n%s' % self.output())
+    sleep(0.1)
+ 
+ def memory(self):
+  """Return the resident set size of the server in bytes."""
+  import psutil
+  return psutil.Process(self.process.pid).memory_info().rss
+ 
+ def output(self):
+  """Return everything the server has logged."""
+  self.log.seek(0)
+  return self.log.read().decode('utf-8', 'replace')
+ 
+ def stop(self):
+  if self.process.poll() is None:
+   self.process.terminate()
+   self.process.wait()
+
+class Client(object):
+ """A connection to a server. Commands are timed until the server sends a line the caller expects, or by sending a line the server won't recognise after them and waiting for the server to complain about it."""
+ def __init__(self, port):
+  self.port = port
+  self.reader = None
+  self.writer = None
+  self.syncs = 0
+ 
+ async def connect(self):
+  self.reader, self.writer = await asyncio.open_connection('127.0.0.1', self.port)
+ 
+ async def expect(self, marker):
+  """Wait for a line containing marker."""
+  marker = marker.encode()
+  while True:
+   line = await self.reader.readline()
+   if not line:
+    raise ConnectionError('Disconnected.')
+   if marker in line:
+    return
+ 
+ async def sync(self):
+  """Wait until the server has handled everything sent so far."""
+  self.syncs += 1
+  token = 'sync-%s-%s' % (id(self), self.syncs)
+  self.writer.write(token.encode() + b'\r\n')
+  await self.expect(token)
+ 
+ async def login(self, uid, password = 'password'):
+  self.writer.write(('%s\r\n%s\r\n' % (uid, password)).encode())
+  await self.sync()
+ 
+ async def create(self, uid, name, password = 'password', first = False):
+  """Create a player through the new flow. If first is True, the database has no players yet, so the server asks for a username without being told new."""
+  lines = [uid, password, password, name, '1']
+  if not first:
+   lines.insert(0, 'new')
+  self.writer.write(''.join(line + '\r\n' for line in lines).encode())
+  await self.sync()
+ 
+ async def command(self, text, marker = None):
+  """Send text and return the number of seconds until the server sends a line containing marker, or until it has finished with text if marker is None."""
+  started = time()
+  self.writer.write(text.encode() + b'\r\n')
+  if marker is None:
+   await self.sync()
+  else:
+   await self.expect(marker)
+  return time() - started
+ 
+ def close(self):
+  if self.writer is not None:
+   self.writer.close()
+
+def percentile(timings, fraction):
+ """Return the value fraction of the way through the sorted list timings."""
+ return timings[min(len(timings) - 1, int(len(timings) * fraction))]
+
+def free_port():
+ """Return a port nothing is listening on."""
+ s = socket.socket()
+ s.bind(('127.0.0.1', 0))
+ port = s.getsockname()[1]
+ s.close()
+ return port
+
+def temporary_dump():
+ """Return the name of a dump file in a new temporary directory."""
+ return os.path.join(tempfile.mkdtemp(), 'db.json')
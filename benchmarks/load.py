@@ -0,0 +1,145 @@
+"""
+Put the server under load with bots which behave like players.
+
+Starts the server with an empty database, then connects bots which either create their players through the new flow, or log in to players created beforehand. Each bot then sends commands picked at random from the mix, pausing for a random time between them, until the test is over. Every command is timed from when it is sent until the server sends the line which answers it.
+
+Reports throughput, command latency, and the server's resident memory over time.
+
+Usage:
+ python benchmarks/load.py [-n BOTS] [-t SECONDS] [-l {new,existing}] [-T SECONDS] [-m MIX]
+"""
+
+import sys
+from argparse import ArgumentParser
+
+parser = ArgumentParser(description = 'Drive the server with bots and measure how it copes.')
+parser.add_argument('-n', '--bots', type = int, default = 100, help = 'The number of bots to connect')
+parser.add_argument('-t', '--duration', type = float, default = 30.0, help = 'The number of seconds to run for once the bots have started connecting')
+parser.add_argument('-l', '--login', choices = ['new', 'existing'], default = 'new', help = 'Create players through the new flow, or log in to players which were created before the server started')
+parser.add_argument('-r', '--ramp', type = float, default = 5.0, help = 'Spread the bots connecting over this many seconds')
+parser.add_argument('-T', '--think', type = float, default = 1.0, help = 'The average number of seconds each bot waits between commands (0 for no waiting)')
+parser.add_argument('-m', '--mix', default = 'say=60,shout=5,@commands=5,.=30', help = 'Commands and how often they are sent relative to each other, as command=weight,...')
+parser.add_argument('-i', '--interval', type = float, default = 1.0, help = 'The number of seconds between memory samples')
+parser.add_argument('-b', '--backend', choices = ['twisted', 'asyncio'], default = 'twisted', help = 'The backend the server uses')
+parser.add_argument('-w', '--workers', type = int, default = 8, help = 'The number of command workers the server uses')
+args = parser.parse_args()
+del sys.argv[1:] # Don't let options.py see our arguments.
+
+import asyncio, random, string, harness
+from time import time
+
+mix = []
+for entry in args.mix.split(','):
+ command, weight = entry.rsplit('=', 1)
+ mix.append((command.strip(), float(weight)))
+
+class Results(object):
+ """Everything the bots have measured."""
+ def __init__(self):
+  self.connected = 0 # The number of bots which have logged in.
+  self.failed = 0 # The number of bots which couldn't log in or were disconnected.
+  self.timings = {} # command: [seconds, ...].
+  self.completed = 0 # The number of commands which have been answered.
+  self.samples = [] # (seconds since the start, bots connected, commands completed, resident bytes).
+
+results = Results()
+
+def names(count):
+ """Return count distinct names which the server will accept for new players."""
+ import util
+ names = []
+ x = 0
+ while len(names) < count:
+  suffix = ''
+  y = x
+  while True:
+   suffix = string.ascii_lowercase[y % 26] + suffix
+   y = y // 26 - 1
+   if y < 0:
+    break
+  name = 'Bot %s' % suffix.title()
+  if util.disallowed_name(name) is None:
+   names.append(name)
+  x += 1
+ return names
+
+def choose(x, sequence, last):
+ """Return (text, marker) for the next command bot x should send. last is what was returned for the previous command."""
+ command = random.choices([c for c, w in mix], [w for c, w in mix])[0]
+ if command == '.' and last is None:
+  command = 'say' # Nothing to repeat.
+ if command == '.':
+  return ('.', last[1])
+ elif command in ('say', 'shout'):
+  text = 'Bot %s message %s.' % (x, sequence)
+  return ('%s %s' % (command, text), text)
+ elif command == '@commands':
+  return (command, 'Commands: ')
+ else:
+  return (command, None)
+
+async def bot(x, port, name, deadline):
+ await asyncio.sleep(args.ramp * x / args.bots)
+ client = harness.Client(port)
+ try:
+  await client.connect()
+  if args.login == 'new':
+   await asyncio.wait_for(client.create('bot%s' % x, name, first = x == 0), 60)
+  else:
+   await asyncio.wait_for(client.login('bot%s' % x), 60)
+  results.connected += 1
+  last = None
+  sequence = 0
+  while time() < deadline:
+   if args.think:
+    await asyncio.sleep(random.expovariate(1.0 / args.think))
+   sequence += 1
+   text, marker = choose(x, sequence, last)
+   seconds = await asyncio.wait_for(client.command(text, marker), 60)
+   results.timings.setdefault(text.split()[0], []).append(seconds)
+   results.completed += 1
+   if text != '.':
+    last = (text, marker)
+ except (OSError, ConnectionError, asyncio.TimeoutError):
+  results.failed += 1
+ finally:
+  client.close()
+
+async def sample(server, started, deadline):
+ while time() < deadline:
+  results.samples.append((time() - started, results.connected, results.completed, server.memory()))
+  await asyncio.sleep(args.interval)
+
+async def run(server, port):
+ started = time()
+ deadline = started + args.duration
+ bots = [] if args.login == 'existing' else names(args.bots)
+ if bots:
+  await bot(0, port, bots[0], started) # The first player must exist before anyone else types new.
+ await asyncio.gather(sample(server, started, deadline), *[bot(x, port, bots[x] if bots else None, deadline) for x in range(1 if bots else 0, args.bots)])
+ return time() - started
+
+def report(name, timings):
+ timings = sorted(timings)
+ print('%-10s %8s %9.2f %9.2f %9.2f %9.2f' % (name, len(timings), harness.percentile(timings, 0.5) * 1000, harness.percentile(timings, 0.99) * 1000, harness.percentile(timings, 0.999) * 1000, timings[-1] * 1000))
+
+if __name__ == '__main__':
+ dump_file = harness.temporary_dump()
+ harness.seed(dump_file, args.bots if args.login == 'existing' else 0)
+ port = harness.free_port()
+ server = harness.Server(port, dump_file, '-b', args.backend, '-w', str(args.workers))
+ try:
+  elapsed = asyncio.run(run(server, port))
+ finally:
+  server.stop()
+ print('%s of %s bots connected (%s failed). %s commands in %.1f seconds (%.1f/s).' % (results.connected, args.bots, results.failed, results.completed, elapsed, results.completed / elapsed))
+ if results.completed:
+  print('')
+  print('%-10s %8s %9s %9s %9s %9s' % ('Command', 'Count', 'p50 ms', 'p99 ms', 'p99.9 ms', 'max ms'))
+  for name, timings in sorted(results.timings.items()):
+   report(name, timings)
+  report('All', sum(results.timings.values(), []))
+ print('')
+ print('%8s %10s %10s %10s' % ('Seconds', 'Logged in', 'Commands', 'RSS MB'))
+ for seconds, connected, completed, memory in results.samples:
+  print('%8.1f %10s %10s %10.1f' % (seconds, connected, completed, memory / 1048576.0))
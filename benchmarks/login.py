@@ -0,0 +1,59 @@
+"""
+Benchmark finding and authenticating a player when logging in.
+
+Compares the old linear scan of db.players with the db.players_by_uid index.
+
+Usage:
+ python benchmarks/login.py [-n PLAYERS] [-t TRIES]
+"""
+
+import sys, os.path, random
+from argparse import ArgumentParser
+from time import time
+
+parser = ArgumentParser(description = 'Benchmark login latency with many stored players.')
+parser.add_argument('-n', '--players', type = int, default = 10000, help = 'The number of players to create')
+parser.add_argument('-t', '--tries', type = int, default = 200, help = 'The number of logins to time for each method')
+args = parser.parse_args()
+del sys.argv[1:] # Don't let options.py see our arguments.
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import logging, server, db, objects, passwords, bcrypt
+
+logging.getLogger().setLevel('WARNING')
+
+pwd = 'password'
+hash = passwords.to_password(pwd, bcrypt.gensalt(4)) # Cheap enough that the lookup dominates.
+
+def scan(uid):
+ """The way logins used to be handled."""
+ for p in db.players:
+  if p.authenticate(uid, pwd):
+   return p
+
+def index(uid):
+ """The way logins are handled now."""
+ p = db.players_by_uid.get(uid)
+ if p is not None and p.authenticate(uid, pwd):
+  return p
+
+def run(func, uids):
+ """Time func for every uid in uids, returning the timings in milliseconds."""
+ timings = []
+ for uid in uids:
+  started = time()
+  assert func(uid) is not None
+  timings.append((time() - started) * 1000)
+ return sorted(timings)
+
+if __name__ == '__main__':
+ print('Creating %s players.' % args.players)
+ for x in range(args.players):
+  p = objects.PlayerObject('Player %s' % x)
+  p.uid = 'player%s' % x
+  p._pwd = hash
+ uids = ['player%s' % random.randrange(args.players) for x in range(args.tries)]
+ for name, func in [('scan', scan), ('index', index)]:
+  timings = run(func, uids)
+  print('%s: mean %.3fms, p50 %.3fms, p99 %.3fms.' % (name, sum(timings) / len(timings), timings[len(timings) // 2], timings[int(len(timings) * 0.99)]))
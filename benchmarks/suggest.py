@@ -0,0 +1,77 @@
+"""
+Benchmark suggesting commands for mistyped words.
+
+Compares the substring test which used to be used with suggest.Index, both for speed and for how often the command which was meant is suggested.
+
+Usage:
+ python benchmarks/suggest.py [-n COMMANDS] [-t TYPOS]
+"""
+
+import sys, os.path, random, string
+from argparse import ArgumentParser
+from time import time
+
+parser = ArgumentParser(description = 'Benchmark command suggestions.')
+parser.add_argument('-n', '--commands', type = int, default = 500, help = 'The number of commands')
+parser.add_argument('-t', '--typos', type = int, default = 2000, help = 'The number of mistyped words to suggest commands for')
+args = parser.parse_args()
+del sys.argv[1:] # Don't let options.py see our arguments.
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import suggest
+
+def make_name():
+ word = ''.join(random.choice(string.ascii_lowercase) for x in range(random.randint(4, 10)))
+ return '@' + word if random.random() < 0.5 else word
+
+def typo(word):
+ """Return word with a random mistake in it."""
+ x = random.randrange(1 if word.startswith('@') else 0, len(word))
+ kind = random.randrange(4)
+ if kind == 0:
+  return word[:x] + word[x + 1:] # Missed a letter.
+ elif kind == 1:
+  return word[:x] + random.choice(string.ascii_lowercase) + word[x:] # Extra letter.
+ elif kind == 2:
+  return word[:x] + random.choice(string.ascii_lowercase) + word[x + 1:] # Wrong letter.
+ elif x + 1 < len(word):
+  return word[:x] + word[x + 1] + word[x] + word[x + 2:] # Swapped letters.
+ return word[:x]
+
+def scan(funcs, word):
+ """The way suggestions used to be found."""
+ word += ' '
+ for f in funcs:
+  if word in f.name:
+   return [f.name.split()[0]]
+ return []
+
+if __name__ == '__main__':
+ funcs = []
+ names = set()
+ while len(funcs) < args.commands:
+  name = make_name()
+  if name not in names:
+   names.add(name)
+   f = lambda obj: None
+   f.name = name
+   funcs.append(f)
+ index = suggest.Index()
+ for f in funcs:
+  index.add(f)
+ tests = []
+ for x in range(args.typos):
+  name = random.choice(funcs).name
+  tests.append((typo(name), name))
+ print('%s commands, %s typos.' % (args.commands, args.typos))
+ for method, func in [('scan', lambda word: scan(funcs, word)), ('index', index.suggest)]:
+  timings = []
+  hits = 0
+  for word, name in tests:
+   started = time()
+   found = func(word)
+   timings.append((time() - started) * 1000)
+   hits += name in found
+  timings.sort()
+  print('%s: mean %.3fms, p99 %.3fms, suggested the right command %.1f%% of the time.' % (method, sum(timings) / len(timings), timings[int(len(timings) * 0.99)], hits * 100.0 / len(tests)))
@@ -12,21 +12,22 @@ obj - The object which called the command.
 
 If the command does not evaluate to True then the search algorithm will keep looking for commands.
 
-Remember that do_command is called from a thread other than the main thread, so reactor.callFromThread must be used for anything which directly involves the network layer with the exception of obj.notify (which uses reactor.callFromThread anyway).
+Remember that do_command is called from a thread other than the main thread, so backend.call_from_thread must be used for anything which directly involves the network layer with the exception of obj.notify (which uses backend.call_from_thread anyway).
 
 The following special properties can be added to commands to customise them:
 name - a space-separated list of commands which can be used to invoke this command.
 access - The level of access necessary to view and execute this command.
 """
 
-import server, re, objects, objects.players as players, logging, options, db, util, traceback, socket, platform, multiprocessing, psutil, os
-from twisted.internet import reactor
-from inspect import getdoc
+import server, re, dispatch, suggest, helptext, metrics, workers, objects, objects.players as players, logging, options, db, util, traceback, resolver, bans, timers, throttle, world, locks, profiling, snapshots, platform, multiprocessing, psutil, os
+from backends import backend
 from datetime import timedelta
-from time import ctime
+from time import ctime, time
 from memory import memory
 
-commands = {} # Command regexp and functions.
+commands = dispatch.Dispatcher() # Command regexps and functions.
+suggestions = suggest.Index() # Used to suggest commands when a line doesn't match any.
+topics = helptext.Index() # Parsed help for every command.
 
 logger = logging.getLogger('Commands')
 
@@ -36,17 +37,26 @@ def add_command(expr, func):
  
  The entered command must match to expr.
  When found, func will be called with a player object, as well as args and kwargs as returned by match.groups(), and match.groupdict().
+ While func executes, the locks for func.scope are held (see locks.py). Functions without a scope lock the whole world.
+ If func.read_only is True, func promises not to change anything, so the locks are shared and the line doesn't have to wait for the world loop.
  """
  if not hasattr(func, 'name'):
   raise ValueError('%s has no name property.' % func)
  if not hasattr(func, 'access'):
   func.access = 0
- for x in dir(objects.players):
-  if x.isupper() and func.access == getattr(objects.players, x):
-   break # Found the access level.
- else:
+ if not hasattr(func, 'scope'):
+  func.scope = locks.WORLD
+ if func.scope not in locks.scopes:
+  raise ValueError('%s is not a valid scope from locks.scopes.' % func.scope)
+ if not hasattr(func, 'read_only'):
+  func.read_only = False
+ if objects.players.access_name(func.access) is None:
   raise ValueError('%s is not a valid access level from objects.players.' % func.access)
- commands[re.compile(expr)] = func
+ old = commands.add(re.compile(expr), func)
+ if old is not None:
+  suggestions.discard(old)
+ suggestions.add(func)
+ topics.add(func, replaces = old)
 
 def do_command(obj, command):
  """Perform command for obj."""
@@ -56,33 +66,52 @@ def do_command(obj, command):
   command = command.decode(options.args.default_encoding, errors = 'ignore')
  if options.args.log_commands:
   logger.info('%s entered command: %s', obj.title(), command)
+ if obj.commands.size != db.server_config['command_history_length']:
+  obj.commands.resize(db.server_config['command_history_length'])
  obj.commands.append(command)
- while len(obj.commands) > db.server_config['command_history_length']:
-  del obj.commands[0]
- for cmd, func in commands.items():
+ if db.server_config['save_command_history']:
+  obj.changed()
+ for cmd, func in commands.candidates(command):
   if obj.access >= func.access:
    m = cmd.match(command)
    if m:
+    started = time()
+    error = False
     try:
-     if func(obj, *m.groups(), **m.groupdict()):
-      break
+     with locks.manager.hold_for(obj, func.scope, func.read_only):
+      if func(obj, *m.groups(), **m.groupdict()):
+       break
     except Exception as e:
+     error = True
      cmd = func.name.split()[0]
      obj.notify('While executing command %s, an error was raised. See log for details.' % cmd)
      logger.critical('While executing command %s for player %s (%s), the following exception was raised:', cmd, obj.title(), obj.transport.hostname)
      logger.exception(e)
+    finally:
+     metrics.record(func, workers.current_wait(), time() - started, error)
  else:
   try:
-   cmd = command.split()[0] + ' '
+   cmd = command.split()[0]
   except IndexError:
    cmd = '' # It's just a blank line... probably.
-  for f in commands.values():
-   if obj.access >= f.access and cmd in f.name:
-    obj.notify('Command %s not understood. Did you mean %s?' % (cmd, f.name.split()[0]))
-    break
+  found = suggestions.suggest(cmd, lambda f: obj.access >= f.access) if cmd else []
+  if found:
+   obj.notify('Command %s not understood. Did you mean %s?' % (cmd, util.english_list(found, and_string = 'or')))
   else:
    obj.notify('Command %s not found. If you are having trouble finding commands and their syntax, try typing @commands.' % cmd)
 
+def is_read_only(obj, command):
+ """Return True if command matches at least one command obj can use, and every one it matches is read-only."""
+ if hasattr(command, 'decode'):
+  command = command.decode(options.args.default_encoding, errors = 'ignore')
+ found = False
+ for cmd, func in commands.candidates(command or '\n'):
+  if obj.access >= func.access and cmd.match(command or '\n'):
+   if not func.read_only:
+    return False
+   found = True
+ return found
+
 def do_quit(obj):
  """
  Disconnect from the server.
@@ -91,10 +120,10 @@ def do_quit(obj):
   quit
   @quit
  """
- obj.notify(db.server_config['disconnect_msg'])
- obj.transport.loseConnection()
+ obj.notify(db.server_config['disconnect_msg'], disconnect = True)
  return True
 do_quit.name = 'quit @quit'
+do_quit.scope = locks.ROOM
 add_command('^@?quit$', do_quit)
 
 def do_commands(obj, *args, **kwargs):
@@ -106,16 +135,52 @@ def do_commands(obj, *args, **kwargs):
   @commands
  """
  obj.notify('Commands listing:')
- i = 0
- for f in commands.values():
-  if obj.access >= f.access:
-   i += 1
-   obj.notify('%s: %s' % (util.english_list(f.name.split(), and_string = 'or').capitalize(), getdoc(f).strip().split('\n')[0]))
- obj.notify('Commands: %s.' % i)
+ lines = topics.listing(obj.access)
+ for line in lines:
+  obj.notify(line)
+ obj.notify('Commands: %s.' % len(lines))
  return True
 do_commands.name = '@commands'
+do_commands.scope = locks.NONE
+do_commands.read_only = True
 add_command('^@commands$', do_commands)
 
+def do_help(obj, search, topic):
+ """
+ Shows help on commands.
+ 
+ Synopsis:
+  help <command>
+  help search <words>
+ 
+ help <command> shows everything there is to know about <command>. help search <words> lists the commands whose help mentions all of <words>.
+ """
+ if search is not None:
+  found = topics.search(search, obj.access)
+  if not found:
+   return obj.notify('No help mentions %s.' % search)
+  obj.notify('Help mentioning %s:' % search)
+  for t in found[:20]:
+   obj.notify('%s: %s' % (t.title(), t.summary))
+  if len(found) > 20:
+   obj.notify('And %s more. Try more words.' % (len(found) - 20))
+ elif topic:
+  t = topics.topic(topic, obj.access)
+  if t is None:
+   found = suggestions.suggest(topic, lambda f: obj.access >= f.access) or [x.name for x in topics.search(topic, obj.access)[:5]]
+   if found:
+    return obj.notify('There is no command called %s. Did you mean %s?' % (topic, util.english_list(found, and_string = 'or')))
+   return obj.notify('There is no help on %s. Type @commands to see every command.' % topic)
+  for line in t.lines():
+   obj.notify(line)
+ else:
+  obj.notify('Type help <command> for help on a command, help search <words> to search the help, or @commands to see every command.')
+ return True
+do_help.name = 'help'
+do_help.scope = locks.NONE
+do_help.read_only = True
+add_command('^help(?: search (.+)| (.+))?$', do_help)
+
 def do_say(obj, text):
  """
  Speak some text.
@@ -138,6 +203,7 @@ def do_say(obj, text):
   obj.notify('You cannot speak here.')
  return True
 do_say.name = 'say " \''
+do_say.scope = locks.ROOM
 add_command('''^(?:say |"|')([^$]*)$''', do_say)
 
 def do_break(obj):
@@ -150,6 +216,8 @@ def do_break(obj):
  raise RuntimeError('Yes, that broke alright.')
 do_break.name = '@break'
 do_break.access = players.PROGRAMMER
+do_break.scope = locks.NONE
+do_break.read_only = True
 add_command('^@break$', do_break)
 
 def do_eval(obj, text):
@@ -169,8 +237,47 @@ def do_eval(obj, text):
   return True
 do_eval.name = 'eval ;'
 do_eval.access = players.PROGRAMMER
+do_eval.scope = locks.WORLD # The code could do anything.
 add_command(r'^(?:eval|;)([^$]*)$', do_eval)
 
+def do_profile(obj, mode, seconds):
+ """
+ Profiles the running server.
+ 
+ Synopsis:
+  @profile [cpu|sample|memory] [<seconds>]
+  @profile stop
+ 
+ Profiles the server for <seconds> seconds (10 by default), then writes the results to the profile directory and shows the highlights.
+ 
+ cpu (the default) profiles every command and the event loop with cProfile, and shows the functions with the highest cumulative time. sample only takes samples of the stacks, which slows the server down much less. Both write a collapsed-stack file for flame graphs.
+ 
+ memory shows the lines which allocated the most memory while profiling.
+ 
+ @profile stop finishes profiling early.
+ """
+ if mode == 'stop':
+  session = profiling.session
+  if session is None:
+   return obj.notify('The server is not being profiled.')
+  backend.call_from_thread(session.stop)
+  return obj.notify('Stopping profiling.')
+ seconds = int(seconds or 10)
+ if not 0 < seconds <= db.server_config['profile_max_duration']:
+  return obj.notify('You can profile for between 1 and %s seconds.' % db.server_config['profile_max_duration'])
+ def report(lines):
+  for line in lines:
+   obj.notify(line)
+ if profiling.start(mode or profiling.CPU, seconds, report) is None:
+  return obj.notify('The server is already being profiled.')
+ obj.notify('Profiling (%s) for %s second%s.' % (mode or profiling.CPU, seconds, '' if seconds == 1 else 's'))
+ return True
+do_profile.name = '@profile'
+do_profile.access = players.PROGRAMMER
+do_profile.scope = locks.NONE
+do_profile.read_only = True
+add_command(r'^@profile(?: (cpu|sample|memory|stop))?(?: (\d+))?$', do_profile)
+
 def do_uptime(obj):
  """
  Shows how long the server has been running for.
@@ -181,6 +288,8 @@ def do_uptime(obj):
  """
  return obj.notify('The server has been up since %s (%s).' % (ctime(server.started), timedelta(seconds = server.uptime())))
 do_uptime.name = '@uptime'
+do_uptime.scope = locks.NONE
+do_uptime.read_only = True
 add_command('^@uptime$', do_uptime)
 
 def do_redo(obj, text):
@@ -201,6 +310,7 @@ def do_redo(obj, text):
   obj.notify('You have no commands to repeat.')
  return True
 do_redo.name = '.'
+do_redo.scope = locks.WORLD # It has to cover whatever command is repeated.
 add_command(r'^\.([^$]*)$', do_redo)
 
 def do_shout(obj, text):
@@ -219,6 +329,7 @@ def do_shout(obj, text):
   obj.notify('Shout what?')
  return True
 do_shout.name = 'shout !'
+do_shout.read_only = True # Shared, because it goes through every object to find the players.
 add_command('^(?:!|shout )([^$]*)$', do_shout)
 
 def do_shutdown(obj, when, reason):
@@ -235,17 +346,18 @@ def do_shutdown(obj, when, reason):
  def f2():
   """Actually perform the shutdown."""
   db.notify_players('The server will be shutting down in 5 seconds.')
-  do_shutdown.delay = reactor.callLater(5, reactor.stop)
+  do_shutdown.delay = timers.wheel.timer(5, backend.stop)
  def f1(when, reason):
   db.notify_players('The server will be shutting down for %s in %s second%s.' % (reason, when, '' if when== 1 else 's'))
   if when > 5:
-   do_shutdown.delay = reactor.callLater(when - 5, f2)
+   do_shutdown.delay = timers.wheel.timer(when - 5, f2)
   else:
-   do_shutdown.delay = reactor.callLater(when, reactor.stop)
+   do_shutdown.delay = timers.wheel.timer(when, backend.stop)
  obj.read(lambda text, player = obj, w = when, r = reason: f1(int(w), r.strip() or 'maintenance') if util.yes_or_no(text) else player.notify('Shutdown aborted.'), 'Are you sure you want to shutdown the server in %s second%s?' % (when, '' if when == '1' else 's'))
  return True
 do_shutdown.name = '@shutdown'
 do_shutdown.access = players.WIZARD
+do_shutdown.scope = locks.NONE # The question is answered in handle_input, which locks the world.
 add_command('^@shutdown (\d+)([^$]*)$', do_shutdown)
 
 def do_abort_shutdown(obj):
@@ -269,36 +381,45 @@ add_command('^@abort-shutdown$', do_abort_shutdown)
 
 def do_ban(obj, command, host):
  """
- Ban or unban an IP address.
+ Ban or unban a host or network.
  
  Synopsis:
-  @ban <hostname or IP address>
-  @unban <hostname or IP address>
+  @ban <hostname, IP address or network>
+  @unban <hostname, IP address or network>
  
- When banned, nobody logging in from the provided hostname will be able to connect to the server.
+ When banned, nobody connecting from the provided hostname will be able to connect to the server.
+ Networks are given in CIDR notation, for example 192.168.0.0/16.
  """
- try:
-  ip = socket.gethostbyname(host)
-  hostname = '%s (%s)' % (host, ip)
- except socket.error as e:
-  obj.notify('Could not find any address for host %s: %s.' % (host, e))
- else:
+ def f(network, description):
+  """Called with the network to ban or unban once it is known."""
   if command == 'ban':
-   if ip in server.get_config('banned_hosts'):
-    obj.notify('Host %s is already a banned host.' % hostname)
+   if bans.ban(network):
+    obj.notify('Host %s added to banned hosts list.' % description)
    else:
-    server.get_config('banned_hosts').append(ip)
-    obj.notify('Host %s added to banned hosts list.' % hostname)
+    obj.notify('Host %s is already a banned host.' % description)
+  elif bans.unban(network):
+   obj.notify('Removed host %s from banned hosts list.' % description)
   else:
-   try:
-    server.get_config('banned_hosts').remove(ip)
-    obj.notify('Removed host %s from banned hosts list.' % hostname)
-   except KeyError:
-    obj.notify('Host %s is not a banned host.' % hostname)
- finally:
-  return True
+   obj.notify('Host %s is not a banned host.' % description)
+ def g(ip):
+  """Called with the address for host once it has been looked up."""
+  if ip is None:
+   obj.notify('Could not find any address for host %s.' % host)
+  else:
+   f(bans.parse(ip), '%s (%s)' % (host, ip))
+ if '/' in host:
+  try:
+   network = bans.parse(host)
+  except ValueError:
+   obj.notify('Invalid network: %s.' % host)
+  else:
+   f(network, bans.describe(network))
+ else:
+  resolver.forward(host, g)
+ return True
 do_ban.name = '@ban @unban'
 do_ban.access = players.WIZARD
+do_ban.scope = locks.NONE # bans has a lock of its own.
 add_command(r'^@(ban|unban) ([^$]+)$', do_ban)
 
 def do_banned(obj):
@@ -307,19 +428,26 @@ def do_banned(obj):
  
  Synopsis:
   @banned
+ 
  Hosts ban be banned or unbanned with the @ban and @unban commands.
+ Host names which haven't been looked up yet are shown as unresolved, and will be shown next time.
  """
  banned = server.get_config('banned_hosts')
  if banned:
   obj.notify('Banned hosts: %s.' % len(banned))
   for b in banned:
-   obj.notify('%s (%s)' % (b, socket.gethostbyaddr(b)[0]))
+   if '/' in b:
+    obj.notify(b)
+   else:
+    obj.notify('%s (%s)' % (b, resolver.cached(b) or 'unresolved'))
   obj.notify('Done.')
  else:
   obj.notify('There are no banned hosts.')
  return True
 do_banned.name = '@banned'
 do_banned.access = players.PROGRAMMER
+do_banned.scope = locks.NONE
+do_banned.read_only = True
 add_command('^@banned$', do_banned)
 
 def do_info(obj):
@@ -339,7 +467,152 @@ def do_info(obj):
  obj.notify('Processor: %s.' % (platform.processor() or 'Unknown'))
  obj.notify('Memory: Used %.2fMB of %.2fGB (%.2f%%).' % (mem.used / (1024.0 ** 2), mem.total / (1024.0 ** 3), mem.percent))
  obj.notify('Max Concurrent Threads: %s.' % multiprocessing.cpu_count())
+ stats = server.pool.stats()
+ obj.notify('Command Workers: %s.' % stats['threads'])
+ obj.notify('Command Queue: %s pending (%s at most) from %s connection%s.' % (stats['pending'], stats['max_pending'], stats['keys'], '' if stats['keys'] == 1 else 's'))
+ obj.notify('Command Wait: %.2fms average (%.2fms at most).' % (stats['average_wait'] * 1000, stats['max_wait'] * 1000))
+ obj.notify('Throttling: %s connection%s throttled, %s line%s delayed, %s dropped.' % (throttle.stats['throttled'], '' if throttle.stats['throttled'] == 1 else 's', throttle.stats['queued'], '' if throttle.stats['queued'] == 1 else 's', throttle.stats['dropped']))
+ stats = timers.wheel.stats()
+ obj.notify('Timers: %s live (%s at most), %s fired, %s cancelled.' % (stats['live'], stats['max_live'], stats['fired'], stats['cancelled']))
+ obj.notify('DNS Cache: %s hit%s, %s miss%s.' % (resolver.reverse_cache.hits, '' if resolver.reverse_cache.hits == 1 else 's', resolver.reverse_cache.misses, '' if resolver.reverse_cache.misses == 1 else 'es'))
  obj.notify('Objects in database: %s.' % len(db.objects))
+ if db.journal is not None:
+  stats = db.journal.stats()
+  obj.notify('Journal: %s checkpoint%s, %.2fKB since the last compaction, %s compaction%s.' % (stats['checkpoints'], '' if stats['checkpoints'] == 1 else 's', stats['size'] / 1024.0, stats['compactions'], '' if stats['compactions'] == 1 else 's'))
  return True
 do_info.name = '@info'
+do_info.scope = locks.NONE
+do_info.read_only = True
 add_command('^@info$', do_info)
+
+def do_compression(obj):
+ """
+ Shows how well MCCP compression is working for each connection.
+ 
+ Synopsis:
+  @compression
+ 
+ For every connection using compression, shows the number of bytes before and after compression, and the CPU time spent compressing.
+ """
+ i = 0
+ for transport, player in list(server.connections.items()):
+  c = transport.protocol.compressor
+  if c is not None:
+   i += 1
+   obj.notify('%s: %s bytes compressed to %s (%.1f%%) using %.2fms of CPU.' % (transport.hostname if player is None else player.title(), c.bytes_in, c.bytes_out, c.ratio() * 100, c.cpu * 1000))
+ obj.notify('Compressed connections: %s of %s.' % (i, len(server.connections)))
+ return True
+do_compression.name = '@compression'
+do_compression.access = players.WIZARD
+do_compression.scope = locks.NONE
+do_compression.read_only = True
+add_command('^@compression$', do_compression)
+
+def do_stats(obj, arg):
+ """
+ Shows which commands are slowest.
+ 
+ Synopsis:
+  @stats [<count>]
+  @stats reset
+ 
+ Shows the <count> commands (10 by default) with the highest 99th percentile execution time, then the <count> commands which have taken the most time altogether. Times are in milliseconds. Wait is how long lines spent queued before being executed.
+ 
+ @stats reset forgets everything recorded so far.
+ """
+ if arg == 'reset':
+  metrics.reset()
+  return obj.notify('Command statistics reset.')
+ count = int(arg or 10)
+ obj.notify('Command statistics for the last %s (times in milliseconds):' % timedelta(seconds = int(time() - metrics.started)))
+ for title, key in [('Slowest by 99th percentile', 'p99'), ('Most total time', 'total')]:
+  obj.notify('%s:' % title)
+  found = metrics.top(key, count)
+  for s in found:
+   obj.notify('%s: %s call%s (%s error%s), p50 %.2f, p99 %.2f, max %.2f, total %.2f, wait p99 %.2f.' % (s['name'], s['calls'], '' if s['calls'] == 1 else 's', s['errors'], '' if s['errors'] == 1 else 's', s['p50'] * 1000, s['p99'] * 1000, s['max'] * 1000, s['total'] * 1000, s['wait_p99'] * 1000))
+  if not found:
+   obj.notify('No commands have been recorded.')
+ return True
+do_stats.name = '@stats'
+do_stats.access = players.WIZARD
+do_stats.scope = locks.NONE
+do_stats.read_only = True
+add_command(r'^@stats(?: (\d+|reset))?$', do_stats)
+
+def do_world(obj):
+ """
+ Shows how long the world loop is taking to apply intents.
+ 
+ Synopsis:
+  @world
+ 
+ Only useful when the server was started with --tick-rate. Ticks which take longer than the budget are overruns, and make every command wait longer.
+ """
+ if not world.loop.running:
+  return obj.notify('The world loop is not running. Commands are executed by %s.' % ('the event loop' if not server.pool.size else 'the command pool'))
+ s = world.loop.stats()
+ obj.notify('World loop: %s ticks per second (%.2fms budget).' % (s['rate'], s['budget'] * 1000))
+ obj.notify('Ticks: %s, %s overrun%s.' % (s['ticks'], s['overruns'], '' if s['overruns'] == 1 else 's'))
+ obj.notify('Tick duration: %.2fms average, %.2fms p99 (%.0f%% of budget), %.2fms at most.' % (s['average'] * 1000, s['p99'] * 1000, s['p99'] * 100 / s['budget'], s['max'] * 1000))
+ obj.notify('Intents: %s applied (%s error%s), %.2f per tick on average, %s at most, %s pending.' % (s['applied'], s['errors'], '' if s['errors'] == 1 else 's', s['average_batch'], s['max_batch'], s['pending']))
+ return True
+do_world.name = '@world'
+do_world.access = players.WIZARD
+do_world.scope = locks.NONE
+do_world.read_only = True
+add_command('^@world$', do_world)
+
+def do_locks(obj, count):
+ """
+ Shows which locks commands wait for most.
+ 
+ Synopsis:
+  @locks [<count>]
+ 
+ Shows the <count> locks (10 by default) which threads have had to wait for most often. A room or zone which waits a lot is busy enough to hold up the commands of everyone in it.
+ """
+ found = locks.manager.stats()
+ obj.notify('Locks: %s (times in milliseconds).' % len(found))
+ for s in found[:int(count or 10)]:
+  obj.notify('%s: acquired %s time%s, waited %s time%s (%.1f%%), average wait %.2f, max wait %.2f.' % (s['name'], s['acquired'], '' if s['acquired'] == 1 else 's', s['contended'], '' if s['contended'] == 1 else 's', s['contended'] * 100.0 / s['acquired'] if s['acquired'] else 0.0, s['average_wait'] * 1000, s['max_wait'] * 1000))
+ return True
+do_locks.name = '@locks'
+do_locks.access = players.WIZARD
+do_locks.scope = locks.NONE
+do_locks.read_only = True
+add_command(r'^@locks(?: (\d+))?$', do_locks)
+
+def do_snapshot(obj, stats):
+ """
+ Saves the database in the background.
+ 
+ Synopsis:
+  @snapshot
+  @snapshot stats
+ 
+ The objects are written to the dump file by a thread of their own, and you are told how long it took when they have been written. Commands which change the world wait until every object has been read.
+ 
+ @snapshot stats shows how long snapshots have paused the world for and taken.
+ """
+ if stats:
+  s = snapshots.snapshotter.stats()
+  obj.notify('Snapshots: %s taken, %s failed%s.' % (s['taken'], s['failed'], ', one is being taken now' if s['busy'] else ''))
+  obj.notify('Pause: %.2fms average, %.2fms at most.' % (s['average_pause'] * 1000, s['max_pause'] * 1000))
+  obj.notify('Duration: %.2f seconds average, %.2f at most.' % (s['average_duration'], s['max_duration']))
+  if s['last'] is not None:
+   obj.notify('Last snapshot: %s objects (%.2fKB) written to %s.' % (s['last']['objects'], s['last']['size'] / 1024.0, s['last']['filename']))
+  return True
+ def report(result):
+  if isinstance(result, Exception):
+   obj.notify('Snapshot failed: %s' % result)
+  else:
+   obj.notify('Snapshot of %s objects (%.2fKB) written to %s in %.2f seconds. The world was paused for %.2fms.' % (result['objects'], result['size'] / 1024.0, result['filename'], result['duration'], result['paused'] * 1000))
+ if not snapshots.snapshotter.start(callback = report):
+  return obj.notify('A snapshot is already being taken.')
+ obj.notify('Taking a snapshot.')
+ return True
+do_snapshot.name = '@snapshot'
+do_snapshot.access = players.WIZARD
+do_snapshot.scope = locks.NONE
+do_snapshot.read_only = True
+add_command(r'^@snapshot( stats)?$', do_snapshot)
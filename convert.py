@@ -0,0 +1,32 @@
+"""
+Convert a database between formats.
+
+Usage:
+ python convert.py INPUT OUTPUT [-f json|binary]
+
+The format of INPUT is worked out from its first few bytes. OUTPUT is written in the format given with -f, or the one its extension calls for (binary for .lmb, otherwise JSON). Don't convert the database the server is using while it is running.
+
+The journal is always JSON, so if INPUT has one it is copied to go with OUTPUT.
+"""
+
+import os, shutil, serializers
+from argparse import ArgumentParser
+
+parser = ArgumentParser(description = 'Convert a database between formats.')
+parser.add_argument('input', help = 'The database to convert')
+parser.add_argument('output', help = 'Where to write the converted database')
+parser.add_argument('-f', '--format', choices = sorted(serializers.serializers), default = None, help = 'The format to write')
+
+if __name__ == '__main__':
+ args = parser.parse_args()
+ reader = serializers.detect(args.input)
+ writer = serializers.for_filename(args.output, args.format)
+ with open(args.input, reader.mode('r')) as f:
+  stuff = reader.load(f)
+ with open(args.output, writer.mode('w')) as f:
+  writer.dump(stuff, f)
+ print('Converted %s (%s, %s bytes) to %s (%s, %s bytes).' % (args.input, reader.name, os.path.getsize(args.input), args.output, writer.name, os.path.getsize(args.output)))
+ for extension in ('.journal.old', '.journal'):
+  if os.path.isfile(args.input + extension):
+   shutil.copyfile(args.input + extension, args.output + extension)
+   print('Copied %s.' % (args.input + extension))
@@ -1,7 +1,90 @@
 """Database routines and storage."""
 
-objects = [] # List of all loaded objects in the game.
+import threading
+
+class Registry(object):
+ """
+ Every object in the game, indexed by id.
+ 
+ Every object is given an id when it is created, which is never given to another object, even after the first one is destroyed. Objects refer to each other by id in the database, so adding, finding and removing an object are all O(1), and removing one doesn't change anything else.
+ 
+ Iterating over a registry yields objects in the order they were added.
+ 
+ The registry also remembers which objects have changed or been destroyed since changes was last called, so checkpoints only have to write those.
+ """
+ def __init__(self):
+  self.objects = {} # id: object.
+  self.next_id = 0 # The id the next object will get.
+  self.dirty = set() # Objects which have changed since the last checkpoint.
+  self.destroyed = set() # The ids of objects which have been removed since the last checkpoint.
+  self.lock = threading.Lock()
+ 
+ def add(self, obj):
+  """Give obj the next id and add it."""
+  with self.lock:
+   obj.id = self.next_id
+   self.next_id += 1
+   self.objects[obj.id] = obj
+   self.dirty.add(obj)
+ 
+ def mark(self, obj):
+  """Remember that obj has changed, if it is here."""
+  with self.lock:
+   if self.objects.get(getattr(obj, 'id', None)) is obj:
+    self.dirty.add(obj)
+ 
+ def changes(self):
+  """Return a list of the objects which have changed and a list of the ids which have been removed since the last time this was called."""
+  with self.lock:
+   dirty, self.dirty = self.dirty, set()
+   destroyed, self.destroyed = self.destroyed, set()
+  return sorted(dirty, key = lambda obj: obj.id), sorted(destroyed)
+ 
+ def restore(self, dirty, destroyed):
+  """Remember changes returned by changes again, because writing them failed. Objects which have been removed since are left out."""
+  with self.lock:
+   self.dirty.update(obj for obj in dirty if self.objects.get(obj.id) is obj)
+   self.destroyed.update(destroyed)
+ 
+ def reassign(self, obj, id):
+  """Change the id of obj to id, when loading an object which already had one."""
+  with self.lock:
+   other = self.objects.get(id)
+   if other is not None and other is not obj:
+    raise ValueError('Object %r already has id %s.' % (other, id))
+   if self.objects.get(obj.id) is obj:
+    del self.objects[obj.id]
+   obj.id = id
+   self.objects[id] = obj
+   self.next_id = max(self.next_id, id + 1)
+ 
+ def remove(self, obj):
+  """Remove obj, raising ValueError if it isn't here."""
+  with self.lock:
+   if self.objects.get(getattr(obj, 'id', None)) is not obj:
+    raise ValueError('%r is not in the registry.' % obj)
+   del self.objects[obj.id]
+   self.dirty.discard(obj)
+   self.destroyed.add(obj.id)
+ 
+ def get(self, id, default = None):
+  return self.objects.get(id, default)
+ 
+ def __getitem__(self, id):
+  return self.objects[id]
+ 
+ def __contains__(self, obj):
+  return self.objects.get(getattr(obj, 'id', None)) is obj
+ 
+ def __iter__(self):
+  return iter(list(self.objects.values()))
+ 
+ def __len__(self):
+  return len(self.objects)
+
+objects = Registry() # All loaded objects in the game.
 players = [] # List of created players.
+players_by_uid = {} # Players indexed by the username they log in with.
 zones = [] # List of zone objects.
 
 server_config = dict( # Server configuration.
@@ -10,16 +93,45 @@ server_config = dict( # Server configuration.
  timeout_msg = '*** Timed out while waiting for login. ***',
  disconnect_msg = '*** Disconnected ***',
  redirect_msg = '*** Redirecting to {host}:{port}. ***',
+ takeover_timeout = 10, # Number of seconds to wait for an old connection to close when a player logs in again.
  max_create_retries = 5,
  max_create_retries_exceeded = 'Maximum number of retries exceeded. Please come again.',
  server_name = 'The LittleMUD Test Server',
  command_history_length = 100, # The number of commands to store for a given player.
- banned_hosts = [], # Hosts which aren't allowed to connect.
+ save_command_history = False, # If True, command history is saved with the database.
+ command_limits = dict( # Access level: [burst, rate]. Players can send burst lines at once, then rate lines per second. Either being 0 means no limit.
+  NORMAL = [20, 5],
+  BUILDER = [40, 10],
+  PROGRAMMER = [40, 10],
+  WIZARD = [0, 0],
+ ),
+ command_queue_length = 50, # The number of lines to hold from a connection which is sending too fast. Further lines are dropped.
+ throttled_msg = 'You are sending commands too quickly. Some have been ignored.',
+ profile_directory = 'profiles', # Where @profile writes its results.
+ profile_sample_interval = 0.005, # The number of seconds between stack samples while profiling.
+ profile_max_duration = 300, # The longest @profile is allowed to run for.
+ banned_hosts = [], # Addresses and CIDR networks which aren't allowed to connect.
+ max_connections_per_host = 10, # The number of connections allowed from one address at once, or 0 for unlimited.
+ connection_rate = 30, # The number of new connections allowed from one address every connection_rate_period seconds, or 0 for unlimited.
+ connection_rate_period = 60,
+ dns_cache_size = 1024, # The number of host name lookups to remember.
+ dns_ttl = 3600, # Number of seconds to remember a successful lookup for.
+ dns_negative_ttl = 300, # Number of seconds to remember a failed lookup for.
+ dns_timeout = 5, # Number of seconds to wait for a lookup to finish.
+ journal_max_size = 16 * 1024 * 1024, # When the journal grows past this many bytes, the database is dumped and the journal is emptied.
+ journal_sync = True, # If True, wait for each checkpoint to reach the disk.
+ copy_dumps = False, # If True, db.dump copies the world so it can be written without keeping it locked, which uses twice the memory.
 )
 
 objects_config = {} # Configuration which requires objects.
 
-import json, logging, objects as _objects, server, options
+journal = None # The Journal for the file the database was loaded from.
+snapshot_lock = threading.Lock() # Held while the database is being dumped.
+
+import json, logging, os, objects as _objects, server, options, bans, locks, snapshots, serializers, journal as _journal
+from contextlib import nullcontext
+from copy import deepcopy
+from time import time
 logger = logging.getLogger('DB')
 
 def dump_object_property(p):
@@ -33,7 +145,7 @@ def dump_object_property(p):
   for x in p:
    stuff.append(dump_object_property(x))
  elif isinstance(p, _objects.BaseObject):
-  stuff = objects.index(p)
+  stuff = p.id if p in objects else None # Destroyed objects are saved as nothing.
  else:
   stuff = p
  return stuff
@@ -49,56 +161,196 @@ def load_object_property(p):
   for x in p:
    stuff.append(load_object_property(x))
  elif type(p) == int:
-  stuff = objects[p]
+  stuff = objects.get(p)
+  if stuff is None:
+   logger.warning('There is no object with id %s.', p)
  else:
   stuff = p
  return stuff
 
 def load(filename = None):
- """Load the database from the file object fp."""
+ """Load the database from filename, then apply any checkpoints from its journal."""
+ global journal
  if filename == None:
   filename = options.args.dump_file
  logger.info('Loading database from %s.', filename)
+ stuff = {} # Everything but the objects.
+ pending = [] # (object, object properties) pairs, loaded once every object exists.
+ serializer = serializers.detect(filename)
+ with open(filename, serializer.mode('r')) as f:
+  for x, y in serializer.read(f): # One object at a time, so the file is never all in memory.
+   if x == 'objects':
+    cls, properties = y
+    new = getattr(_objects, cls)()
+    objects.reassign(new, properties.get('id', len(pending))) # Older databases referred to objects by their position in the list.
+    pending.append((new, properties.pop('object_properties', {})))
+    new.load(properties)
+   else:
+    stuff[x] = y
+    if x == 'server_config':
+     server_config.update(**y)
+     bans.rebuild()
+ objects.next_id = max(objects.next_id, stuff.get('next_id', 0))
+ for obj, properties in pending:
+  obj.load_object_properties(properties)
+ for x, y in stuff.get('objects_config', {}).items():
+  objects_config[x] = load_object_property(y)
+ logger.info('Loaded %s object%s.', len(pending), '' if len(pending) == 1 else 's')
+ del pending
+ if journal is not None:
+  journal.close()
+ journal = _journal.Journal(filename)
+ journal.sequence = stuff.get('sequence', 0)
+ applied = 0
+ for record in journal.records(journal.sequence):
+  apply(record)
+  applied += 1
+ if applied:
+  logger.info('Applied %s checkpoint%s from %s.', applied, '' if applied == 1 else 's', journal.filename)
+ objects.changes() # Everything loaded so far is already on disk.
+ journal.server_config = json.dumps(server_config, sort_keys = True)
+ journal.objects_config = json.dumps(dump_object_property(objects_config), sort_keys = True)
+ if 'start_room' not in objects_config:
+  logger.info('Creating initial zone.')
+  z = _objects.ZoneObject('The First Zone')
+  logger.info('Creating start room.')
+  objects_config['start_room'] = _objects.RoomObject('The First Room')
+  objects_config['start_room'].move(z)
+ else:
+  logger.info('Start room: %s.', objects_config['start_room'])
+
+def apply(record):
+ """Apply a checkpoint from the journal."""
+ for id in record.get('destroyed', []):
+  obj = objects.get(id)
+  if obj is not None:
+   obj.destroy()
  properties = []
- with open(filename, 'r') as f:
-  stuff = json.load(f)
-  o = stuff.get('objects', [])
-  server_config.update(**stuff.get('server_config', {}))
-  for x, y in o:
-   new = getattr(_objects, x)()
-   y['object'] = new
-   properties.append(y)
-  for p in properties:
-   p['object'].load(p)
-  for x, y in stuff.get('objects_config', {}).items():
-   objects_config[x] = load_object_property(y)
-  if 'start_room' not in objects_config:
-   logger.info('Creating initial zone.')
-   z = _objects.ZoneObject('The First Zone')
-   logger.info('Creating start room.')
-   objects_config['start_room'] = _objects.RoomObject('The First Room')
-   objects_config['start_room'].move(z)
-  else:
-   logger.info('Start room: %s.', objects_config['start_room'])
-  logger.info('Loaded %s object%s.', len(properties), '' if len(properties) == 1 else 's')
+ for x, y in record.get('objects', []):
+  obj = objects.get(y['id'])
+  if obj is None:
+   obj = getattr(_objects, x)()
+   objects.reassign(obj, y['id'])
+  properties.append((obj, y))
+ objects.next_id = max(objects.next_id, record.get('next_id', 0))
+ for obj, y in properties:
+  obj.load(y)
+ if 'server_config' in record:
+  server_config.update(**record['server_config'])
+  bans.rebuild()
+ for x, y in record.get('objects_config', {}).items():
+  objects_config[x] = load_object_property(y)
+
+def checkpoint():
+ """Write every object which has changed since the last checkpoint to the journal, starting a snapshot if it has grown past server_config['journal_max_size']. Returns the number of objects written."""
+ if journal is None:
+  return 0
+ with locks.manager.hold(locks.WORLD, shared = True), journal.lock:
+  dirty, destroyed = objects.changes()
+  record = dict(time = time(), next_id = objects.next_id)
+  if dirty:
+   record['objects'] = [x.dump() for x in dirty]
+  if destroyed:
+   record['destroyed'] = destroyed
+  config = json.dumps(server_config, sort_keys = True)
+  if config != journal.server_config:
+   record['server_config'] = server_config
+  object_config = dump_object_property(objects_config)
+  if json.dumps(object_config, sort_keys = True) != journal.objects_config:
+   record['objects_config'] = object_config
+  if not (dirty or destroyed or 'server_config' in record or 'objects_config' in record):
+   return 0
+  try:
+   journal.write(record, sync = server_config['journal_sync'])
+  except:
+   objects.restore(dirty, destroyed)
+   raise
+  journal.server_config = config
+  journal.objects_config = json.dumps(object_config, sort_keys = True)
+  logger.debug('Checkpoint %s: %s object%s changed, %s destroyed.', journal.sequence, len(dirty), '' if len(dirty) == 1 else 's', len(destroyed))
+  size = journal.size
+ if size >= server_config['journal_max_size'] and snapshots.snapshotter.start(journal.dump_file):
+  logger.info('The journal is %s bytes, compacting.', size)
+ return len(dirty)
+
+def capture(filename, copy = True):
+ """
+ Return a dictionary of the settings which need to be written to filename, the objects to write after them, and the changes returned by objects.changes if the journal is being compacted (None otherwise). If the dump isn't written, pass those changes to failed. Must be called with the world locked.
+ 
+ If copy is True, the objects are copied into a list, so they can be written after the world is unlocked. Otherwise they are an iterator which copies each object as it is needed, so the world must stay locked until they have been written.
+ """
+ compacting = journal is not None and os.path.abspath(filename) == os.path.abspath(journal.dump_file)
+ with (journal.lock if compacting else nullcontext()):
+  changes = None
+  if compacting:
+   changes = objects.changes() # Everything is about to be written.
+   journal.rotate()
+  header = dict(
+   next_id = objects.next_id,
+   sequence = 0 if journal is None else journal.sequence,
+   server_config = deepcopy(server_config),
+   objects_config = dump_object_property(objects_config),
+  )
+  if compacting:
+   journal.server_config = json.dumps(header['server_config'], sort_keys = True)
+   journal.objects_config = json.dumps(header['objects_config'], sort_keys = True)
+ records = (x.dump() for x in objects)
+ return header, list(records) if copy else records, changes
+
+def failed(changes):
+ """Called when a dump which compacted the journal couldn't be written, with the changes capture took. They are put back so the next checkpoint writes them, along with the configuration."""
+ objects.restore(*changes)
+ journal.server_config = None
+ journal.objects_config = None
+
+def write(header, records, filename):
+ """Write header and records to filename through a temporary file, so nothing is lost if the server stops halfway through. The format is chosen with --dump-format, or by the extension of filename. Returns the number of objects and the size of the file."""
+ serializer = serializers.for_filename(filename, options.args.dump_format)
+ temporary = filename + '.tmp'
+ with open(temporary, serializer.mode('w')) as f:
+  count = serializer.write(f, header, records)
+ os.replace(temporary, filename)
+ return count, os.path.getsize(filename)
 
 def dump(filename = None):
- """Dump a serialised version of the current object state to fp."""
+ """
+ Dump a serialised version of the current object state to filename. If filename is the file the journal belongs to, the journal is emptied.
+ 
+ The world is locked (shared) while it is being read. If server_config['copy_dumps'] is True, the objects are copied and written once the world is unlocked, so it is paused for as short a time as possible. Otherwise each object is written as soon as it has been read, so the world stays locked until the file is written, but there is never a second copy of the world in memory.
+ 
+ Returns a dictionary with the number of objects written, the size of the file in bytes, and how many seconds the world was locked for and the whole dump took.
+ """
  if filename == None:
   filename = options.args.dump_file
- stuff = dict(
-  objects = [x.dump() for x in objects],
-  server_config = server_config,
-  objects_config = dump_object_property(objects_config),
- )
- logger.info('Dumping the database to %s.', filename)
- with open(filename, 'w') as f:
-  json.dump(stuff, f, indent = 1)
-  logger.info('Dumped %s object%s.', len(stuff['objects']), '' if len(stuff['objects']) == 1 else 's')
+ copy = server_config['copy_dumps']
+ changes = None
+ with snapshot_lock:
+  started = time()
+  try:
+   with locks.manager.hold(locks.WORLD, shared = True):
+    locked = time()
+    header, records, changes = capture(filename, copy = copy)
+    if not copy:
+     logger.info('Dumping the database to %s.', filename)
+     count, size = write(header, records, filename)
+   paused = time() - locked
+   if copy:
+    logger.info('Dumping the database to %s.', filename)
+    count, size = write(header, records, filename)
+    del records
+  except:
+   if changes is not None:
+    failed(changes)
+   raise
+  if changes is not None:
+   journal.discard_old()
+  duration = time() - started
+  logger.info('Dumped %s object%s in %.2f seconds (the world was paused for %.2f milliseconds).', count, '' if count == 1 else 's', duration, paused * 1000)
+ return dict(filename = filename, objects = count, size = size, paused = paused, duration = duration)
 
 def clear():
- while objects:
-  objects[0].destroy()
+ for o in objects:
+  o.destroy()
 
 def get_players():
  """Return a list of players."""
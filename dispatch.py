@@ -0,0 +1,116 @@
+"""
+Command dispatch.
+
+A Dispatcher holds command regexps in the order they were added, indexed by the literal text every match has to start with. For example, '^(?:say |"|\')(.*)$' can only match lines starting with 'say ', '"' or "'". The prefixes are stored in a trie of characters, so finding the regexps which could match a line takes one step per character of the longest prefix, no matter how many commands there are.
+
+Regexps whose prefix can't be worked out (like '^(\\w+) (.*)$') are tried for every line.
+"""
+
+import re
+try:
+ from re import _parser as sre_parse
+except ImportError:
+ import sre_parse # Python 3.10 and older.
+
+max_prefixes = 32 # Give up on regexps which could start more ways than this.
+
+def prefixes(pattern):
+ """Return the set of literal strings which every match of the compiled regexp pattern starts with one of. The set contains '' if pattern can match without a literal prefix."""
+ if pattern.flags & re.IGNORECASE:
+  return set([''])
+ return _prefixes(sre_parse.parse(pattern.pattern, pattern.flags))[0]
+
+def _prefixes(items):
+ """Return (prefixes, complete) for a parsed regexp. complete is True if the prefixes are everything the regexp can match."""
+ results = set([''])
+ for op, av in items:
+  if op == sre_parse.AT:
+   continue # Anchors don't match any text.
+  elif op == sre_parse.LITERAL:
+   options, complete = set([chr(av)]), True
+  elif op == sre_parse.IN and all(x[0] == sre_parse.LITERAL for x in av):
+   options, complete = set(chr(x[1]) for x in av), True
+  elif op == sre_parse.SUBPATTERN:
+   if av[1] or av[2]:
+    return (results, False) # Inline flags like (?i:...) can change what the literals inside match.
+   options, complete = _prefixes(av[-1])
+  elif op == sre_parse.BRANCH:
+   options, complete = set(), True
+   for branch in av[1]:
+    branch_options, branch_complete = _prefixes(branch)
+    options |= branch_options
+    complete = complete and branch_complete
+  elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT) and av[:2] == (0, 1):
+   options, complete = _prefixes(av[2])
+   options.add('')
+  else:
+   return (results, False)
+  combined = set(x + y for x in results for y in options)
+  if len(combined) > max_prefixes:
+   return (results, False)
+  results = combined
+  if not complete:
+   return (results, False)
+ return (results, True)
+
+class Node(object):
+ """A node in the trie."""
+ __slots__ = ['children', 'entries']
+ def __init__(self):
+  self.children = {} # character: Node.
+  self.entries = [] # (order, pattern, func) for regexps with the prefix which ends here.
+
+class Dispatcher(object):
+ """Finds the commands which could match a line."""
+ def __init__(self):
+  self.root = Node()
+  self.commands = {} # pattern: (order, func).
+  self.order = 0 # The order the next new command will get.
+ 
+ def add(self, pattern, func):
+  """Add func for the compiled regexp pattern. If pattern was already added, func replaces the old function without changing the order, and the old function is returned."""
+  old = None
+  if pattern in self.commands:
+   order, old = self.commands[pattern]
+   self._remove(pattern)
+  else:
+   order = self.order
+   self.order += 1
+  self.commands[pattern] = (order, func)
+  for prefix in prefixes(pattern):
+   node = self.root
+   for character in prefix:
+    node = node.children.setdefault(character, Node())
+   node.entries.append((order, pattern, func))
+  return old
+ 
+ def _remove(self, pattern):
+  """Remove every entry for pattern from the trie."""
+  for prefix in prefixes(pattern):
+   node = self.root
+   for character in prefix:
+    node = node.children[character]
+   node.entries[:] = [x for x in node.entries if x[1] is not pattern]
+ 
+ def candidates(self, line):
+  """Return [(pattern, func), ...] for every regexp which could match line, in the order they were added."""
+  found = list(self.root.entries)
+  node = self.root
+  for character in line:
+   node = node.children.get(character)
+   if node is None:
+    break
+   found += node.entries
+  if len(found) > 1:
+   found = sorted(set(found), key = lambda entry: entry[0]) # A regexp can be reached through more than one prefix.
+  return [(pattern, func) for order, pattern, func in found]
+ 
+ def items(self):
+  """Return [(pattern, func), ...] for every command in the order they were added."""
+  return [(pattern, func) for pattern, (order, func) in sorted(self.commands.items(), key = lambda item: item[1][0])]
+ 
+ def values(self):
+  return [func for pattern, func in self.items()]
+ 
+ def __len__(self):
+  return len(self.commands)
@@ -0,0 +1,132 @@
+"""
+Help for commands.
+
+Command docstrings are parsed once, when the command is added, into a Topic with a summary (the first paragraph), the lines from the Synopsis: section, and the rest of the text. Every word is added to an inverted index, so help search doesn't have to read every docstring.
+
+The @commands listing is rendered once for each access level which asks for it, and thrown away whenever a command is added or replaced.
+"""
+
+import re, threading, util
+from inspect import getdoc
+
+word_re = re.compile(r'[@\w]+')
+
+def words(text):
+ """Return the lower case words in text."""
+ return word_re.findall(text.lower())
+
+class Topic(object):
+ """The parsed help for a command function."""
+ def __init__(self, func):
+  self.func = func
+  self.names = func.name.split() # Everything the command can be typed as.
+  self.summary = ''
+  self.synopsis = [] # Lines from the Synopsis: section.
+  self.body = [] # The remaining paragraphs.
+  paragraphs = re.split(r'\n\s*\n', (getdoc(func) or '').strip())
+  for paragraph in paragraphs:
+   lines = [line.strip() for line in paragraph.split('\n') if line.strip()]
+   if not lines:
+    continue
+   if lines[0] == 'Synopsis:':
+    self.synopsis += lines[1:]
+   elif not self.summary:
+    self.summary = ' '.join(lines)
+   else:
+    self.body.append(' '.join(lines))
+ 
+ @property
+ def name(self):
+  return self.names[0]
+ 
+ def title(self):
+  """Return the names of this command the way @commands shows them."""
+  return util.english_list(self.names, and_string = 'or').capitalize()
+ 
+ def text(self):
+  """Return everything which is searched."""
+  return ' '.join([' '.join(self.names), self.summary] + self.synopsis + self.body)
+ 
+ def lines(self):
+  """Return the lines shown by help <topic>."""
+  lines = ['Help on %s: %s' % (self.title(), self.summary)]
+  if self.synopsis:
+   lines.append('Synopsis:')
+   lines += ['  %s' % line for line in self.synopsis]
+  lines += self.body
+  return lines
+
+class Index(object):
+ """Topics for every command, with an inverted index of the words in them."""
+ def __init__(self):
+  self.topics = {} # func: Topic.
+  self.order = [] # Functions in the order they were added.
+  self.names = {} # name: Topic.
+  self.words = {} # word: {Topic: the number of times word appears in it}.
+  self.listings = {} # access: the lines @commands shows players with that access.
+  self.lock = threading.Lock()
+ 
+ def add(self, func, replaces = None):
+  """Add the topic for func. If replaces is not None, its topic is discarded and func takes its place in the listing."""
+  topic = Topic(func)
+  with self.lock:
+   position = self.order.index(replaces) if replaces in self.topics else len(self.order)
+   self._discard(replaces)
+   if func in self.topics:
+    return # Already added with another regexp.
+   self.topics[func] = topic
+   self.order.insert(position, func)
+   for name in topic.names:
+    self.names[name.lower()] = topic
+   for word in words(topic.text()):
+    counts = self.words.setdefault(word, {})
+    counts[topic] = counts.get(topic, 0) + 1
+   self.listings.clear()
+ 
+ def discard(self, func):
+  with self.lock:
+   self._discard(func)
+ 
+ def _discard(self, func):
+  topic = self.topics.pop(func, None)
+  if topic is None:
+   return
+  self.order.remove(func)
+  for name in topic.names:
+   if self.names.get(name.lower()) is topic:
+    del self.names[name.lower()]
+  for word in set(words(topic.text())):
+   counts = self.words[word]
+   del counts[topic]
+   if not counts:
+    del self.words[word]
+  self.listings.clear()
+ 
+ def topic(self, name, access):
+  """Return the topic called name (or @name) which a player with the given access can see, or None."""
+  topic = self.names.get(name.lower()) or self.names.get('@' + name.lower())
+  if topic is not None and access >= topic.func.access:
+   return topic
+ 
+ def search(self, text, access):
+  """Return the topics a player with the given access can see which contain every word in text, best matches first. Words in a command's names count more than the rest."""
+  found = None
+  scores = {}
+  with self.lock:
+   for word in set(words(text)):
+    counts = self.words.get(word, {})
+    found = set(counts) if found is None else found & set(counts)
+    for topic, count in counts.items():
+     scores[topic] = scores.get(topic, 0) + count + 5 * (word in [name.lower() for name in topic.names])
+  topics = [topic for topic in (found or ()) if access >= topic.func.access]
+  return sorted(topics, key = lambda topic: (-scores[topic], topic.name))
+ 
+ def listing(self, access):
+  """Return the lines for @commands, rendering them if nobody with this access level has asked since the commands last changed."""
+  lines = self.listings.get(access)
+  if lines is None:
+   with self.lock:
+    topics = [self.topics[func] for func in self.order if access >= func.access]
+    lines = ['%s: %s' % (topic.title(), topic.summary) for topic in topics]
+    self.listings[access] = lines
+  return lines
@@ -0,0 +1,62 @@
+"""Command history."""
+
+class CommandHistory(object):
+ """
+ The last size commands entered by a player, stored in a ring buffer.
+ 
+ Adding a command and looking one up by index are O(1), and once the buffer is full the oldest command is overwritten rather than deleted from the front of a list.
+ 
+ Indexes work like they do for lists, so history[-1] is the most recent command.
+ """
+ def __init__(self, size, commands = ()):
+  self.size = size
+  self.buffer = [None] * size
+  self.start = 0 # The index in buffer of the oldest command.
+  self.length = 0 # The number of commands stored.
+  for command in commands:
+   self.append(command)
+ 
+ def append(self, command):
+  """Add command, forgetting the oldest command if the history is full."""
+  if not self.size:
+   return
+  if self.length < self.size:
+   self.buffer[(self.start + self.length) % self.size] = command
+   self.length += 1
+  else:
+   self.buffer[self.start] = command
+   self.start = (self.start + 1) % self.size
+ 
+ def __getitem__(self, index):
+  if index < 0:
+   index += self.length
+  if not 0 <= index < self.length:
+   raise IndexError('Command history index out of range.')
+  return self.buffer[(self.start + index) % self.size]
+ 
+ def __len__(self):
+  return self.length
+ 
+ def __iter__(self):
+  """Yield the commands from oldest to newest."""
+  for x in range(self.length):
+   yield self.buffer[(self.start + x) % self.size]
+ 
+ def resize(self, size):
+  """Change the number of commands which are kept, forgetting the oldest ones if there are too many."""
+  commands = list(self)[-size:] if size else []
+  self.__init__(size, commands)
+ 
+ def clear(self):
+  self.__init__(self.size)
+ 
+ def dump(self):
+  """Return the history as a single string, which takes up much less room in the database than a list. Newlines in commands are replaced with spaces."""
+  return '\n'.join(command.replace('\n', ' ') for command in self)
+ 
+ @classmethod
+ def load(cls, size, value):
+  """Return a new history from something returned by dump, or from a list of commands as older databases stored them."""
+  if not isinstance(value, (list, tuple)):
+   value = value.split('\n') if value else []
+  return cls(size, value[-size:] if size else [])
@@ -0,0 +1,106 @@
+"""
+The database journal.
+
+Dumping the whole database takes longer the bigger the world gets, so it only happens when the server shuts down, or when the journal gets too big. In between, db.checkpoint appends the objects which have changed since the last checkpoint to a journal next to the dump file, as a single line of JSON.
+
+Every checkpoint has a sequence number, and every dump records the sequence number of the last checkpoint it includes. When the database is loaded, checkpoints from the journal with higher sequence numbers are applied on top of the dump.
+
+When the database is dumped to the file the journal belongs to (compaction), the journal is moved aside first, and deleted once the new dump has been written. If the server stops in between, the old journal is read before the current one, and anything already in the dump is skipped because of its sequence number.
+"""
+
+import json, logging, os, threading
+
+logger = logging.getLogger('Journal')
+
+class Journal(object):
+ """The journal for the dump file dump_file."""
+ def __init__(self, dump_file):
+  self.dump_file = dump_file
+  self.filename = dump_file + '.journal'
+  self.old_filename = self.filename + '.old' # Where the journal is moved while it is being compacted.
+  self.sequence = 0 # The sequence number of the last checkpoint.
+  self.file = None # Opened when the first checkpoint is written.
+  self.size = 0 # The size of the current file in bytes.
+  self.server_config = None # The last server configuration written, as JSON.
+  self.objects_config = None # The last objects configuration written, as JSON.
+  self.checkpoints = 0 # Checkpoints written since the server started.
+  self.compactions = 0
+  self.lock = threading.RLock() # Held while writing or compacting.
+ 
+ def open(self):
+  """Open the journal for appending, throwing away a line which was only partly written."""
+  if os.path.isfile(self.filename):
+   with open(self.filename, 'rb+') as f:
+    data = f.read()
+    end = data.rfind(b'\n') + 1
+    if end < len(data):
+     logger.warning('Discarding %s bytes from the end of %s.', len(data) - end, self.filename)
+     f.truncate(end)
+  self.file = open(self.filename, 'a')
+  self.size = self.file.tell()
+ 
+ def close(self):
+  if self.file is not None:
+   self.file.close()
+   self.file = None
+ 
+ def write(self, record, sync = True):
+  """Write record as the next checkpoint, setting its sequence number. If sync is True, wait until it is on disk."""
+  with self.lock:
+   if self.file is None:
+    self.open()
+   self.sequence += 1
+   record['sequence'] = self.sequence
+   line = json.dumps(record) + '\n'
+   self.file.write(line)
+   self.file.flush()
+   if sync:
+    os.fsync(self.file.fileno())
+   self.size += len(line)
+   self.checkpoints += 1
+ 
+ def rotate(self):
+  """Move the journal aside before compacting. It is kept until discard_old is called."""
+  with self.lock:
+   self.close()
+   self.size = 0
+   if not os.path.isfile(self.filename):
+    return
+   if os.path.isfile(self.old_filename): # The last compaction didn't finish.
+    with open(self.old_filename, 'a') as old, open(self.filename, 'r') as f:
+     old.write(f.read())
+    os.remove(self.filename)
+   else:
+    os.replace(self.filename, self.old_filename)
+ 
+ def discard_old(self):
+  """Delete the old journal once the dump which replaces it has been written."""
+  if os.path.isfile(self.old_filename):
+   os.remove(self.old_filename)
+  self.compactions += 1
+ 
+ def records(self, after = 0):
+  """Yield every checkpoint with a sequence number greater than after, from the old journal and then the current one. Reading a file stops at the first line which can't be read."""
+  for filename in (self.old_filename, self.filename):
+   if not os.path.isfile(filename):
+    continue
+   with open(filename, 'r') as f:
+    for number, line in enumerate(f, 1):
+     try:
+      record = json.loads(line)
+     except ValueError:
+      logger.warning('Ignoring %s from line %s, which could not be read.', filename, number)
+      break
+     self.sequence = max(self.sequence, record['sequence'])
+     if record['sequence'] > after:
+      yield record
+ 
+ def stats(self):
+  """Return a dictionary of statistics about this journal."""
+  return dict(
+   filename = self.filename,
+   sequence = self.sequence,
+   size = self.size,
+   checkpoints = self.checkpoints,
+   compactions = self.compactions,
+  )
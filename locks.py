@@ -0,0 +1,199 @@
+"""
+World, zone and room locks.
+
+Commands are executed by several worker threads at once. To stop them changing the same objects at the same time, every command holds locks while it executes. How much it locks depends on its scope, which is set with the scope attribute of the command function:
+
+room - The player's room is locked, so commands in other rooms can run at the same time.
+zone - The player's zone is locked, for commands which affect more than one room in the zone, like moving between rooms.
+world - Everything is locked, so nothing else runs at the same time. This is the default, so commands which don't say otherwise are as safe as they ever were.
+none - Nothing is locked, for commands which don't use the world at all, like @uptime.
+
+Commands with a true read_only attribute take shared locks instead, so they only wait for commands which change what they are reading, and any number of them can run at once.
+
+Locks are hierarchical: the world contains zones, which contain rooms. Locking a room exclusively also takes intention locks on its zone and the world, which stop them being locked exclusively without getting in the way of other rooms. Locks are always acquired from the world down, so two commands can't each be waiting for a lock the other holds.
+
+The room and zone are worked out before the locks are taken, so a command which is moved by another command while it waits for them checks again once it has them, and waits for the locks for its new room instead.
+
+A thread which already holds locks doesn't take any more, so commands which call do_command (like .) must use a scope which covers whatever they might run.
+"""
+
+import threading
+from contextlib import contextmanager
+from functools import wraps
+from time import time
+
+ROOM = 'room'
+ZONE = 'zone'
+WORLD = 'world'
+NONE = 'none'
+scopes = [ROOM, ZONE, WORLD, NONE]
+
+# Lock modes:
+IS = 'IS' # Intends to lock something inside this shared.
+IX = 'IX' # Intends to lock something inside this exclusively.
+S = 'S' # Shared: can be read but not changed.
+X = 'X' # Exclusive.
+
+conflicts = { # mode: the modes it can't be held alongside.
+ IS: [X],
+ IX: [S, X],
+ S: [IX, X],
+ X: [IS, IX, S, X],
+}
+
+local = threading.local() # Locks held by the current thread.
+
+class Lock(object):
+ """A lock which can be held in any of the modes above, recording how often threads had to wait for it."""
+ def __init__(self):
+  self.condition = threading.Condition()
+  self.held = dict((mode, 0) for mode in conflicts) # mode: the number of threads holding this lock in that mode.
+  self.exclusive_waiting = 0 # Threads waiting for X. Other modes wait behind them so they can't be starved.
+  self.acquired = 0
+  self.contended = 0 # The number of times a thread had to wait.
+  self.total_wait = 0.0
+  self.max_wait = 0.0
+ 
+ def available(self, mode):
+  if mode != X and self.exclusive_waiting:
+   return False
+  for other in conflicts[mode]:
+   if self.held[other]:
+    return False
+  return True
+ 
+ def acquire(self, mode):
+  with self.condition:
+   self.acquired += 1
+   if not self.available(mode):
+    self.contended += 1
+    started = time()
+    if mode == X:
+     self.exclusive_waiting += 1
+    while not self.available(mode):
+     self.condition.wait()
+    if mode == X:
+     self.exclusive_waiting -= 1
+    wait = time() - started
+    self.total_wait += wait
+    self.max_wait = max(wait, self.max_wait)
+   self.held[mode] += 1
+ 
+ def release(self, mode):
+  with self.condition:
+   self.held[mode] -= 1
+   self.condition.notify_all()
+ 
+ def stats(self, name):
+  """Return a dictionary of statistics about this lock, which is called name."""
+  with self.condition:
+   return dict(
+    name = name,
+    acquired = self.acquired,
+    contended = self.contended,
+    average_wait = self.total_wait / self.contended if self.contended else 0.0,
+    max_wait = self.max_wait,
+   )
+
+class LockManager(object):
+ """Hands out a lock for the world, and one for each zone and room."""
+ def __init__(self):
+  self.world = Lock()
+  self.locks = {} # object: Lock.
+  self.lock = threading.Lock() # Used when changing self.locks.
+ 
+ def lock_for(self, obj):
+  """Return the lock for the room or zone obj, creating it if necessary."""
+  lock = self.locks.get(obj)
+  if lock is None:
+   with self.lock:
+    lock = self.locks.setdefault(obj, Lock())
+  return lock
+ 
+ def forget(self, obj):
+  """Forget the lock for obj, which has been destroyed."""
+  with self.lock:
+   self.locks.pop(obj, None)
+ 
+ def plan(self, scope, room = None, zone = None, shared = False):
+  """Return the (lock, mode) pairs needed for scope, from the world down. If the room or zone needed is None, the world is locked instead. If shared is True, the locks are shared rather than exclusive."""
+  intention, mode = (IS, S) if shared else (IX, X)
+  if scope == NONE:
+   return []
+  elif scope == ROOM and room is not None:
+   plan = [(self.world, intention)]
+   if zone is not None:
+    plan.append((self.lock_for(zone), intention))
+   plan.append((self.lock_for(room), mode))
+   return plan
+  elif scope in (ROOM, ZONE) and zone is not None:
+   return [(self.world, intention), (self.lock_for(zone), mode)]
+  return [(self.world, mode)]
+ 
+ def acquire(self, plan):
+  """Acquire every (lock, mode) pair in plan in order, returning the ones which were acquired."""
+  acquired = []
+  try:
+   for lock, mode in plan:
+    lock.acquire(mode)
+    acquired.append((lock, mode))
+  except:
+   self.release(acquired)
+   raise
+  return acquired
+ 
+ def release(self, acquired):
+  """Release locks returned by acquire, from the bottom up."""
+  for lock, mode in reversed(acquired):
+   lock.release(mode)
+ 
+ @contextmanager
+ def hold(self, scope, room = None, zone = None, shared = False):
+  """Hold the locks needed for scope until the with block finishes. Does nothing if this thread already holds locks."""
+  if getattr(local, 'held', None):
+   yield
+   return
+  local.held = acquired = self.acquire(self.plan(scope, room, zone, shared))
+  try:
+   yield
+  finally:
+   local.held = None
+   self.release(acquired)
+ 
+ @contextmanager
+ def hold_for(self, obj, scope, shared = False, tries = 3):
+  """Like hold, but for the room obj is in and its zone. If obj is moved while this thread is waiting for the locks, they are released and the locks for where it is now are taken instead. If it is still moving after tries attempts, the world is locked, so it can't move again."""
+  if getattr(local, 'held', None):
+   yield
+   return
+  for attempt in range(tries):
+   room = obj.location
+   zone = None if room is None else room.location
+   held = self.acquire(self.plan(scope, room, zone, shared))
+   if obj.location is room and (room is None or room.location is zone):
+    break
+   self.release(held)
+  else:
+   held = self.acquire(self.plan(WORLD, shared = shared))
+  local.held = held
+  try:
+   yield
+  finally:
+   local.held = None
+   self.release(held)
+ 
+ def stats(self):
+  """Return statistics for every lock, most contended first."""
+  with self.lock:
+   found = list(self.locks.items())
+  return sorted([self.world.stats('World')] + [lock.stats(obj.title()) for obj, lock in found], key = lambda s: (s['contended'], s['acquired']), reverse = True)
+
+manager = LockManager()
+
+def exclusive(func):
+ """Decorator which calls func with the whole world locked."""
+ @wraps(func)
+ def inner(*args, **kwargs):
+  with manager.hold(WORLD):
+   return func(*args, **kwargs)
+ return inner
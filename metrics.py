@@ -0,0 +1,134 @@
+"""
+Command metrics.
+
+commands.do_command calls record after every command it executes. For each command function this keeps the number of calls and errors, along with histograms of how long lines waited in the worker queue and how long the command took.
+
+Histograms work like HDR histograms: values are counted in buckets which are a fixed fraction of their value wide, so percentiles are accurate to within that fraction whether a command takes microseconds or minutes, and recording a value is O(1).
+"""
+
+import json, logging, threading
+from time import time
+
+logger = logging.getLogger('Metrics')
+
+class Histogram(object):
+ """Counts values in log-linear buckets. Values are stored in multiples of unit, and each bucket is at most 1 / 2 ** precision of its values wide."""
+ def __init__(self, unit = 0.000001, precision = 5):
+  self.unit = unit # The smallest difference which is recorded.
+  self.precision = precision
+  self.counts = {} # (shift, mantissa): count. Bucket values go from mantissa << shift up to the next bucket.
+  self.count = 0
+  self.total = 0.0
+  self.min = None
+  self.max = None
+ 
+ def bucket(self, value):
+  """Return the key of the bucket value goes in."""
+  n = int(value / self.unit)
+  shift = max(0, n.bit_length() - self.precision - 1)
+  return (shift, n >> shift)
+ 
+ def record(self, value):
+  key = self.bucket(value)
+  self.counts[key] = self.counts.get(key, 0) + 1
+  self.count += 1
+  self.total += value
+  if self.min is None or value < self.min:
+   self.min = value
+  if self.max is None or value > self.max:
+   self.max = value
+ 
+ def percentile(self, fraction):
+  """Return the value which fraction of the recorded values are less than or equal to, or 0.0 if nothing has been recorded."""
+  if not self.count:
+   return 0.0
+  target = max(1, fraction * self.count)
+  seen = 0
+  for shift, mantissa in sorted(self.counts):
+   seen += self.counts[(shift, mantissa)]
+   if seen >= target:
+    return min(self.max, (((mantissa + 1) << shift) - 1) * self.unit) # The highest value in the bucket.
+  return self.max
+ 
+ def mean(self):
+  return self.total / self.count if self.count else 0.0
+ 
+ def dump(self):
+  """Return this histogram as something which can be saved as JSON."""
+  return dict(unit = self.unit, precision = self.precision, counts = [[shift, mantissa, count] for (shift, mantissa), count in sorted(self.counts.items())], count = self.count, total = self.total, min = self.min, max = self.max)
+ 
+ @classmethod
+ def load(cls, stuff):
+  """Return a histogram from something returned by dump."""
+  h = cls(stuff['unit'], stuff['precision'])
+  h.counts = dict(((shift, mantissa), count) for shift, mantissa, count in stuff['counts'])
+  h.count, h.total, h.min, h.max = stuff['count'], stuff['total'], stuff['min'], stuff['max']
+  return h
+
+class CommandMetrics(object):
+ """Everything recorded for one command."""
+ def __init__(self, name):
+  self.name = name
+  self.calls = 0
+  self.errors = 0 # The number of calls which raised an exception.
+  self.wait = Histogram() # Seconds spent in the worker queue.
+  self.time = Histogram() # Seconds spent executing the command.
+  self.lock = threading.Lock()
+ 
+ def record(self, wait, duration, error):
+  with self.lock:
+   self.calls += 1
+   self.errors += error
+   self.wait.record(wait)
+   self.time.record(duration)
+ 
+ def summary(self):
+  """Return a dictionary of the numbers @stats shows."""
+  with self.lock:
+   return dict(
+    name = self.name,
+    calls = self.calls,
+    errors = self.errors,
+    p50 = self.time.percentile(0.5),
+    p99 = self.time.percentile(0.99),
+    max = self.time.max,
+    total = self.time.total,
+    wait_p99 = self.wait.percentile(0.99),
+   )
+ 
+ def dump(self):
+  with self.lock:
+   return dict(calls = self.calls, errors = self.errors, wait = self.wait.dump(), time = self.time.dump())
+
+commands = {} # func: CommandMetrics.
+lock = threading.Lock() # Used when adding to commands.
+started = time() # When recording started or was last reset.
+
+def record(func, wait, duration, error = False):
+ """Record a call to the command func, which waited in the queue for wait seconds and then took duration seconds."""
+ m = commands.get(func)
+ if m is None:
+  with lock:
+   m = commands.setdefault(func, CommandMetrics(func.name.split()[0]))
+ m.record(wait, duration, error)
+
+def top(key, count = 10):
+ """Return summaries of the count commands with the highest value for key, which can be anything in CommandMetrics.summary."""
+ with lock:
+  found = list(commands.values())
+ return sorted([m.summary() for m in found], key = lambda summary: summary[key], reverse = True)[:count]
+
+def reset():
+ global started
+ with lock:
+  commands.clear()
+  started = time()
+
+def dump(filename):
+ """Append everything recorded so far to filename as a line of JSON."""
+ with lock:
+  found = list(commands.values())
+ stuff = dict(time = time(), started = started, commands = dict((m.name, m.dump()) for m in found))
+ with open(filename, 'a') as f:
+  f.write(json.dumps(stuff) + '\n')
+ logger.debug('Dumped metrics for %s command%s to %s.', len(found), '' if len(found) == 1 else 's', filename)
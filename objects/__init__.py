@@ -61,7 +61,17 @@ class BaseObject(object):
   self.otake_msg = otake_msg
   self.location = NOWHERE # Where this object resides.
   logger.debug('Created object %s.', self.name)
-  db.objects.append(self)
+  db.objects.add(self) # Sets self.id.
+ 
+ def __setattr__(self, name, value):
+  """Set an attribute, marking this object as changed if the attribute is saved with the database."""
+  super(BaseObject, self).__setattr__(name, value)
+  if name in self.__dict__.get('dump_properties', ()) or name in self.__dict__.get('dump_object_properties', ()):
+   db.objects.mark(self)
+ 
+ def changed(self):
+  """Mark this object as changed, so it is written at the next checkpoint. Call this after changing a list or dictionary which is saved with the database without assigning it."""
+  db.objects.mark(self)
  
  def title(self):
   """Return a prettier version of name."""
@@ -104,6 +114,7 @@ class BaseObject(object):
   logger.debug('Allowing %s into %s.', obj, self)
   if obj not in self.contents:
    self.contents.append(obj)
+   self.changed()
   return True
  
  def on_exit(self, obj):
@@ -111,6 +122,7 @@ class BaseObject(object):
   logger.debug('Allowing object %s to exit %s.', obj, self)
   if obj in self.contents:
    self.contents.remove(obj)
+   self.changed()
   return True
  
  def format_message(self, msg, player = NOONE):
@@ -121,7 +133,8 @@ class BaseObject(object):
   if self.location != NOWHERE:
    try:
     self.location.contents.remove(self)
-   except IndexError:
+    self.location.changed()
+   except ValueError:
     pass
   try:
    db.objects.remove(self)
@@ -157,6 +170,7 @@ class BaseObject(object):
  def dump(self):
   """Return a tuple containing information necessary to reconstruct this object. Used with db.dump."""
   stuff = {}
+  stuff['id'] = self.id
   stuff['properties'] = {}
   for p in self.dump_properties:
    stuff['properties'][p] = getattr(self, p)
@@ -173,7 +187,11 @@ class BaseObject(object):
    except Exception as e:
     logger.warning('Could not set property %s = %s.', x, y)
     logger.exception(e)
-  for x, y in stuff.get('object_properties').items():
+  self.load_object_properties(stuff.get('object_properties', {}))
+ 
+ def load_object_properties(self, properties):
+  """Set the properties which refer to other objects from properties, a dictionary of dumped object properties."""
+  for x, y in properties.items():
    try:
     setattr(self, x, db.load_object_property(y))
    except Exception as e:
@@ -188,5 +206,5 @@ class BaseObject(object):
 
 from .mobs import MobObject
 from .players import PlayerObject
-from .rooms import RoomObject
+from .rooms import RoomObject, ExtraObject
 from .zones import ZoneObject
@@ -1,8 +1,8 @@
 """Player """
 
 import db, logging, passwords, util, options, server
+from history import CommandHistory
 from objects import *
-from twisted.internet import reactor
 
 logger = logging.getLogger('Player Objects')
 
@@ -12,6 +12,13 @@ BUILDER = 10 # Player can build.
 PROGRAMMER = 20 # Player can program and eval code.
 WIZARD = 30 # Player can do anything.
 
+def access_name(access):
+ """Return the name of the access level access (like 'WIZARD'), or None if it isn't a valid level."""
+ for x, y in globals().items():
+  if x.isupper() and type(y) == int and y == access:
+   return x
+ return None
+
 class PlayerObject(MobObject):
  @property
  def pwd(self):
@@ -19,9 +26,37 @@ class PlayerObject(MobObject):
  
  @pwd.setter
  def pwd(self, value):
-  self._pwd = passwords.to_password(value)
+  self.set_password_hash(passwords.to_password(value))
+ 
+ def set_password_hash(self, value):
+  """Set the password from value, which has already been hashed with passwords.to_password. Hashing is slow, so this lets it be done without holding any locks."""
+  self._pwd = value.decode() if isinstance(value, bytes) else value # Hashes are stored as strings so they can be dumped.
   logger.info('Changed password for %s.', self)
  
+ @property
+ def commands(self):
+  """The commands this player has entered, as a CommandHistory."""
+  return self._commands
+ 
+ @commands.setter
+ def commands(self, value):
+  """Replace the history with value, which can be a CommandHistory, a list of commands, or a string from CommandHistory.dump."""
+  if not isinstance(value, CommandHistory):
+   value = CommandHistory.load(db.server_config['command_history_length'], value)
+  self._commands = value
+ 
+ @property
+ def uid(self):
+  return self._uid
+ 
+ @uid.setter
+ def uid(self, value):
+  if db.players_by_uid.get(self._uid) is self:
+   del db.players_by_uid[self._uid]
+  self._uid = value
+  if value:
+   db.players_by_uid[value] = self
+ 
  def __init__(self, *args, **kwargs):
   super(PlayerObject, self).__init__(*args, **kwargs)
   self.owner = self
@@ -33,13 +68,13 @@ class PlayerObject(MobObject):
    'last_connected_time',
    'last_connected_host',
    'access',
-   'commands'
   ]
   self.access = NORMAL
-  self.commands = [] # Command history.
+  self.commands = [] # Command history. Only saved if server_config['save_command_history'] is True.
   self.last_connected_time = None
   self.last_connected_host = None
   self.banned = False # If True disallow the player from logging in.
+  self._uid = ''
   self.uid = '' # The username to log in with.
   self._pwd = '' # The password to log in with.
   self.transport = None # The transport to write data to.
@@ -48,10 +83,24 @@ class PlayerObject(MobObject):
  def authenticate(self, uid, pwd):
   return bytes(uid.encode(options.args.default_encoding) if type(uid) != bytes else uid) == self.uid.encode(options.args.default_encoding) and passwords.check_password(pwd, self.pwd)
  
+ def destroy(self):
+  self.uid = '' # Remove this player from the index.
+  try:
+   db.players.remove(self)
+  except ValueError:
+   pass # It's already gone.
+  return super(PlayerObject, self).destroy()
+ 
  def on_connected(self):
   """Called when this character connects."""
   self.do_look()
 
+ def dump(self):
+  stuff = super(PlayerObject, self).dump()
+  if db.server_config['save_command_history']:
+   stuff[1]['properties']['commands'] = self.commands.dump()
+  return stuff
+ 
  def on_disconnected(self):
   """Called when this player disconnects."""
   pass
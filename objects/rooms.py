@@ -1,6 +1,6 @@
 """Room objects."""
 
-import logging, objects
+import logging, objects, locks
 
 logger = logging.getLogger('Room Objects')
 
@@ -53,11 +53,13 @@ class RoomObject(objects.BaseObject):
   """Add an extra to the room."""
   extra = ExtraObject(name, text)
   self.extras.append(extra)
+  self.changed()
   return extra
  
  def remove_extra(self, extra):
   """Remove the extra from the room."""
   self.extras.remove(extra)
+  self.changed()
  
  def announce(self, text, player):
   """Announce to every object in the room other than player."""
@@ -74,8 +76,9 @@ class RoomObject(objects.BaseObject):
     c.notify(text)
  
  def destroy(self):
-  for o in self.contents:
-   o.move(NOWHERE)
+  for o in list(self.contents):
+   o.move(objects.NOWHERE)
+  locks.manager.forget(self)
   return super(RoomObject, self).destroy()
  
  def title(self):
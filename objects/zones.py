@@ -1,9 +1,8 @@
 """Group rooms together."""
 
 from objects import BaseObject
-from twisted.internet import reactor
 from time import time
-import db, logging
+import db, logging, timers, world, locks, server
 
 logger = logging.getLogger('Zone Objects')
 
@@ -16,21 +15,29 @@ class ZoneObject(BaseObject):
   ]
   db.zones.append(self)
   self.last_reset = 0.0 # The time this zone was last reset.
-  self.next_reset = None # The DelayedCallInstance generated by the reset.
   self.reset_interval = 20.0 # Reset interval in minutes.
+  self.next_reset = timers.wheel.timer(int(60 * self.reset_interval), self.submit_reset) # The timer which will call the next reset.
   self._reset()
  
+ def submit_reset(self):
+  """Called by the timer on the event loop thread. Resetting locks the zone, which could mean waiting for a command, so the reset is applied by the world loop if it is running, or the command pool otherwise."""
+  if world.loop.running:
+   world.loop.submit(self, self._reset)
+  else:
+   server.pool.submit(self, self._reset)
+ 
  def _reset(self):
   """Tries to call self.reset."""
   logger.info('Resetting zone %s.', self.title())
   self.last_reset = time()
   try:
-   self.reset()
+   with locks.manager.hold(locks.ZONE, zone = self):
+    self.reset()
   except Exception as e:
    logger.critical('While resetting zone %s, the following error was raised:', self.title())
    logger.exception(e)
   finally:
-   self.next_reset = reactor.callLater(int(60 * self.reset_interval), self._reset)
+   self.next_reset.reset(int(60 * self.reset_interval))
  
  def reset(self):
   """Called every self.interval minutes to reset the zone."""
@@ -38,4 +45,6 @@ class ZoneObject(BaseObject):
  
  def destroy(self):
   super(ZoneObject, self).destroy()
+  self.next_reset.cancel()
+  locks.manager.forget(self)
   db.zones.remove(self)
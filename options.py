@@ -11,8 +11,19 @@ parser.add_argument('-l', '--loglevel', choices = ['debug', 'info', 'warning', '
 parser.add_argument('-e', '--defaultencoding', dest = 'default_encoding', default = 'utf-8', help = 'The default encoding to use')
 parser.add_argument('-p', '--port', type = int, default = 4444, help = 'The server port')
 parser.add_argument('-d', '--dumpfile', dest = 'dump_file', default = 'DB.json', help = 'Where to dump the database')
+parser.add_argument('-D', '--dump-format', choices = ['json', 'binary'], default = None, help = 'The format to dump the database in (by default, binary if --dumpfile ends in .lmb, otherwise JSON)')
 parser.add_argument('-c', '--log-commands', action = 'store_true', help = 'Log commands')
 parser.add_argument('-m', '--max-connections', type = int, default = 0, help = 'Maximum number of connections or 0 for unlimited')
+parser.add_argument('-b', '--backend', choices = ['twisted', 'asyncio'], default = 'twisted', help = 'The event loop to use (asyncio uses uvloop if it is installed)')
+parser.add_argument('-w', '--workers', type = int, default = 8, help = 'The number of threads which execute commands, or 0 to execute them on the event loop thread')
+parser.add_argument('-A', '--auth-workers', type = int, default = 2, help = 'The number of threads which check passwords when players log in')
+parser.add_argument('-u', '--no-output-buffer', dest = 'output_buffer', action = 'store_false', help = 'Write every line as soon as it is sent instead of once per event loop turn (useful for debugging)')
+parser.add_argument('-z', '--compression-level', type = int, choices = range(10), default = 6, help = 'The zlib compression level for clients which support MCCP, or 0 to disable MCCP. Unless it is 0, every client is offered MCCP with a telnet negotiation when it connects, which raw TCP clients will see as a few stray bytes')
+parser.add_argument('-t', '--tick-rate', type = float, default = 0.0, help = 'Apply everything which changes the world from a single thread this many times a second, or 0 to execute commands as soon as a worker is free')
+parser.add_argument('-s', '--stats-file', default = None, help = 'Append command statistics to this file as lines of JSON every --stats-interval seconds')
+parser.add_argument('-i', '--stats-interval', type = float, default = 60.0, help = 'The number of seconds between writes to --stats-file')
+parser.add_argument('-k', '--checkpoint-interval', type = float, default = 10.0, help = 'The number of seconds between writing changed objects to the journal, or 0 to only save the database on shutdown')
+parser.add_argument('-S', '--autosave-interval', type = float, default = 600.0, help = 'The number of seconds between snapshots of the whole database, taken in the background, or 0 to only take them on shutdown and when the journal gets too big')
 parser.add_argument('-a', '--auto-login', type = str, default = None, help = 'Automatically log any new connection into the provided user')
 
 args = parser.parse_args([] if 'py.test' in sys.argv[0] else sys.argv[1:])
@@ -0,0 +1,259 @@
+"""
+Profiling the running server.
+
+@profile starts a Session, which runs for a fixed number of seconds and then writes what it found to server_config['profile_directory'] and reports the highlights. There are three modes:
+
+cpu - Every task executed by ServerProtocol.run_held (on the command pool or the world loop) is run under cProfile, as is the event loop thread. The combined stats are written as a pstats file. Stacks are sampled as well, so there is a collapsed-stack file for flame graphs too.
+sample - Only the stacks are sampled. Much cheaper than cpu, but there are no call counts.
+memory - tracemalloc snapshots are taken at the start and the end, and the lines which allocated the most memory in between are reported.
+
+Collapsed-stack files have one line per distinct stack, like "Command 1;handle_line (server.py:93);do_command (commands.py:56) 12", which flamegraph.pl and speedscope can read.
+"""
+
+import cProfile, logging, os, pstats, sys, threading, tracemalloc, db
+from backends import backend
+from time import time, sleep, strftime
+
+logger = logging.getLogger('Profiling')
+
+CPU = 'cpu'
+SAMPLE = 'sample'
+MEMORY = 'memory'
+modes = [CPU, SAMPLE, MEMORY]
+
+idle_functions = ['doPoll', 'doSelect', 'select', 'poll'] # Where the event loop waits for something to happen.
+
+session = None # The Session which is running.
+lock = threading.Lock() # Used when starting a session.
+local = threading.local()
+
+def idle(name):
+ """Return True if name is the name of a function the event loop waits in, like doPoll or <method 'poll' of 'select.epoll' objects>."""
+ return name in idle_functions or any(("'%s'" % f) in name for f in idle_functions)
+
+def label(code):
+ """Return a label for a code object, for stacks."""
+ return '%s (%s:%s)' % (code.co_name, os.path.basename(code.co_filename), code.co_firstlineno)
+
+class Session(object):
+ """A profiling session."""
+ def __init__(self, mode, duration, filename, callback, count = 15):
+  self.mode = mode
+  self.duration = duration # Seconds to run for.
+  self.filename = filename # The name of the files to write, without the extension.
+  self.callback = callback # Called with a list of lines to report when the session is finished.
+  self.count = count # The number of functions or lines to report.
+  self.running = False
+  self.started = time() # When profiling started.
+  self.lock = threading.Lock()
+  self.profiles = {} # Thread ident: cProfile.Profile.
+  self.unprofiled = 0 # Tasks which couldn't be run under cProfile, because another profiler was active.
+  self.active = {} # Thread ident: thread name, for threads executing a task.
+  self.loop_thread = None # The ident of the event loop thread.
+  self.samples = {} # Stack tuple: the number of times it was seen.
+  self.idle = 0 # The number of times the event loop was sampled waiting.
+  self.snapshot = None # The first tracemalloc snapshot.
+  self.stop_tracing = False # True if this session started tracemalloc, and so should stop it.
+  self.timer = None
+ 
+ def start(self):
+  """Start profiling. Can be called from any thread."""
+  self.started = time()
+  self.running = True
+  if self.mode == MEMORY:
+   if not tracemalloc.is_tracing():
+    tracemalloc.start()
+    self.stop_tracing = True
+   self.snapshot = tracemalloc.take_snapshot()
+  else:
+   t = threading.Thread(target = self.sample, name = 'Profiler')
+   t.daemon = True
+   t.start()
+  backend.call_from_thread(self.start_loop)
+ 
+ def start_loop(self):
+  """Start profiling the event loop thread, and schedule the end of the session."""
+  self.loop_thread = threading.current_thread().ident
+  if self.mode == CPU:
+   self.enable(self.profile())
+  self.timer = backend.call_later(self.duration, self.stop)
+ 
+ def profile(self):
+  """Return the profile for the current thread."""
+  ident = threading.current_thread().ident
+  with self.lock:
+   if ident not in self.profiles:
+    self.profiles[ident] = cProfile.Profile()
+   return self.profiles[ident]
+ 
+ def enable(self, profile):
+  """Enable profile, returning True if it worked. Python 3.12 and later only let one profiler be active at once, so profiling another thread at the same time fails, and that thread is only sampled instead."""
+  try:
+   profile.enable()
+   return True
+  except ValueError as e:
+   with self.lock:
+    self.unprofiled += 1
+    first = self.unprofiled == 1
+   if first:
+    logger.warning('Could not profile %s, so it will only be sampled: %s', threading.current_thread().name, e)
+   return False
+ 
+ def call(self, func, *args, **kwargs):
+  """Call func(*args, **kwargs), profiling it if this session is profiling the CPU."""
+  thread = threading.current_thread()
+  if thread.ident == self.loop_thread or getattr(local, 'profiling', False):
+   return func(*args, **kwargs) # Already being profiled.
+  profile = self.profile() if self.mode == CPU else None
+  if profile is not None and not self.enable(profile):
+   profile = None
+  with self.lock:
+   self.active[thread.ident] = thread.name
+  local.profiling = True
+  try:
+   return func(*args, **kwargs)
+  finally:
+   if profile is not None:
+    profile.disable()
+   local.profiling = False
+   with self.lock:
+    self.active.pop(thread.ident, None)
+ 
+ def sample(self):
+  """Sample the stacks of the event loop and every thread executing a task until the session stops."""
+  interval = db.server_config['profile_sample_interval']
+  while self.running:
+   frames = sys._current_frames()
+   with self.lock:
+    threads = dict(self.active)
+   if self.loop_thread is not None:
+    threads[self.loop_thread] = 'Event loop'
+   for ident, name in threads.items():
+    frame = frames.get(ident)
+    if frame is None:
+     continue
+    if ident == self.loop_thread and idle(frame.f_code.co_name):
+     self.idle += 1
+     continue
+    stack = []
+    while frame is not None:
+     stack.append(label(frame.f_code))
+     frame = frame.f_back
+    stack.append(name)
+    stack = tuple(reversed(stack))
+    self.samples[stack] = self.samples.get(stack, 0) + 1
+   sleep(interval)
+ 
+ def stop(self):
+  """Stop profiling. Must be called from the event loop thread."""
+  if not self.running:
+   return
+  self.running = False
+  if self.timer is not None and self.timer.active():
+   self.timer.cancel()
+  if self.mode == CPU:
+   self.profile().disable()
+  t = threading.Thread(target = self.finish, name = 'Profiler')
+  t.daemon = True
+  t.start()
+ 
+ def finish(self):
+  """Write the results and report them."""
+  global session
+  try:
+   directory = os.path.dirname(self.filename)
+   if directory and not os.path.isdir(directory):
+    os.makedirs(directory)
+   if self.mode == MEMORY:
+    lines = self.finish_memory()
+   else:
+    lines = []
+    if self.mode == CPU:
+     lines += self.finish_cpu()
+    lines += self.finish_samples()
+  except Exception as e:
+   logger.exception(e)
+   lines = ['Profiling failed: %s' % e]
+  finally:
+   with lock:
+    if session is self:
+     session = None
+  logger.info('Finished profiling (%s) after %.2f seconds.', self.mode, time() - self.started)
+  self.callback(lines)
+ 
+ def finish_cpu(self):
+  stats = None
+  for profile in self.profiles.values():
+   profile.create_stats()
+   if profile.stats:
+    if stats is None:
+     stats = pstats.Stats(profile)
+    else:
+     stats.add(profile)
+  skipped = []
+  if self.unprofiled:
+   skipped.append('%s task%s could not be profiled because another profiler was active, so %s only in the samples.' % (self.unprofiled, '' if self.unprofiled == 1 else 's', 'it is' if self.unprofiled == 1 else 'they are'))
+  if stats is None:
+   return ['No functions were profiled.'] + skipped
+  filename = self.filename + '.prof'
+  stats.dump_stats(filename)
+  found = [(key, value) for key, value in stats.stats.items() if os.path.basename(key[0]) != 'profiling.py' and not idle(key[2])]
+  found.sort(key = lambda item: item[1][3], reverse = True)
+  lines = ['Wrote profile to %s.' % filename] + skipped + ['Top %s functions by cumulative time (in milliseconds):' % self.count]
+  for (path, line, name), (primitive_calls, calls, total, cumulative, callers) in found[:self.count]:
+   lines.append('%s (%s:%s): %s call%s, %.2f cumulative, %.2f own.' % (name, os.path.basename(path), line, calls, '' if calls == 1 else 's', cumulative * 1000, total * 1000))
+  return lines
+ 
+ def finish_samples(self):
+  filename = self.filename + '.collapsed'
+  with open(filename, 'w') as f:
+   for stack, count in sorted(self.samples.items()):
+    f.write('%s %s\n' % (';'.join(stack), count))
+  busy = sum(self.samples.values())
+  lines = ['Wrote %s sample%s to %s (the event loop was idle for %s more).' % (busy, '' if busy == 1 else 's', filename, self.idle)]
+  if self.mode == SAMPLE and busy:
+   cumulative = {}
+   own = {}
+   for stack, count in self.samples.items():
+    for frame in set(stack[1:]):
+     cumulative[frame] = cumulative.get(frame, 0) + count
+    own[stack[-1]] = own.get(stack[-1], 0) + count
+   lines.append('Top %s functions by samples:' % self.count)
+   for frame in sorted(cumulative, key = lambda frame: cumulative[frame], reverse = True)[:self.count]:
+    lines.append('%s: %.1f%% of samples (%.1f%% own).' % (frame, cumulative[frame] * 100.0 / busy, own.get(frame, 0) * 100.0 / busy))
+  return lines
+ 
+ def finish_memory(self):
+  snapshot = tracemalloc.take_snapshot()
+  if self.stop_tracing:
+   tracemalloc.stop()
+  filters = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, '<frozen importlib._bootstrap>')]
+  differences = snapshot.filter_traces(filters).compare_to(self.snapshot.filter_traces(filters), 'lineno')
+  filename = self.filename + '.txt'
+  with open(filename, 'w') as f:
+   for difference in differences:
+    f.write('%s\n' % difference)
+  lines = ['Wrote memory differences to %s.' % filename, 'Top %s lines by memory growth:' % self.count]
+  for difference in differences[:self.count]:
+   frame = difference.traceback[0]
+   lines.append('%s:%s: %+.1fKB (%+d block%s), %.1fKB now.' % (frame.filename, frame.lineno, difference.size_diff / 1024.0, difference.count_diff, '' if abs(difference.count_diff) == 1 else 's', difference.size / 1024.0))
+  return lines
+
+def start(mode, duration, callback):
+ """Start a session, and return it. If a session is already running, return None instead."""
+ global session
+ with lock:
+  if session is not None:
+   return None
+  filename = os.path.join(db.server_config['profile_directory'], 'profile-%s-%s' % (mode, strftime('%Y%m%d-%H%M%S')))
+  session = Session(mode, duration, filename, callback)
+ logger.info('Profiling (%s) for %s second%s.', mode, duration, '' if duration == 1 else 's')
+ session.start()
+ return session
+
+def call(func, *args, **kwargs):
+ """Call func(*args, **kwargs), profiling it if a session is running."""
+ s = session
+ if s is None or not s.running or s.mode == MEMORY:
+  return func(*args, **kwargs)
+ return s.call(func, *args, **kwargs)
@@ -0,0 +1,102 @@
+"""
+Non-blocking host name lookups.
+
+Lookups are performed by the backend on the event loop thread, so they never hold up a worker. Answers (including failures) are kept in a bounded cache for a while, so looking up the same address again doesn't go to the network.
+
+The functions in this module can be called from any thread. Callbacks are called straight away if the answer is cached, otherwise from the event loop thread.
+"""
+
+import logging, threading, ipaddress, db
+from collections import OrderedDict
+from time import time
+from backends import backend
+
+logger = logging.getLogger('Resolver')
+
+class Cache(object):
+ """A least recently used cache whose entries expire."""
+ def __init__(self, size = None):
+  self.size = size # The maximum number of entries, or None to use server_config['dns_cache_size'] (which isn't known until the database has been loaded).
+  self.entries = OrderedDict() # key: (expires, value).
+  self.lock = threading.Lock()
+  self.hits = 0
+  self.misses = 0
+ 
+ def get(self, key):
+  """Return (True, value) if key is cached, or (False, None) otherwise."""
+  with self.lock:
+   entry = self.entries.get(key)
+   if entry is None or entry[0] < time():
+    self.misses += 1
+    return (False, None)
+   self.entries.move_to_end(key)
+   self.hits += 1
+   return (True, entry[1])
+ 
+ def set(self, key, value, ttl):
+  """Cache value for ttl seconds."""
+  with self.lock:
+   self.entries[key] = (time() + ttl, value)
+   self.entries.move_to_end(key)
+   size = db.server_config['dns_cache_size'] if self.size is None else self.size
+   while len(self.entries) > size:
+    self.entries.popitem(last = False)
+ 
+ def clear(self):
+  with self.lock:
+   self.entries.clear()
+
+reverse_cache = Cache() # address: host name or None.
+forward_cache = Cache() # host name: address or None.
+
+pending = {} # (cache, key): callbacks waiting for a lookup which is in progress. Only used from the event loop thread.
+
+def is_address(text):
+ """Return True if text is an IP address rather than a host name."""
+ try:
+  ipaddress.ip_address(text)
+  return True
+ except ValueError:
+  return False
+
+def _lookup(cache, func, key, callback):
+ """Pass the result of func(key, timeout, done) to callback, caching it and sharing the lookup with anything else which asks for key in the meantime. Must be called from the event loop thread."""
+ if (cache, key) in pending:
+  return pending[(cache, key)].append(callback)
+ pending[(cache, key)] = [callback]
+ def done(value):
+  if value is None:
+   logger.debug('Lookup of %s failed.', key)
+  cache.set(key, value, db.server_config['dns_negative_ttl' if value is None else 'dns_ttl'])
+  for callback in pending.pop((cache, key)):
+   try:
+    callback(value)
+   except Exception as e:
+    logger.exception(e)
+ func(key, db.server_config['dns_timeout'], done)
+
+def reverse(address, callback = None):
+ """Call callback with the host name for address, or with address itself if it has no name."""
+ found, name = reverse_cache.get(address)
+ if found:
+  if callback is not None:
+   callback(name or address)
+ else:
+  backend.call_from_thread(_lookup, reverse_cache, backend.lookup_name, address, lambda name: None if callback is None else callback(name or address))
+
+def forward(host, callback):
+ """Call callback with an address for host, or None if it cannot be found."""
+ if is_address(host):
+  return callback(host)
+ found, address = forward_cache.get(host)
+ if found:
+  callback(address)
+ else:
+  backend.call_from_thread(_lookup, forward_cache, backend.lookup_address, host, callback)
+
+def cached(address):
+ """Return the cached host name for address, or None if it isn't known (yet). If it isn't cached, a lookup is started."""
+ found, name = reverse_cache.get(address)
+ if not found:
+  backend.call_from_thread(_lookup, reverse_cache, backend.lookup_name, address, lambda name: None)
+ return name
@@ -0,0 +1,401 @@
+"""
+Database file formats.
+
+A serializer turns what db.dump writes into bytes and back. There are two:
+
+json - JSON, which can be read and edited by hand. Used for files ending in .json, and anything else which doesn't end in .lmb.
+binary - A compact binary format for files ending in .lmb.
+
+Use --dump-format to choose one regardless of the file name. When loading, binary files are recognised by their first few bytes, so a file can be loaded whatever it is called.
+
+A database is a dictionary of settings (the header) and a list of objects, which is by far the biggest part. Serializers write the objects one at a time as they are given them, and read them back one at a time, so the whole list never has to be in memory as well as the objects themselves. The header is written first, but files where the objects come first (like those from older versions) can still be read.
+
+The binary format starts with MAGIC, then a single value. Every value starts with a one byte tag:
+
+NONE, TRUE, FALSE - Nothing else.
+INT - A zigzag-encoded varint (so small negative numbers are small too).
+FLOAT - 8 bytes, little endian.
+STRING - A varint length, then that many bytes of UTF-8. The string is added to the string table.
+REFERENCE - A varint index into the string table, for strings which have been seen before. Names, messages and dictionary keys are repeated for nearly every object, so most strings are written once.
+LIST - A varint count, then that many values.
+DICT - A varint count, then that many key, value pairs.
+ITEMS - Values up to an END tag, for lists which are written before their length is known.
+"""
+
+import json, os, re, struct
+
+NONE, TRUE, FALSE, FLOAT, INT, STRING, REFERENCE, LIST, DICT, ITEMS, END = range(11) # Tags from INT to DICT are followed by a varint.
+MAGIC = b'LMB\x01'
+
+double = struct.Struct('<d')
+
+chunk_size = 64 * 1024 # The number of bytes to read or write at once.
+
+class Serializer(object):
+ """The base class for serializers."""
+ name = None # The name used with --dump-format.
+ extensions = [] # File extensions which use this format.
+ binary = True # Whether files should be opened in binary mode.
+ 
+ def mode(self, mode):
+  """Return the mode to open a file with for reading (r) or writing (w)."""
+  return mode + 'b' if self.binary else mode
+ 
+ def write(self, f, header, objects):
+  """Write the dictionary header and then every object from the iterable objects to the file f, as they are produced. Returns the number of objects written."""
+  raise NotImplementedError
+ 
+ def read(self, f):
+  """Yield (key, value) pairs from the file f. Every object is yielded on its own, with the key objects."""
+  raise NotImplementedError
+ 
+ def dump(self, stuff, f):
+  """Write the dictionary stuff to the file f."""
+  header = dict((x, y) for x, y in stuff.items() if x != 'objects')
+  return self.write(f, header, stuff.get('objects', []))
+ 
+ def load(self, f):
+  """Return the dictionary which was written to the file f."""
+  stuff = {}
+  for x, y in self.read(f):
+   if x == 'objects':
+    stuff.setdefault('objects', []).append(y)
+   else:
+    stuff[x] = y
+  return stuff
+
+class JSONSerializer(Serializer):
+ """Writes the header indented, then each object on a line of its own."""
+ name = 'json'
+ extensions = ['.json']
+ binary = False
+ 
+ def write(self, f, header, objects):
+  f.write('{\n')
+  for x, y in header.items():
+   f.write(' %s: %s,\n' % (json.dumps(x), json.dumps(y, indent = 1).replace('\n', '\n ')))
+  f.write(' "objects": [')
+  count = 0
+  for obj in objects:
+   f.write(',\n  ' if count else '\n  ')
+   f.write(json.dumps(obj))
+   count += 1
+  f.write('\n ]\n}\n')
+  return count
+ 
+ def read(self, f):
+  reader = JSONReader(f)
+  reader.expect('{')
+  if reader.next('}'):
+   return
+  while True:
+   key = reader.value()
+   reader.expect(':')
+   if key == 'objects':
+    reader.expect('[')
+    if not reader.next(']'):
+     while True:
+      yield key, reader.value()
+      if reader.next(']'):
+       break
+      reader.expect(',')
+   else:
+    yield key, reader.value()
+   if reader.next('}'):
+    return
+   reader.expect(',')
+
+class JSONReader(object):
+ """Reads JSON values from a file one at a time, keeping only a little of the file in memory."""
+ whitespace = re.compile(r'\s*')
+ 
+ def __init__(self, f):
+  self.file = f
+  self.buffer = ''
+  self.position = 0
+  self.finished = False # True when the whole file has been read.
+  self.decoder = json.JSONDecoder()
+ 
+ def fill(self, size):
+  """Read size more characters, throwing away what has already been used. Returns False at the end of the file."""
+  data = self.file.read(size)
+  self.buffer = self.buffer[self.position:] + data
+  self.position = 0
+  if not data:
+   self.finished = True
+  return bool(data)
+ 
+ def skip(self):
+  """Skip whitespace, returning the next character or '' at the end of the file."""
+  while True:
+   self.position = self.whitespace.match(self.buffer, self.position).end()
+   if self.position < len(self.buffer) or not self.fill(chunk_size):
+    return self.buffer[self.position:self.position + 1]
+ 
+ def next(self, character):
+  """Skip character and return True if it comes next, otherwise return False."""
+  if self.skip() == character:
+   self.position += 1
+   return True
+  return False
+ 
+ def expect(self, character):
+  if not self.next(character):
+   raise ValueError('Expected %r at %r.' % (character, self.buffer[self.position:self.position + 20]))
+ 
+ def value(self):
+  """Return the next value. If it might carry on past the end of the buffer, more is read and it is tried again."""
+  self.skip()
+  while True:
+   try:
+    value, end = self.decoder.raw_decode(self.buffer, self.position)
+    if end < len(self.buffer) or self.finished: # A number at the end of the buffer might have more digits.
+     self.position = end
+     return value
+   except ValueError:
+    if self.finished:
+     raise
+   self.fill(max(chunk_size, len(self.buffer))) # Read more each time so very big values don't take forever.
+
+class Encoder(object):
+ """Encodes values in the binary format into a buffer, remembering the strings it has seen. If file is not None, flush writes the buffer to it."""
+ def __init__(self, file = None):
+  self.buffer = bytearray()
+  self.strings = {} # string: its index in the string table.
+  self.file = file
+ 
+ def flush(self, size = 0):
+  """Write the buffer to the file if it is at least size bytes long."""
+  if len(self.buffer) >= size:
+   self.file.write(self.buffer)
+   self.buffer = bytearray()
+ 
+ def varint(self, value):
+  buffer = self.buffer
+  while value > 127:
+   buffer.append((value & 127) | 128)
+   value >>= 7
+  buffer.append(value)
+ 
+ def encode(self, value):
+  buffer = self.buffer
+  t = type(value)
+  if t is str:
+   index = self.strings.get(value)
+   if index is None:
+    self.strings[value] = len(self.strings)
+    data = value.encode('utf-8')
+    buffer.append(STRING)
+    self.varint(len(data))
+    buffer += data
+   else:
+    buffer.append(REFERENCE)
+    self.varint(index)
+  elif t is int:
+   buffer.append(INT)
+   self.varint(value << 1 if value >= 0 else (-value << 1) - 1)
+  elif t is dict:
+   buffer.append(DICT)
+   self.varint(len(value))
+   for x, y in value.items():
+    self.encode(x)
+    self.encode(y)
+  elif t is list or t is tuple:
+   buffer.append(LIST)
+   self.varint(len(value))
+   for x in value:
+    self.encode(x)
+  elif value is None:
+   buffer.append(NONE)
+  elif value is True:
+   buffer.append(TRUE)
+  elif value is False:
+   buffer.append(FALSE)
+  elif t is float:
+   buffer.append(FLOAT)
+   buffer += double.pack(value)
+  else:
+   for base in (str, int, float, dict, list): # Subclasses, like an IntEnum.
+    if isinstance(value, base):
+     return self.encode(base(value))
+   raise TypeError('Object of type %s cannot be serialised.' % t.__name__)
+
+class Decoder(object):
+ """Decodes values in the binary format from data, starting at position. If file is not None, complete reads more data from it when needed."""
+ def __init__(self, data, position = 0, file = None):
+  self.data = data
+  self.position = position
+  self.strings = [] # The string table.
+  self.file = file
+ 
+ def fill(self, size):
+  """Read size more bytes from the file, throwing away what has already been used. Returns False at the end of the file."""
+  data = self.file.read(size) if self.file is not None else b''
+  self.data = self.data[self.position:] + data
+  self.position = 0
+  return bool(data)
+ 
+ def complete(self, func):
+  """Return func(), reading more of the file and trying again if the data ran out first."""
+  while True:
+   position = self.position
+   strings = len(self.strings)
+   try:
+    return func()
+   except IndexError:
+    self.position = position
+    del self.strings[strings:]
+    if not self.fill(max(chunk_size, len(self.data))):
+     raise ValueError('The file ended in the middle of a value.')
+ 
+ def varint(self):
+  data = self.data
+  position = self.position
+  byte = data[position]
+  position += 1
+  value = byte & 127
+  shift = 7
+  while byte & 128:
+   byte = data[position]
+   position += 1
+   value |= (byte & 127) << shift
+   shift += 7
+  self.position = position
+  return value
+ 
+ def decode(self):
+  data = self.data
+  position = self.position
+  tag = data[position]
+  if INT <= tag <= DICT:
+   value = data[position + 1]
+   if value < 128: # The varint is a single byte, which it nearly always is.
+    self.position = position + 2
+   else:
+    self.position = position + 1
+    value = self.varint()
+  else:
+   self.position = position + 1
+  if tag == REFERENCE:
+   return self.strings[value]
+  elif tag == STRING:
+   position = self.position
+   if position + value > len(data):
+    raise IndexError('String runs past the end of the data.')
+   self.position = position + value
+   value = data[position:position + value].decode('utf-8')
+   self.strings.append(value)
+   return value
+  elif tag == INT:
+   return -((value + 1) >> 1) if value & 1 else value >> 1
+  elif tag == DICT:
+   decode = self.decode
+   return {decode(): decode() for x in range(value)}
+  elif tag == LIST:
+   decode = self.decode
+   return [decode() for x in range(value)]
+  elif tag == NONE:
+   return None
+  elif tag == TRUE:
+   return True
+  elif tag == FALSE:
+   return False
+  elif tag == FLOAT:
+   if self.position + 8 > len(data):
+    raise IndexError('Float runs past the end of the data.')
+   value = double.unpack_from(data, self.position)[0]
+   self.position += 8
+   return value
+  elif tag == ITEMS:
+   items = []
+   while not self.end():
+    items.append(self.decode())
+   return items
+  raise ValueError('Unknown tag %s at position %s.' % (tag, position))
+ 
+ def end(self):
+  """Skip an END tag and return True if one comes next, otherwise return False."""
+  if self.data[self.position] == END:
+   self.position += 1
+   return True
+  return False
+ 
+ def container(self):
+  """Return the tag of the list or dictionary which comes next, and its length (None for ITEMS)."""
+  tag = self.data[self.position]
+  self.position += 1
+  if tag == ITEMS:
+   return tag, None
+  elif tag in (LIST, DICT):
+   return tag, self.varint()
+  raise ValueError('Expected a list or dictionary at position %s, not tag %s.' % (self.position - 1, tag))
+
+class BinarySerializer(Serializer):
+ """The header and objects are written as a dictionary whose objects key is an ITEMS list, so the objects can be counted as they are written."""
+ name = 'binary'
+ extensions = ['.lmb']
+ 
+ def write(self, f, header, objects):
+  encoder = Encoder(f)
+  encoder.buffer += MAGIC
+  encoder.buffer.append(DICT)
+  encoder.varint(len(header) + 1)
+  for x, y in header.items():
+   encoder.encode(x)
+   encoder.encode(y)
+  encoder.encode('objects')
+  encoder.buffer.append(ITEMS)
+  count = 0
+  for obj in objects:
+   encoder.encode(obj)
+   encoder.flush(chunk_size)
+   count += 1
+  encoder.buffer.append(END)
+  encoder.flush()
+  return count
+ 
+ def read(self, f):
+  if f.read(len(MAGIC)) != MAGIC:
+   raise ValueError('Not a binary database.')
+  decoder = Decoder(b'', file = f)
+  tag, count = decoder.complete(decoder.container)
+  if tag != DICT:
+   raise ValueError('A binary database must contain a dictionary.')
+  for x in range(count):
+   key = decoder.complete(decoder.decode)
+   if key == 'objects':
+    tag, length = decoder.complete(decoder.container)
+    if tag == DICT:
+     raise ValueError('Objects must be a list.')
+    if length is None:
+     while not decoder.complete(decoder.end):
+      yield key, decoder.complete(decoder.decode)
+    else:
+     for y in range(length):
+      yield key, decoder.complete(decoder.decode)
+   else:
+    yield key, decoder.complete(decoder.decode)
+
+serializers = {} # name: Serializer.
+
+def register(serializer):
+ serializers[serializer.name] = serializer
+
+register(JSONSerializer())
+register(BinarySerializer())
+
+def for_filename(filename, name = None):
+ """Return the serializer called name, or the one for filename's extension if name is None. JSON is used for unknown extensions."""
+ if name is not None:
+  return serializers[name]
+ extension = os.path.splitext(filename)[1].lower()
+ for serializer in serializers.values():
+  if extension in serializer.extensions:
+   return serializer
+ return serializers['json']
+
+def detect(filename):
+ """Return the serializer which wrote filename, going by its first bytes."""
+ with open(filename, 'rb') as f:
+  start = f.read(len(MAGIC))
+ return serializers['binary' if start == MAGIC else 'json']
@@ -2,10 +2,12 @@ name = 'Little MUD Engine'
 version = '0.1'
 port = None # Should be set when initialise() is called.
 
-import logging, errors, genders, options, util, objects, db, commands
+import logging, errors, genders, options, util, objects, db, passwords, commands, resolver, bans, timers, telnet, metrics, throttle, world, locks, profiling, snapshots
+from collections import deque
 from time import time, ctime
-from socket import gethostbyaddr, gaierror
-from threading import Thread
+from threading import Lock
+from workers import WorkerPool
+from backends import backend
 
 logger = logging.getLogger('Server')
 
@@ -13,10 +15,12 @@ started = time() # For the uptime command.
 
 connections = {} # All active connections.
 
+pool = WorkerPool(options.args.workers, name = 'Command') # Executes lines received from connections.
+auth_pool = WorkerPool(options.args.auth_workers, name = 'Authentication') # Checks passwords so logins can't hold up commands.
+
 from twisted.protocols.basic import LineReceiver
 from twisted.internet.protocol import ServerFactory
-from twisted.internet import reactor
-from twisted.internet.error import AlreadyCalled
+from twisted.internet.defer import Deferred, TimeoutError
 
 # Possible connection states:
 READY = 0 # The server will process commands normally.
@@ -29,6 +33,7 @@ CREATE_NAME = 6 # The server is waiting for a new character name.
 CREATE_SEX = 7 # The server is waiting for a sex to be chosen.
 FROZEN = 8 # Input from this connection will be ignored until the state is changed.
 READING = 9 # Waiting for the connected player to type something which will be passed to self.transport.read_func.
+WAITING = 10 # Waiting for something (like a password check) to finish in the background. Lines received in the meantime are handled afterwards.
 
 class ServerProtocol(LineReceiver):
  def do_timeout(self):
@@ -39,16 +44,14 @@ class ServerProtocol(LineReceiver):
  
  def cancel_timeout(self):
   """Cancel the timeout for transport."""
-  try:
+  if self.timeout is not None:
    self.timeout.cancel()
-  except (AttributeError, AlreadyCalled):
-   pass # It's already dead.
-  self.timeout = None
  
  def reset_timeout(self):
-  if self.timeout:
-   self.cancel_timeout()
-  self.timeout = reactor.callLater(get_config('login_timeout'), self.do_timeout)
+  if self.timeout is None:
+   self.timeout = timers.wheel.timer(get_config('login_timeout'), self.do_timeout)
+  else:
+   self.timeout.reset(get_config('login_timeout'))
  
  def __init__(self, *args, **kwargs):
   self.state = USERNAME
@@ -57,14 +60,53 @@ class ServerProtocol(LineReceiver):
   self.name = None
   self.timeout = None
   self.logger = logging.getLogger('<Connection unspecified>')
+  self.output = [] # Encoded lines waiting to be written.
+  self.output_lock = Lock()
+  self.output_held = 0 # While this is greater than 0, output is buffered until release_output is called.
+  self.flush_pending = False # True if a call to self.flush has been scheduled.
+  self.disconnect_pending = False # If True, disconnect once the buffered output has been written.
+  self.disconnect_waiters = [] # Deferreds to fire when this connection is lost.
+  self.address = None # The address this connection was admitted from by bans.admit.
+  self.waiting_lines = [] # Lines received in the WAITING state, to be handled when it ends.
+  self.telnet = telnet.Parser() # Strips telnet commands from input.
+  self.compressor = None # The telnet.Compressor for this connection once MCCP has been agreed.
+  self.bucket = throttle.TokenBucket(*throttle.limits(objects.players.NORMAL)) # Limits how fast lines are executed.
+  self.throttled_lines = deque() # Lines waiting for a token from self.bucket.
+  self.throttle_call = None # The delayed call which will release self.throttled_lines.
+  self.dropped = 0 # The number of lines dropped since this connection was last throttled.
+ 
+ def execute(self, func, *args, **kwargs):
+  """Call func(*args, **kwargs) with output held, either on the world loop if it is running, or on the command pool. Tasks stay on the command pool while it has any for this connection, so they are executed in order."""
+  if world.loop.running and not pool.outstanding(self):
+   world.loop.submit(self, self.run_held, func, *args, **kwargs)
+  else:
+   pool.submit(self, self.run_held, func, *args, **kwargs)
+ 
+ def run_held(self, func, *args, **kwargs):
+  """Call func(*args, **kwargs), writing everything it sends to this connection in one go when it returns."""
+  self.hold_output()
+  try:
+   return profiling.call(func, *args, **kwargs)
+  finally:
+   self.release_output()
  
  def handle_line(self, line):
   """The threaded version of lineReceived."""
+  if hasattr(line, 'decode'):
+   line = line.decode(options.args.default_encoding, errors = 'ignore')
+  if self.state == READY:
+   commands.do_command(connections[self.transport], line) # Takes the locks the command needs.
+  else:
+   self.handle_input(line)
+ 
+ @locks.exclusive
+ def handle_input(self, line):
+  """Handle a line which isn't a command, like a username or the reply to a question."""
   if self.state == FROZEN:
    self.sendLine('You are totally frozen.')
    self.logger.info('attempted command while frozen: %s', line)
-  elif self.state == READY:
-   commands.do_command(connections[self.transport], line)
+  elif self.state == WAITING:
+   self.waiting_lines.append(line)
   else:
    self.reset_timeout()
    if self.state == USERNAME:
@@ -78,25 +120,20 @@ class ServerProtocol(LineReceiver):
     else:
      self.sendLine('You must provide a username.', True)
    elif self.state == PASSWORD:
-    for p in db.players:
-     if p.authenticate(self.uid, line):
-      logger.info('Authenticated as %s.', p.title())
-      self.sendLine('Welcome back, {name}.{delimiter}{delimiter}You last logged in on {connect_time} from {connect_host}.'.format(name = p.title(), delimiter = self.delimiter.decode(options.args.default_encoding) if hasattr(self.delimiter, 'decode') else self.delimiter, connect_time = ctime(p.last_connected_time), connect_host = p.last_connected_host))
-      self.post_login(p)
-      break
+    p = db.players_by_uid.get(self.uid)
+    if p is None:
+     self.authenticated(None)
     else:
-     self.logger.info('Failed to authenticate with username: %s.', self.uid)
-     self.sendLine('Invalid username and password combination.', True)
+     self.state = WAITING
+     auth_pool.submit(self, self.authenticate, p, line)
    elif self.state == CREATE_USERNAME:
     self.tries += 1
     if self.tries >= get_config('max_create_retries'):
      return self.sendLine(get_config('max_create_retries_exceeded'), True)
     if line:
-     for p in db.players:
-      if p.uid == line:
-       self.sendLine('That username is already taken.')
-       self.create_username()
-       break
+     if line in db.players_by_uid:
+      self.sendLine('That username is already taken.')
+      self.create_username()
      else:
       self.uid = line
       self.tries = 0
@@ -132,6 +169,7 @@ class ServerProtocol(LineReceiver):
       if p.name == line:
        self.sendLine('Sorry, but that name is already taken.')
        self.create_name()
+       break
      else:
       msg = util.disallowed_name(line)
       if msg:
@@ -153,20 +191,11 @@ class ServerProtocol(LineReceiver):
      self.sendLine('Invalid input: %s. Try again.' % line)
      return self.create_gender()
     self.sendLine('You are now a %s.' % gender.sex)
-    p = objects.PlayerObject(self.name)
-    p.gender = gender
-    p.uid = self.uid
-    p.pwd = self.pwd
-    if len(list(db.get_players())) == 1: # This is the only player.
-     p.access = objects.players.WIZARD
-     for o in db.objects:
-      o.owner = p
-    self.logger.info('Created %s player: %s.', 'wizard' if p.access else 'normal', p.title())
-    p.move(db.objects_config['start_room'])
-    self.post_login(p)
+    self.state = WAITING
+    auth_pool.submit(self, self.hash_password, gender)
    elif self.state == READING:
     try:
-     self.transport.read_func(line.decode(options.args.default_encoding) if hasattr(line, 'decode') else line)
+     self.transport.read_func(line)
     except Exception as e:
      self.sendLine('An error was raised while passing the line to the target function. See log for details.')
      self.logger.exception(e)
@@ -181,8 +210,84 @@ class ServerProtocol(LineReceiver):
     connections[self.transport] = None
     self.get_username()
  
+ def authenticate(self, player, password):
+  """Check password for player on the authentication pool, then carry on logging in on the command pool (or the world loop)."""
+  if not player.authenticate(self.uid, password):
+   player = None
+  self.execute(self.authenticated, player)
+ 
+ def hash_password(self, gender):
+  """Hash the password for a new player on the authentication pool, so the world isn't locked while bcrypt runs, then create the player on the command pool (or the world loop)."""
+  hashed, self.pwd = passwords.to_password(self.pwd), None
+  self.execute(self.create_player, gender, hashed)
+ 
+ @locks.exclusive
+ def create_player(self, gender, hashed):
+  """Create a player with the password hash hashed, then log in as them."""
+  if self.uid in db.players_by_uid:
+   self.sendLine('That username was taken while your password was being saved.')
+   self.create_username()
+   return self.handle_waiting_lines()
+  p = objects.PlayerObject(self.name)
+  p.gender = gender
+  p.uid = self.uid
+  p.set_password_hash(hashed)
+  if len(list(db.get_players())) == 1: # This is the only player.
+   p.access = objects.players.WIZARD
+   for o in db.objects:
+    o.owner = p
+  self.logger.info('Created %s player: %s.', 'wizard' if p.access else 'normal', p.title())
+  p.move(db.objects_config['start_room'])
+  self.post_login(p)
+ 
+ @locks.exclusive
+ def authenticated(self, player):
+  """Called with the player who has been authenticated, or None if the username or password were wrong."""
+  if player is None:
+   self.logger.info('Failed to authenticate with username: %s.', self.uid)
+   self.sendLine('Invalid username and password combination.', True)
+  else:
+   logger.info('Authenticated as %s.', player.title())
+   self.sendLine('Welcome back, {name}.{delimiter}{delimiter}You last logged in on {connect_time} from {connect_host}.'.format(name = player.title(), delimiter = self.delimiter.decode(options.args.default_encoding) if hasattr(self.delimiter, 'decode') else self.delimiter, connect_time = ctime(player.last_connected_time), connect_host = player.last_connected_host))
+   self.post_login(player)
+ 
  def lineReceived(self, line):
-  Thread(target = self.handle_line, args = [line.strip()]).start()
+  player = connections.get(self.transport)
+  self.bucket.configure(*throttle.limits(player.access if player else objects.players.NORMAL))
+  if not self.throttled_lines and self.bucket.take():
+   return self.submit_line(line)
+  if len(self.throttled_lines) >= get_config('command_queue_length'):
+   throttle.stats['dropped'] += 1
+   self.dropped += 1
+   if self.dropped == 1:
+    self.logger.warning('Dropping lines: %s already waiting.', len(self.throttled_lines))
+    self.sendLine(get_config('throttled_msg'))
+   return
+  if not self.throttled_lines:
+   throttle.stats['throttled'] += 1
+   self.logger.info('Throttled.')
+  throttle.stats['queued'] += 1
+  self.throttled_lines.append(line)
+  if self.throttle_call is None:
+   self.throttle_call = backend.call_later(self.bucket.delay(), self.release_throttled)
+ 
+ def release_throttled(self):
+  """Submit the throttled lines there are tokens for, and wait for more tokens if any are left."""
+  self.throttle_call = None
+  while self.throttled_lines and self.bucket.take():
+   self.submit_line(self.throttled_lines.popleft())
+  if self.throttled_lines:
+   self.throttle_call = backend.call_later(self.bucket.delay(), self.release_throttled)
+  elif self.dropped:
+   self.logger.warning('No longer throttled after dropping %s line%s.', self.dropped, '' if self.dropped == 1 else 's')
+   self.dropped = 0
+ 
+ def submit_line(self, line):
+  line = line.strip()
+  if world.loop.running and self.state == READY and not world.loop.pending(self) and commands.is_read_only(connections[self.transport], line):
+   pool.submit(self, self.run_held, self.handle_line, line) # Read-only commands don't need to wait for the next tick.
+  else:
+   self.execute(self.handle_line, line)
  
  def create_password(self):
   self.sendLine('New password')
@@ -205,22 +310,70 @@ class ServerProtocol(LineReceiver):
  
  def post_login(self, object):
   self.tries = 0
-  self.state = READY
   if object.transport:
    host, port = self.transport.getHost().host, self.transport.getHost().port
    self.logger.warning('Disconnecting in favour of %s:%s.', host, port)
-   object.notify(get_config('redirect_msg').format(host = host, port = port), True)
-   while object.transport:
-    pass
+   self.state = WAITING
+   backend.call_from_thread(self.take_over, object)
+  else:
+   self.attach(object)
+ 
+ def take_over(self, object):
+  """Disconnect the connection object is currently using, and attach object to this connection when it has gone. Must be called from the event loop thread."""
+  if not object.transport:
+   return self.execute(self.attach, object) # It went while we were waiting.
+  old = object.transport.protocol
+  host, port = self.transport.getHost().host, self.transport.getHost().port
+  object.notify(get_config('redirect_msg').format(host = host, port = port), disconnect = True)
+  d = old.wait_for_disconnect()
+  d.addTimeout(get_config('takeover_timeout'), backend.clock)
+  d.addErrback(self.take_over_timed_out, object, old)
+  d.addCallback(lambda result: self.execute(self.attach, object))
+ 
+ def take_over_timed_out(self, failure, object, old):
+  """The old connection didn't close in time, so detach object from it and drop it."""
+  failure.trap(TimeoutError)
+  self.logger.warning('Old connection for %s did not close after %s seconds. Aborting it.', object.title(), get_config('takeover_timeout'))
+  if connections.get(old.transport) is object:
+   connections[old.transport] = None
+  if object.transport is old.transport:
+   object.transport = None
+  old.transport.abortConnection()
+ 
+ def wait_for_disconnect(self):
+  """Return a Deferred which fires when this connection is lost."""
+  d = Deferred()
+  self.disconnect_waiters.append(d)
+  return d
+ 
+ @locks.exclusive
+ def attach(self, object):
+  """Make object the player for this connection."""
+  if self.transport not in connections:
+   return self.logger.info('Connection lost before %s could be attached.', object.title())
+  if object.transport and object.transport is not self.transport:
+   return self.post_login(object) # Somebody else got there first.
+  self.state = READY
+  self.cancel_timeout()
   object.transport = self.transport
   connections[self.transport] = object
   object.last_connected_time = time()
-  try:
-   object.last_connected_host = gethostbyaddr(self.transport.hostname)[0]
-  except gaierror:
-   object.last_connected_host = self.transport.hostname
+  address = self.transport.hostname
+  object.last_connected_host = address
+  def set_host(name, object = object, address = address):
+   """Replace the address with a host name once it has been looked up, unless object has logged in from somewhere else in the meantime."""
+   if object.last_connected_host == address:
+    object.last_connected_host = name
+  resolver.reverse(address, set_host)
   object.notify(get_config('connect_msg'))
   object.on_connected()
+  self.handle_waiting_lines()
+ 
+ def handle_waiting_lines(self):
+  """Handle the lines which were received in the WAITING state."""
+  lines, self.waiting_lines = self.waiting_lines, []
+  for line in lines:
+   self.handle_line(line)
  
  def get_username(self):
   self.state = USERNAME
@@ -229,6 +382,10 @@ class ServerProtocol(LineReceiver):
  def connectionMade(self):
   self.logger.name = '<Connection %s:%s>' % (self.transport.getHost().host, self.transport.getHost().port)
   self.tries = 0
+  if hasattr(self.transport, 'setTcpNoDelay'):
+   self.transport.setTcpNoDelay(True) # Output is already batched, so Nagle's algorithm only adds latency.
+  if options.args.compression_level:
+   self.transport.write(telnet.command(telnet.WILL, telnet.COMPRESS2))
   connections[self.transport] = None
   if options.args.auto_login:
    for p in db.get_players():
@@ -257,22 +414,110 @@ class ServerProtocol(LineReceiver):
    connections[self.transport].on_disconnected()
    connections[self.transport].transport = None
   del connections[self.transport]
+  pool.discard(self)
+  world.loop.discard(self)
+  if self.throttle_call is not None:
+   self.throttle_call.cancel()
+   self.throttle_call = None
+  self.throttled_lines.clear()
+  if self.address is not None:
+   bans.release(self.address)
   self.logger.info('Disconnected: %s.', reason.getErrorMessage())
   self.cancel_timeout()
+  waiters, self.disconnect_waiters = self.disconnect_waiters, []
+  for d in waiters:
+   d.callback(None)
  
  def sendLine(self, line, disconnect = False):
   """Send a line to the client. If disconnect evaluates to True, also disconnect the client."""
-  reactor.callFromThread(LineReceiver.sendLine, self, line.encode(options.args.default_encoding))
+  line = line.encode(options.args.default_encoding)
+  if not options.args.output_buffer:
+   backend.call_from_thread(self.write, line + self.delimiter)
+   if disconnect:
+    backend.call_from_thread(self.close)
+   return
+  with self.output_lock:
+   self.output.append(line)
+   if disconnect:
+    self.disconnect_pending = True
+   if self.output_held or self.flush_pending:
+    return
+   self.flush_pending = True
+  backend.call_from_thread(self.flush)
+ 
+ def hold_output(self):
+  """Buffer output until release_output is called."""
+  with self.output_lock:
+   self.output_held += 1
+ 
+ def release_output(self):
+  """Stop holding output, and schedule a flush if anything was sent in the meantime."""
+  with self.output_lock:
+   self.output_held -= 1
+   if self.output_held or self.flush_pending or not (self.output or self.disconnect_pending):
+    return
+   self.flush_pending = True
+  backend.call_from_thread(self.flush)
+ 
+ def flush(self):
+  """Write all buffered output to the transport with a single call. Must be called from the event loop thread."""
+  with self.output_lock:
+   lines, self.output = self.output, []
+   disconnect, self.disconnect_pending = self.disconnect_pending, False
+   self.flush_pending = False
+  if lines:
+   self.write(b''.join(line + self.delimiter for line in lines))
   if disconnect:
-   reactor.callFromThread(self.transport.loseConnection)
+   self.close()
+ 
+ def write(self, data):
+  """Write data to the transport, compressing it if MCCP is in use. Must be called from the event loop thread."""
+  if self.compressor is not None:
+   data = self.compressor.compress(data)
+  self.transport.write(data)
+ 
+ def close(self):
+  """End the compressed stream if there is one, then disconnect. Must be called from the event loop thread."""
+  if self.compressor is not None:
+   self.transport.write(self.compressor.finish())
+   self.compressor = None
+  self.transport.loseConnection()
+ 
+ def dataReceived(self, data):
+  """Handle any telnet commands, then pass the rest on to LineReceiver."""
+  data, commands = self.telnet.feed(data)
+  for verb, option in commands:
+   self.telnet_command(verb, option)
+  if data:
+   LineReceiver.dataReceived(self, data)
+ 
+ def telnet_command(self, verb, option):
+  """Respond to a telnet negotiation from the client."""
+  if option == telnet.COMPRESS2 and options.args.compression_level:
+   if verb == telnet.DO and self.compressor is None:
+    self.start_compression()
+  elif verb == telnet.DO:
+   self.write(telnet.command(telnet.WONT, option))
+  elif verb == telnet.WILL:
+   self.write(telnet.command(telnet.DONT, option))
+ 
+ def start_compression(self):
+  """Write any buffered output, then tell the client everything from now on will be compressed."""
+  self.flush()
+  self.transport.write(telnet.command(telnet.SB, telnet.COMPRESS2, telnet.IAC, telnet.SE))
+  self.compressor = telnet.Compressor(options.args.compression_level)
+  self.logger.info('Started MCCP compression at level %s.', options.args.compression_level)
 
 class Factory(ServerFactory):
  def buildProtocol(self, addr):
-  if addr.host in get_config('banned_hosts', []):
-   return logger.warning('Blocked incoming connection from %s:%s.', addr.host, addr.port)
+  reason = bans.admit(addr.host)
+  if reason:
+   return logger.warning('Blocked incoming connection from %s:%s: %s.', addr.host, addr.port, reason)
   else:
    logger.info('Incoming connection from %s:%s.', addr.host, addr.port)
-   return ServerProtocol()
+   p = ServerProtocol()
+   p.address = addr.host
+   return p
 
 def disconnect_all():
  if connections:
@@ -281,13 +526,32 @@ def disconnect_all():
    transport.loseConnection()
  else:
   logger.info('No connections to close.')
+ pool.stop()
+ auth_pool.stop()
+ world.loop.stop()
+ timers.wheel.stop()
 
 def initialise():
  """Initialise the server."""
  logger.info('Max connections allowed: %s.', options.args.max_connections)
- reactor.addSystemEventTrigger('before', 'shutdown', disconnect_all)
- reactor.addSystemEventTrigger('after', 'shutdown', shutdown)
- port = reactor.listenTCP(options.args.port, Factory())
+ pool.start()
+ auth_pool.start()
+ if world.loop.rate:
+  world.loop.start()
+ timers.wheel.start()
+ if options.args.stats_file:
+  backend.looping_call(options.args.stats_interval, lambda count: pool.submit(metrics, metrics.dump, options.args.stats_file))
+  backend.add_shutdown_hook('after', lambda: metrics.dump(options.args.stats_file))
+  logger.info('Writing command statistics to %s every %s seconds.', options.args.stats_file, options.args.stats_interval)
+ if options.args.checkpoint_interval and db.journal is not None:
+  backend.looping_call(options.args.checkpoint_interval, lambda count: pool.submit(db, db.checkpoint))
+  logger.info('Writing changed objects to %s every %s seconds.', db.journal.filename, options.args.checkpoint_interval)
+ if options.args.autosave_interval:
+  backend.looping_call(options.args.autosave_interval, lambda count: snapshots.snapshotter.start())
+  logger.info('Taking a snapshot every %s seconds.', options.args.autosave_interval)
+ backend.add_shutdown_hook('before', disconnect_all)
+ backend.add_shutdown_hook('after', shutdown)
+ port = backend.listen(options.args.port, Factory())
  logging.info('Now listening for connections on %s.', port.getHost())
  return port
 
@@ -0,0 +1,70 @@
+"""
+Background snapshots.
+
+Dumping a big world takes seconds, and the thread which called db.dump can't do anything else in the meantime. The Snapshotter calls db.dump from a thread of its own, so the event loop and the command workers carry on while the file is written. The world is locked shared while it is being read, so commands which only read it carry on too.
+
+Snapshots are taken every --autosave-interval seconds, when the journal needs compacting, and with @snapshot. Only one is taken at a time.
+"""
+
+import logging, threading, db
+
+logger = logging.getLogger('Snapshots')
+
+class Snapshotter(object):
+ """Takes snapshots of the database in the background, recording how long they took."""
+ def __init__(self):
+  self.busy = False # True while a snapshot is being taken.
+  self.lock = threading.Lock() # Used when changing self.busy.
+  self.taken = 0
+  self.failed = 0
+  self.total_pause = 0.0 # Seconds the world was locked for by all snapshots.
+  self.max_pause = 0.0
+  self.total_duration = 0.0
+  self.max_duration = 0.0
+  self.last = None # The dictionary returned by db.dump for the last snapshot.
+ 
+ def start(self, filename = None, callback = None):
+  """Start taking a snapshot of the database to filename (the dump file if None). When it has been written, callback is called with the result of db.dump, or the exception which was raised. Returns False if a snapshot is already being taken."""
+  with self.lock:
+   if self.busy:
+    return False
+   self.busy = True
+  t = threading.Thread(target = self.run, args = (filename, callback), name = 'Snapshot')
+  t.daemon = True
+  t.start()
+  return True
+ 
+ def run(self, filename, callback):
+  try:
+   result = db.dump(filename)
+   self.taken += 1
+   self.total_pause += result['paused']
+   self.max_pause = max(self.max_pause, result['paused'])
+   self.total_duration += result['duration']
+   self.max_duration = max(self.max_duration, result['duration'])
+   self.last = result
+  except Exception as e:
+   self.failed += 1
+   logger.critical('While taking a snapshot, the following exception was raised:')
+   logger.exception(e)
+   result = e
+  finally:
+   with self.lock:
+    self.busy = False
+  if callback is not None:
+   callback(result)
+ 
+ def stats(self):
+  """Return a dictionary of statistics about snapshots."""
+  return dict(
+   busy = self.busy,
+   taken = self.taken,
+   failed = self.failed,
+   average_pause = self.total_pause / self.taken if self.taken else 0.0,
+   max_pause = self.max_pause,
+   average_duration = self.total_duration / self.taken if self.taken else 0.0,
+   max_duration = self.max_duration,
+   last = self.last,
+  )
+
+snapshotter = Snapshotter()
@@ -0,0 +1,90 @@
+"""
+Suggestions for mistyped commands.
+
+Every word which can be used to invoke a command is indexed under every string which can be made by deleting up to max_edits letters from it. If a typo is within n edits of a word, deleting at most n letters from each of them gives the same string, so looking up the deletions of the typo finds every word it could be close to. Only those candidates have their edit distance worked out.
+
+This is much faster than a BK-tree for command names. They are all a similar distance from each other, so a BK-tree search ends up visiting most of the tree.
+"""
+
+import threading
+
+max_edits = 3 # The most edits a suggestion can be away from what was typed.
+
+def distance(a, b):
+ """Return the Levenshtein distance between a and b: the number of single character insertions, deletions and substitutions needed to turn one into the other."""
+ if len(a) < len(b):
+  a, b = b, a
+ previous = list(range(len(b) + 1))
+ for x, ca in enumerate(a):
+  current = [x + 1]
+  for y, cb in enumerate(b):
+   current.append(min(previous[y + 1] + 1, current[y] + 1, previous[y] + (ca != cb)))
+  previous = current
+ return previous[-1]
+
+def deletions(word, edits):
+ """Return the set of strings which can be made by deleting up to edits characters from word, including word itself."""
+ results = set([word])
+ current = results
+ for x in range(edits):
+  current = set(w[:i] + w[i + 1:] for w in current for i in range(len(w)))
+  results |= current
+ return results
+
+def max_distance(word):
+ """Return how many edits away from word a suggestion can be."""
+ return 1 if len(word) <= 2 else 2 if len(word) <= 6 else max_edits # Swapping two letters counts as two edits.
+
+class Index(object):
+ """Suggests commands for mistyped words."""
+ def __init__(self):
+  self.deletes = {} # string: set of words which it can be made from.
+  self.commands = {} # word: [func, ...].
+  self.longest = 0 # The length of the longest word.
+  self.lock = threading.Lock()
+ 
+ def add(self, func):
+  """Index every word in func.name. Words without any letters (like " and !) are left out, because everything is a single edit away from them."""
+  with self.lock:
+   for word in func.name.split():
+    if any(c.isalpha() for c in word):
+     if word not in self.commands:
+      for d in deletions(word, max_edits):
+       self.deletes.setdefault(d, set()).add(word)
+      self.longest = max(len(word), self.longest)
+     self.commands.setdefault(word, []).append(func)
+ 
+ def discard(self, func):
+  """Stop suggesting func. Its words stay indexed, but are skipped if they no longer belong to any command."""
+  with self.lock:
+   for word in func.name.split():
+    funcs = self.commands.get(word, [])
+    if func in funcs:
+     funcs.remove(func)
+ 
+ def suggest(self, word, allowed = lambda func: True, count = 3):
+  """Return up to count words which invoke commands close to word, best first. Only commands for which allowed(func) is True are considered, and only the closest word for each command is given."""
+  word = word.lower()
+  edits = max_distance(word)
+  if len(word) > self.longest + edits:
+   return [] # Too long to be close to anything.
+  with self.lock:
+   candidates = set()
+   for d in deletions(word, edits):
+    candidates.update(self.deletes.get(d, ()))
+   found = []
+   for candidate in candidates:
+    if abs(len(candidate) - len(word)) <= edits:
+     d = distance(word, candidate)
+     if d <= edits:
+      found.append((d, candidate))
+   results = []
+   seen = set()
+   for d, name in sorted(found):
+    funcs = [f for f in self.commands.get(name, []) if f not in seen and allowed(f)]
+    if funcs:
+     seen.update(funcs)
+     results.append(name)
+     if len(results) >= count:
+      break
+  return results
@@ -0,0 +1,95 @@
+"""
+Telnet option negotiation and MCCP (the MUD Client Compression Protocol, version 2).
+
+Parser strips telnet commands out of the data received from a client, so only the text reaches LineReceiver. Compressor holds the zlib stream for a connection which has agreed to MCCP, along with statistics about how well it is working.
+"""
+
+import zlib
+from time import thread_time
+
+SE = 240 # End of subnegotiation.
+SB = 250 # Start of subnegotiation.
+WILL = 251
+WONT = 252
+DO = 253
+DONT = 254
+IAC = 255 # Interpret as command.
+
+COMPRESS2 = 86 # MCCP version 2.
+
+def command(*args):
+ """Return the bytes for a telnet command."""
+ return bytes(bytearray((IAC,) + args))
+
+# Parser states:
+TEXT = 0 # Ordinary text.
+COMMAND = 1 # After IAC.
+OPTION = 2 # After IAC followed by WILL, WONT, DO or DONT.
+SUBNEGOTIATION = 3 # Inside IAC SB.
+SUBNEGOTIATION_COMMAND = 4 # After IAC inside IAC SB.
+
+class Parser(object):
+ """Separates telnet commands from text. Commands may be split across calls to feed."""
+ def __init__(self):
+  self.state = TEXT
+  self.verb = None # WILL, WONT, DO or DONT while waiting for an option.
+ 
+ def feed(self, data):
+  """Return (text, commands) where text is data without any telnet commands, and commands is a list of (verb, option) tuples."""
+  if self.state == TEXT and IAC not in bytearray(data):
+   return (data, []) # The usual case.
+  text = bytearray()
+  commands = []
+  for byte in bytearray(data):
+   if self.state == TEXT:
+    if byte == IAC:
+     self.state = COMMAND
+    else:
+     text.append(byte)
+   elif self.state == COMMAND:
+    if byte == IAC:
+     text.append(byte) # An escaped 255.
+     self.state = TEXT
+    elif byte in (WILL, WONT, DO, DONT):
+     self.verb = byte
+     self.state = OPTION
+    elif byte == SB:
+     self.state = SUBNEGOTIATION
+    else:
+     self.state = TEXT # Something like NOP or GA which we don't care about.
+   elif self.state == OPTION:
+    commands.append((self.verb, byte))
+    self.state = TEXT
+   elif self.state == SUBNEGOTIATION:
+    if byte == IAC:
+     self.state = SUBNEGOTIATION_COMMAND
+   elif self.state == SUBNEGOTIATION_COMMAND:
+    self.state = TEXT if byte == SE else SUBNEGOTIATION
+  return (bytes(text), commands)
+
+class Compressor(object):
+ """The compressed stream for a connection using MCCP."""
+ def __init__(self, level):
+  self.zlib = zlib.compressobj(level)
+  self.bytes_in = 0 # The number of bytes before compression.
+  self.bytes_out = 0 # The number of bytes after compression.
+  self.cpu = 0.0 # Seconds of CPU time spent compressing.
+ 
+ def compress(self, data):
+  """Compress data and return everything needed for the client to decompress it straight away."""
+  started = thread_time()
+  data_out = self.zlib.compress(data) + self.zlib.flush(zlib.Z_SYNC_FLUSH)
+  self.cpu += thread_time() - started
+  self.bytes_in += len(data)
+  self.bytes_out += len(data_out)
+  return data_out
+ 
+ def finish(self):
+  """Return the end of the compressed stream. Nothing can be compressed afterwards."""
+  data = self.zlib.flush(zlib.Z_FINISH)
+  self.bytes_out += len(data)
+  return data
+ 
+ def ratio(self):
+  """Return the compressed size as a fraction of the uncompressed size."""
+  return float(self.bytes_out) / self.bytes_in if self.bytes_in else 1.0
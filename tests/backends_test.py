@@ -0,0 +1,62 @@
+import sys
+
+sys.path.insert(0, '.')
+
+import asyncio
+from backends import asyncio_backend as backend
+from twisted.protocols.basic import LineReceiver
+from twisted.internet.protocol import ServerFactory
+
+loop = backend.loop
+
+class Echo(LineReceiver):
+ def connectionMade(self):
+  self.sendLine(self.transport.getPeer().host.encode())
+ 
+ def lineReceived(self, line):
+  if line == b'quit':
+   self.transport.loseConnection()
+  else:
+   self.sendLine(line.upper())
+ 
+ def connectionLost(self, reason):
+  self.factory.lost.append(reason.getErrorMessage())
+
+class Factory(ServerFactory):
+ protocol = Echo
+ def __init__(self):
+  self.lost = []
+
+def test_call_later():
+ called = []
+ d = backend.call_later(0.01, called.append, 1)
+ cancelled = backend.call_later(0.01, called.append, 2)
+ assert d.active()
+ cancelled.cancel()
+ assert not cancelled.active()
+ loop.run_until_complete(asyncio.sleep(0.05))
+ assert called == [1]
+ assert not d.active()
+
+def test_looping_call():
+ counts = []
+ l = backend.looping_call(0.01, counts.append)
+ loop.run_until_complete(asyncio.sleep(0.055))
+ l.stop()
+ assert sum(counts) in (4, 5, 6)
+
+def test_connection():
+ factory = Factory()
+ port = backend.listen(0, factory)
+ async def client():
+  reader, writer = await asyncio.open_connection('127.0.0.1', port.getHost().port)
+  lines = [await reader.readline()]
+  writer.write(b'hello\r\nquit\r\n')
+  lines.append(await reader.readline())
+  lines.append(await reader.read())
+  writer.close()
+  return lines
+ assert loop.run_until_complete(client()) == [b'127.0.0.1\r\n', b'HELLO\r\n', b'']
+ loop.run_until_complete(asyncio.sleep(0.01))
+ assert len(factory.lost) == 1
+ port.stopListening()
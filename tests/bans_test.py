@@ -0,0 +1,71 @@
+import sys
+
+sys.path.insert(0, '.')
+
+import server, db, bans
+
+def test_tree():
+ t = bans.BanTree()
+ assert t.add(bans.parse('10.0.0.0/8'))
+ assert not t.add(bans.parse('10.1.2.3/8'))
+ assert t.add(bans.parse('192.168.1.1'))
+ assert t.add(bans.parse('2001:db8::/32'))
+ assert t.match(bans.ipaddress.ip_address('10.200.3.4')) == bans.parse('10.0.0.0/8')
+ assert t.match(bans.ipaddress.ip_address('192.168.1.1'))
+ assert t.match(bans.ipaddress.ip_address('192.168.1.2')) is None
+ assert t.match(bans.ipaddress.ip_address('2001:db8::1'))
+ assert t.match(bans.ipaddress.ip_address('::1')) is None
+ assert t.remove(bans.parse('10.0.0.0/8'))
+ assert not t.remove(bans.parse('10.0.0.0/8'))
+ assert t.match(bans.ipaddress.ip_address('10.200.3.4')) is None
+ assert t.size == 2
+
+def test_ban():
+ network = bans.parse('172.16.0.0/12')
+ assert bans.ban(network)
+ assert not bans.ban(network)
+ assert '172.16.0.0/12' in db.server_config['banned_hosts']
+ assert bans.admit('172.16.5.5')
+ bans.rebuild()
+ assert bans.banned('172.31.255.255') == network
+ assert bans.unban(network)
+ assert not bans.unban(network)
+ assert '172.16.0.0/12' not in db.server_config['banned_hosts']
+ assert bans.admit('172.16.5.5') is None
+ bans.release('172.16.5.5')
+
+def test_connection_limit():
+ server.set_config('max_connections_per_host', 2)
+ assert bans.admit('10.9.9.9') is None
+ assert bans.admit('10.9.9.9') is None
+ assert bans.admit('10.9.9.9')
+ bans.release('10.9.9.9')
+ assert bans.admit('10.9.9.9') is None
+ bans.release('10.9.9.9')
+ bans.release('10.9.9.9')
+ assert '10.9.9.9' not in bans.connections
+ server.set_config('max_connections_per_host', 10)
+
+def test_connection_rate():
+ server.set_config('connection_rate', 3)
+ for x in range(3):
+  assert bans.admit('10.8.8.8') is None
+  bans.release('10.8.8.8')
+ assert bans.admit('10.8.8.8')
+ server.set_config('connection_rate', 30)
+
+def test_prune():
+ server.set_config('connection_rate', 3)
+ bans.rates.clear()
+ for address in ('10.9.9.1', '10.9.9.2'):
+  assert bans.admit(address) is None
+  bans.release(address)
+ bans.rates['10.9.9.1'][1] -= 3600 # Pretend it connected an hour ago.
+ bans.rates.move_to_end('10.9.9.1', last = False)
+ assert bans.admit('10.9.9.3') is None
+ bans.release('10.9.9.3')
+ assert list(bans.rates) == ['10.9.9.2', '10.9.9.3']
+ assert bans.admit('10.9.9.2') is None # Moves to the end.
+ bans.release('10.9.9.2')
+ assert list(bans.rates) == ['10.9.9.3', '10.9.9.2']
+ server.set_config('connection_rate', 30)
@@ -17,3 +17,24 @@ def test_add_command():
  f.access = commands.objects.players.WIZARD
  commands.add_command('', f)
  assert f.access == commands.objects.players.WIZARD
+
+def test_scope():
+ f = lambda obj: None
+ f.name = 'test scope'
+ commands.add_command('^test scope$', f)
+ assert f.scope == commands.locks.WORLD
+ assert f.read_only is False
+ f.scope = 'everywhere'
+ with pytest.raises(ValueError):
+  commands.add_command('^test scope$', f)
+
+class Reader(object):
+ access = commands.objects.players.NORMAL
+
+def test_is_read_only():
+ assert commands.is_read_only(Reader(), b'@uptime')
+ assert commands.is_read_only(Reader(), '@commands')
+ assert not commands.is_read_only(Reader(), 'say hello')
+ assert commands.is_read_only(Reader(), 'shout hello')
+ assert not commands.is_read_only(Reader(), 'no such command')
+ assert not commands.is_read_only(Reader(), '@stats') # Needs a higher access level.
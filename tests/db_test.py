@@ -1,4 +1,4 @@
-import sys, logging, os
+import sys, logging, os, json, pytest
 
 sys.path.insert(0, '.')
 
@@ -24,3 +24,54 @@ def test_dump():
 
  os.remove(fname)
  logger.info('Removed DB file: %s.', fname)
+
+def test_registry():
+ r = db.Registry()
+ class Thing(object):
+  pass
+ first, second, third = Thing(), Thing(), Thing()
+ r.add(first)
+ r.add(second)
+ assert (first.id, second.id) == (0, 1)
+ assert first in r and r[1] is second and r.get(5) is None
+ r.remove(first)
+ assert first not in r
+ with pytest.raises(ValueError):
+  r.remove(first)
+ r.add(third)
+ assert third.id == 2 # Ids are never reused.
+ assert list(r) == [second, third] and len(r) == 2
+ with pytest.raises(ValueError):
+  r.reassign(third, 1)
+ r.reassign(third, 10)
+ assert r[10] is third and 2 not in r.objects
+ assert r.next_id == 11
+
+def test_destroy_keeps_ids():
+ a, b, c = BaseObject('A'), BaseObject('B'), BaseObject('C')
+ c.move(b)
+ b.destroy()
+ assert db.objects[c.id] is c
+ assert db.dump_object_property([a, b, c]) == [a.id, None, c.id]
+ for o in (a, c):
+  o.destroy()
+
+def test_load_positions(tmpdir):
+ """Databases from before objects had ids refer to objects by their position."""
+ room, thing = RoomObject('Old Room'), BaseObject('Old Thing')
+ thing.move(room)
+ stuff = dict(objects = [room.dump(), thing.dump()], objects_config = dict(start_room = 0))
+ for cls, properties in stuff['objects']:
+  del properties['id']
+ properties['object_properties']['location'] = 0
+ stuff['objects'][0][1]['object_properties']['contents'] = [1]
+ filename = str(tmpdir.join('old.json'))
+ with open(filename, 'w') as f:
+  json.dump(stuff, f)
+ db.clear()
+ db.load(filename)
+ room, thing = db.objects[0], db.objects[1]
+ assert room.name == 'Old Room' and thing.location is room and room.contents == [thing]
+ assert db.objects_config['start_room'] is room
+ assert BaseObject('New').id >= 2
+ db.clear()
@@ -0,0 +1,47 @@
+import sys, re
+
+sys.path.insert(0, '.')
+
+import dispatch
+
+def prefixes(expr):
+ return dispatch.prefixes(re.compile(expr))
+
+def test_prefixes():
+ assert prefixes('^@info$') == set(['@info'])
+ assert prefixes('^@?quit$') == set(['@quit', 'quit'])
+ assert prefixes('''^(?:say |"|')([^$]*)$''') == set(['say ', '"', "'"])
+ assert prefixes(r'^@(ban|unban) ([^$]+)$') == set(['@ban ', '@unban '])
+ assert prefixes(r'^[Ll]ook$') == set(['Look', 'look'])
+ assert prefixes(r'^(\w+)$') == set([''])
+ assert prefixes('') == set([''])
+ assert prefixes('(?i)^look$') == set([''])
+ assert prefixes('^@(?i:look)$') == set(['@'])
+ assert prefixes('^(?i:say )(.*)$') == set([''])
+
+def test_candidates():
+ d = dispatch.Dispatcher()
+ patterns = [re.compile(x) for x in ['^say (.*)$', '^(.*)$', '^s(.*)$', '^shout (.*)$', '^@?quit$']]
+ for x, p in enumerate(patterns):
+  d.add(p, x)
+ assert [f for p, f in d.candidates('say hello')] == [0, 1, 2]
+ assert [f for p, f in d.candidates('shout hello')] == [1, 2, 3]
+ assert [f for p, f in d.candidates('@quit')] == [1, 4]
+ assert [f for p, f in d.candidates('look')] == [1]
+ assert d.values() == [0, 1, 2, 3, 4]
+ assert len(d) == 5
+
+def test_replace():
+ d = dispatch.Dispatcher()
+ first, second = re.compile('^a$'), re.compile('^b$')
+ d.add(first, 1)
+ d.add(second, 2)
+ d.add(first, 3)
+ assert d.values() == [3, 2]
+ assert d.candidates('a') == [(first, 3)]
+
+def test_inline_flags():
+ d = dispatch.Dispatcher()
+ pattern = re.compile('^(?i:look)$')
+ d.add(pattern, 1)
+ assert d.candidates('LOOK') == [(pattern, 1)]
@@ -0,0 +1,57 @@
+import sys
+
+sys.path.insert(0, '.')
+
+import helptext
+
+def make(name, doc, access = 0):
+ f = lambda obj: None
+ f.name = name
+ f.__doc__ = doc
+ f.access = access
+ return f
+
+hug = make('hug', """
+ Hug somebody.
+ 
+ Synopsis:
+  hug <player>
+ 
+ Wraps your arms around <player>. Hugging is free.
+ """)
+kick = make('@kick', """
+ Kick a player off the server.
+ 
+ Synopsis:
+  @kick <player>
+ """, 30)
+
+def test_topic():
+ t = helptext.Topic(hug)
+ assert t.name == 'hug'
+ assert t.summary == 'Hug somebody.'
+ assert t.synopsis == ['hug <player>']
+ assert t.body == ['Wraps your arms around <player>. Hugging is free.']
+ assert t.lines()[0] == 'Help on Hug: Hug somebody.'
+
+def test_index():
+ i = helptext.Index()
+ i.add(hug)
+ i.add(kick)
+ assert i.topic('HUG', 0).func is hug
+ assert i.topic('@kick', 0) is None
+ assert i.topic('@kick', 30).func is kick
+ assert i.topic('kick', 30).func is kick
+ assert [t.func for t in i.search('player', 30)] == [kick, hug]
+ assert [t.func for t in i.search('player', 0)] == [hug]
+ assert not i.search('player elephant', 30)
+ assert i.listing(30) == ['Hug: Hug somebody.', '@kick: Kick a player off the server.']
+ assert i.listing(0) is i.listing(0)
+ hug2 = make('hug cuddle', 'Cuddle somebody.')
+ i.add(hug2, replaces = hug)
+ assert i.listing(30)[0] == 'Hug, or cuddle: Cuddle somebody.'
+ assert not i.search('arms', 30)
+ assert i.topic('cuddle', 0).func is hug2
+ i.discard(kick)
+ assert i.listing(30) == ['Hug, or cuddle: Cuddle somebody.']
+ assert 'server' not in i.words
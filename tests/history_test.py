@@ -0,0 +1,37 @@
+import sys, pytest
+
+sys.path.insert(0, '.')
+
+from history import CommandHistory
+
+def test_append():
+ h = CommandHistory(3)
+ for x in range(5):
+  h.append(x)
+ assert list(h) == [2, 3, 4]
+ assert len(h) == 3
+ assert h[0] == 2
+ assert h[-1] == 4
+ assert h[-2] == 3
+ with pytest.raises(IndexError):
+  h[3]
+ with pytest.raises(IndexError):
+  h[-4]
+
+def test_resize():
+ h = CommandHistory(5, range(5))
+ h.resize(2)
+ assert list(h) == [3, 4]
+ h.resize(4)
+ h.append(5)
+ assert list(h) == [3, 4, 5]
+ h.resize(0)
+ h.append(6)
+ assert not len(h)
+
+def test_dump():
+ h = CommandHistory(3, ['look', 'say hi\nthere', 'quit'])
+ assert h.dump() == 'look\nsay hi there\nquit'
+ assert list(CommandHistory.load(2, h.dump())) == ['say hi there', 'quit']
+ assert list(CommandHistory.load(2, ['a', 'b', 'c'])) == ['b', 'c']
+ assert not len(CommandHistory.load(2, ''))
@@ -0,0 +1,136 @@
+import sys, os, json, pytest
+
+sys.path.insert(0, '.')
+
+import server, db, snapshots
+from time import sleep
+from journal import Journal
+from objects import *
+
+def fresh(tmpdir):
+ """Return the name of an empty database which has been loaded."""
+ filename = str(tmpdir.join('journal.json'))
+ with open(filename, 'w') as f:
+  f.write('{}')
+ db.clear()
+ db.objects_config.clear()
+ db.load(filename)
+ return filename
+
+def test_dirty():
+ db.objects.changes()
+ o = BaseObject('Dirty')
+ assert o in db.objects.changes()[0]
+ o.last_looked_at = 'Nothing'
+ assert db.objects.changes() == ([], [])
+ o.name = 'Clean'
+ o.description = 'Spotless.'
+ assert db.objects.changes() == ([o], [])
+ r = RoomObject('Room')
+ db.objects.changes()
+ o.move(r)
+ assert db.objects.changes()[0] == [o, r]
+ o.destroy()
+ assert db.objects.changes() == ([r], [o.id])
+ r.destroy()
+
+def test_replay(tmpdir):
+ filename = fresh(tmpdir)
+ room = db.objects_config['start_room']
+ thing = BaseObject('Thing')
+ thing.move(room)
+ other = BaseObject('Other')
+ db.checkpoint()
+ thing.name = 'Renamed thing'
+ other.destroy()
+ db.server_config['journal_test'] = True
+ db.checkpoint()
+ assert db.checkpoint() == 0 # Nothing has changed.
+ assert db.journal.sequence == 2
+ assert not os.path.isfile(filename + '.tmp')
+ db.clear()
+ del db.server_config['journal_test']
+ db.load(filename)
+ assert db.journal.sequence == 2
+ thing = db.objects[thing.id]
+ room = db.objects_config['start_room']
+ assert thing.name == 'Renamed thing' and thing.location is room and thing in room.contents
+ assert db.objects.get(other.id) is None
+ assert db.server_config.pop('journal_test') is True
+ db.clear()
+
+def test_compaction(tmpdir):
+ filename = fresh(tmpdir)
+ thing = BaseObject('Thing')
+ db.checkpoint()
+ db.dump(filename)
+ assert not os.path.isfile(db.journal.filename)
+ assert not os.path.isfile(db.journal.old_filename)
+ thing.name = 'After compaction'
+ db.checkpoint()
+ assert db.journal.sequence == 2
+ db.clear()
+ db.load(filename)
+ assert db.objects[thing.id].name == 'After compaction'
+ db.clear()
+
+def test_unfinished_compaction(tmpdir):
+ """Checkpoints which are already in the dump are skipped."""
+ filename = fresh(tmpdir)
+ thing = BaseObject('Old name')
+ db.checkpoint()
+ thing.name = 'New name'
+ db.dump(filename)
+ with open(db.journal.old_filename, 'w') as f:
+  old = thing.dump()
+  old[1]['properties']['name'] = 'Old name'
+  f.write(json.dumps(dict(sequence = 1, objects = [old])) + '\n')
+ db.clear()
+ db.load(filename)
+ assert db.objects[thing.id].name == 'New name'
+ db.clear()
+
+def test_partial_line(tmpdir):
+ j = Journal(str(tmpdir.join('partial.json')))
+ j.write(dict(objects = []), sync = False)
+ j.close()
+ with open(j.filename, 'a') as f:
+  f.write('{"sequence": 2, "obj')
+ assert [r['sequence'] for r in j.records()] == [1]
+ j.write(dict(objects = []), sync = False)
+ j.close()
+ assert [r['sequence'] for r in j.records()] == [1, 2]
+
+def test_compact_when_big(tmpdir):
+ filename = fresh(tmpdir)
+ size = db.server_config['journal_max_size']
+ db.server_config['journal_max_size'] = 1
+ BaseObject('Big')
+ try:
+  db.checkpoint()
+ finally:
+  db.server_config['journal_max_size'] = size
+ with db.snapshot_lock: # Wait for the snapshot to finish.
+  pass
+ while snapshots.snapshotter.busy:
+  sleep(0.01)
+ assert not os.path.isfile(db.journal.filename)
+ with open(filename, 'r') as f:
+  assert json.load(f)['sequence'] == db.journal.sequence
+ db.clear()
+
+def test_failed_compaction(tmpdir, monkeypatch):
+ """If the dump which compacts the journal can't be written, the changes it took are checkpointed later."""
+ filename = fresh(tmpdir)
+ thing = BaseObject('Unsaved')
+ def write(header, records, filename):
+  raise IOError('Disk full.')
+ monkeypatch.setattr(db, 'write', write)
+ with pytest.raises(IOError):
+  db.dump(filename)
+ monkeypatch.undo()
+ assert db.checkpoint()
+ db.clear()
+ db.load(filename)
+ assert db.objects[thing.id].name == 'Unsaved'
+ db.clear()
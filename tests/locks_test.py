@@ -0,0 +1,129 @@
+import sys, threading, time
+
+sys.path.insert(0, '.')
+
+import locks
+
+class Place(object):
+ def __init__(self, name, location = None):
+  self.name = name
+  self.location = location
+ 
+ def title(self):
+  return self.name
+
+zone = Place('Zone')
+first, second = Place('First', zone), Place('Second', zone)
+
+def test_plan():
+ m = locks.LockManager()
+ assert [mode for lock, mode in m.plan(locks.ROOM, first, zone)] == [locks.IX, locks.IX, locks.X]
+ assert m.plan(locks.ROOM, first, zone)[-1][0] is m.lock_for(first)
+ assert [mode for lock, mode in m.plan(locks.ROOM, first)] == [locks.IX, locks.X]
+ assert m.plan(locks.ZONE, first, zone) == [(m.world, locks.IX), (m.lock_for(zone), locks.X)]
+ assert m.plan(locks.ZONE, first) == [(m.world, locks.X)]
+ assert m.plan(locks.WORLD, first, zone) == [(m.world, locks.X)]
+
+def hold_in_thread(m, scope, room, events):
+ """Hold scope in a new thread until events['release'] is set."""
+ def f():
+  with m.hold(scope, room, zone):
+   events['held'].set()
+   events['release'].wait()
+ t = threading.Thread(target = f)
+ t.start()
+ return t
+
+def test_rooms_in_parallel():
+ m = locks.LockManager()
+ events = dict(held = threading.Event(), release = threading.Event())
+ t = hold_in_thread(m, locks.ROOM, first, events)
+ assert events['held'].wait(1)
+ with m.hold(locks.ROOM, second, zone):
+  pass # Doesn't wait for first.
+ finished = []
+ def f():
+  with m.hold(locks.WORLD):
+   finished.append(True)
+ t2 = threading.Thread(target = f)
+ t2.start()
+ time.sleep(0.05)
+ assert not finished # Waiting for the room.
+ events['release'].set()
+ t.join(1)
+ t2.join(1)
+ assert finished
+ assert m.world.stats('World')['contended'] == 1
+ assert [s['name'] for s in m.stats()][0] == 'World'
+
+def test_nested():
+ m = locks.LockManager()
+ with m.hold(locks.WORLD):
+  with m.hold(locks.ROOM, first, zone):
+   assert m.world.held[locks.X] == 1
+   assert not m.lock_for(first).held[locks.X]
+ assert not any(m.world.held.values())
+
+def test_forget():
+ m = locks.LockManager()
+ lock = m.lock_for(first)
+ assert m.lock_for(first) is lock
+ m.forget(first)
+ assert m.lock_for(first) is not lock
+
+def test_shared():
+ m = locks.LockManager()
+ assert [mode for lock, mode in m.plan(locks.ROOM, first, zone, True)] == [locks.IS, locks.IS, locks.S]
+ assert m.plan(locks.WORLD, shared = True) == [(m.world, locks.S)]
+ assert m.plan(locks.NONE, first, zone) == []
+ events = dict(held = threading.Event(), release = threading.Event())
+ t = hold_in_thread(m, locks.ROOM, first, events)
+ assert events['held'].wait(1)
+ with m.hold(locks.NONE):
+  with m.hold(locks.ROOM, second, zone, True): # Readers of another room in the zone don't wait.
+   assert m.lock_for(second).held[locks.S] == 1
+ assert m.plan(locks.ZONE, first, zone, True)[1][0].available(locks.IS)
+ assert not m.lock_for(zone).available(locks.S) # Reading the whole zone would wait for the writer.
+ events['release'].set()
+ t.join(1)
+ assert not m.world.stats('World')['contended']
+ assert m.lock_for(zone).available(locks.S)
+
+def test_moved_while_waiting():
+ """A player who is moved while waiting for their room's lock gets the lock for the room they were moved to."""
+ m = locks.LockManager()
+ player = Place('Player', first)
+ events = dict(held = threading.Event(), release = threading.Event())
+ t = hold_in_thread(m, locks.ROOM, first, events)
+ assert events['held'].wait(1)
+ held = []
+ def f():
+  with m.hold_for(player, locks.ROOM):
+   held.append((m.lock_for(first).held[locks.X], m.lock_for(second).held[locks.X]))
+ t2 = threading.Thread(target = f)
+ t2.start()
+ time.sleep(0.05)
+ assert not held # Waiting for first.
+ player.location = second # Like a teleport which ran before the room was unlocked.
+ events['release'].set()
+ t.join(1)
+ t2.join(1)
+ assert held == [(0, 1)]
+ assert not any(m.lock_for(second).held.values())
+
+def test_always_moving():
+ """If the player keeps moving, the world is locked instead."""
+ m = locks.LockManager()
+ class Restless(Place):
+  @property
+  def location(self):
+   self.moves += 1
+   return first if self.moves % 2 else second
+  @location.setter
+  def location(self, value):
+   self.moves = 0
+ player = Restless('Restless')
+ with m.hold_for(player, locks.ROOM):
+  assert m.world.held[locks.X] == 1
+  assert not m.lock_for(first).held[locks.X]
+ assert not any(m.world.held.values())
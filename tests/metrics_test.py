@@ -0,0 +1,46 @@
+import sys, json, random
+
+sys.path.insert(0, '.')
+
+import metrics
+
+def test_histogram():
+ h = metrics.Histogram()
+ assert h.percentile(0.99) == 0.0
+ values = [random.uniform(0.0001, 2.0) for x in range(10000)]
+ for value in values:
+  h.record(value)
+ values.sort()
+ for fraction in (0.5, 0.9, 0.99, 0.999):
+  exact = values[int(len(values) * fraction) - 1]
+  assert abs(h.percentile(fraction) - exact) <= exact / 2 ** h.precision + h.unit
+ assert h.percentile(1.0) == h.max == values[-1]
+ assert h.count == len(values)
+ assert abs(h.mean() - sum(values) / len(values)) < 0.000001
+
+def test_histogram_dump():
+ h = metrics.Histogram()
+ for value in (0.001, 0.002, 0.5):
+  h.record(value)
+ h2 = metrics.Histogram.load(json.loads(json.dumps(h.dump())))
+ assert h2.counts == h.counts
+ assert h2.percentile(0.5) == h.percentile(0.5)
+
+def test_record(tmpdir):
+ metrics.reset()
+ fast, slow = lambda obj: True, lambda obj: True
+ fast.name, slow.name = 'fast quick', 'slow'
+ for x in range(10):
+  metrics.record(fast, 0.0, 0.001)
+  metrics.record(slow, 0.01, 0.1, error = x == 0)
+ assert [s['name'] for s in metrics.top('p99')] == ['slow', 'fast']
+ assert metrics.top('total', 1)[0]['errors'] == 1
+ filename = str(tmpdir.join('metrics.json'))
+ metrics.dump(filename)
+ metrics.dump(filename)
+ with open(filename) as f:
+  lines = [json.loads(line) for line in f]
+ assert len(lines) == 2
+ assert lines[0]['commands']['fast']['calls'] == 10
+ metrics.reset()
+ assert not metrics.top('p99')
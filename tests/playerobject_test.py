@@ -5,7 +5,7 @@ sys.path.insert(0, '.')
 logger = logging.getLogger('Players Tests')
 
 from objects.players import PlayerObject
-import options, passwords
+import options, passwords, db
 
 p = PlayerObject('Test Player')
 
@@ -21,6 +21,13 @@ def test_authenticate():
  assert p.authenticate(uid, pwd)
  assert p.pwd != pwd
 
+def test_uid_index():
+ p.uid = 'indexed'
+ assert db.players_by_uid['indexed'] is p
+ p.uid = uid
+ assert 'indexed' not in db.players_by_uid
+ assert db.players_by_uid[uid] is p
+
 def test_dump():
  assert p.dump()
 
@@ -33,3 +40,19 @@ def test_notify_with_colour():
 def test_notify_without_colour():
  p.notify('This text should not be {bold_on}bold{bold_off}.')
 
+
+def test_command_history():
+ p = PlayerObject('History Player')
+ p.commands = ['look', 'say hello']
+ assert list(p.commands) == ['look', 'say hello']
+ assert 'commands' not in p.dump()[1]['properties']
+ db.server_config['save_command_history'] = True
+ try:
+  stuff = p.dump()[1]
+  assert stuff['properties']['commands'] == 'look\nsay hello'
+  p.commands = []
+  p.load(stuff)
+  assert list(p.commands) == ['look', 'say hello']
+ finally:
+  db.server_config['save_command_history'] = False
+  p.destroy()
@@ -0,0 +1,71 @@
+import sys, os, threading, time, pstats
+
+sys.path.insert(0, '.')
+
+import server, profiling
+
+def test_idle():
+ assert profiling.idle('doPoll')
+ assert profiling.idle("<method 'poll' of 'select.epoll' objects>")
+ assert not profiling.idle('do_command')
+
+def busy(seconds):
+ started = time.time()
+ while time.time() - started < seconds:
+  sum(range(100))
+
+def run_session(mode, tmpdir):
+ results = []
+ s = profiling.Session(mode, 10, str(tmpdir.join('test', 'profile')), results.extend)
+ s.running = True
+ s.loop_thread = -1 # There is no event loop in the tests.
+ if mode != profiling.MEMORY:
+  sampler = threading.Thread(target = s.sample)
+  sampler.start()
+ else:
+  profiling.tracemalloc.start()
+  s.stop_tracing = True
+  s.snapshot = profiling.tracemalloc.take_snapshot()
+ t = threading.Thread(target = s.call, args = (busy, 0.2), name = 'Busy')
+ t.start()
+ t.join()
+ s.running = False
+ if mode != profiling.MEMORY:
+  sampler.join()
+ s.finish()
+ return s, results
+
+def test_cpu(tmpdir):
+ s, results = run_session(profiling.CPU, tmpdir)
+ stats = pstats.Stats(s.filename + '.prof')
+ assert 'busy' in [name for filename, line, name in stats.stats]
+ assert any(line.startswith('busy (profiling_test.py') for line in results)
+ with open(s.filename + '.collapsed') as f:
+  assert f.readline().startswith('Busy;')
+
+def test_sample(tmpdir):
+ s, results = run_session(profiling.SAMPLE, tmpdir)
+ assert not os.path.exists(s.filename + '.prof')
+ assert any(line.startswith('busy (profiling_test.py') for line in results)
+
+def test_memory(tmpdir):
+ s, results = run_session(profiling.MEMORY, tmpdir)
+ assert os.path.exists(s.filename + '.txt')
+ assert results[1].startswith('Top')
+ assert not profiling.tracemalloc.is_tracing()
+
+def test_another_profiler(tmpdir, monkeypatch):
+ """If cProfile can't be enabled (like on Python 3.12 when another thread is being profiled), the task still runs and is only sampled."""
+ def enable(self):
+  raise ValueError('Another profiling tool is already active')
+ monkeypatch.setattr(profiling.cProfile.Profile, 'enable', enable)
+ s = profiling.Session(profiling.CPU, 10, str(tmpdir.join('profile')), None)
+ s.running = True
+ results = []
+ def f():
+  results.append((dict(s.active), profiling.local.profiling))
+ s.call(f)
+ assert results == [({threading.current_thread().ident: threading.current_thread().name}, True)]
+ assert not s.active and not profiling.local.profiling
+ assert s.unprofiled == 1
+ assert 'could not be profiled' in s.finish_cpu()[1]
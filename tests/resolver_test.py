@@ -0,0 +1,55 @@
+import sys
+
+sys.path.insert(0, '.')
+
+import server, resolver
+
+def test_cache():
+ c = resolver.Cache(2)
+ assert c.get('a') == (False, None)
+ c.set('a', 'A', 60)
+ c.set('b', None, 60)
+ assert c.get('a') == (True, 'A')
+ assert c.get('b') == (True, None)
+ c.set('c', 'C', 60)
+ assert c.get('a') == (False, None) # Least recently used.
+ assert c.get('b') == (True, None)
+ c.set('d', 'D', -1)
+ assert c.get('d') == (False, None) # Expired.
+
+def test_is_address():
+ assert resolver.is_address('127.0.0.1')
+ assert resolver.is_address('::1')
+ assert not resolver.is_address('localhost')
+
+def test_forward_address():
+ results = []
+ resolver.forward('10.0.0.1', results.append)
+ assert results == ['10.0.0.1']
+
+def test_reverse_cached():
+ resolver.reverse_cache.set('10.0.0.2', 'example.com', 60)
+ resolver.reverse_cache.set('10.0.0.3', None, 60)
+ results = []
+ resolver.reverse('10.0.0.2', results.append)
+ resolver.reverse('10.0.0.3', results.append)
+ assert results == ['example.com', '10.0.0.3']
+ assert resolver.cached('10.0.0.2') == 'example.com'
+
+def test_configured_size():
+ c = resolver.Cache()
+ size = resolver.db.server_config['dns_cache_size']
+ resolver.db.server_config['dns_cache_size'] = 1 # As if it had been loaded from the database after the cache was made.
+ try:
+  c.set('a', 'A', 60)
+  c.set('b', 'B', 60)
+ finally:
+  resolver.db.server_config['dns_cache_size'] = size
+ assert c.get('a') == (False, None)
+ assert c.get('b') == (True, 'B')
+
+def test_cached_counts_one_miss(monkeypatch):
+ monkeypatch.setattr(resolver.backend, 'call_from_thread', lambda *args, **kwargs: None)
+ misses = resolver.reverse_cache.misses
+ assert resolver.cached('10.0.0.4') is None
+ assert resolver.reverse_cache.misses == misses + 1
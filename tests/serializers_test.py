@@ -0,0 +1,99 @@
+import sys, os, io, json, pytest
+
+sys.path.insert(0, '.')
+
+import server, db, serializers
+from serializers import Encoder, Decoder
+from objects import *
+
+values = [None, True, False, 0, 1, -1, 63, -64, 200, -200, 2 ** 70, -2 ** 70, 0.5, -1e100, '', 'Hello', 'Caf\xe9 ☺', [], {}, [1, 'two', [3.0, None]], {'a': {'b': ['a', 'b', 'a']}}, 'x' * 300]
+
+def test_round_trip():
+ for value in values:
+  e = Encoder()
+  e.encode(value)
+  d = Decoder(bytes(e.buffer))
+  assert d.decode() == value
+  assert d.position == len(e.buffer)
+ e = Encoder()
+ e.encode((1, 2))
+ assert Decoder(bytes(e.buffer)).decode() == [1, 2]
+ with pytest.raises(TypeError):
+  Encoder().encode(object())
+
+def test_string_table():
+ e = Encoder()
+ e.encode(['A long message which is repeated.'] * 10)
+ assert len(e.buffer) < 60
+ assert Decoder(bytes(e.buffer)).decode() == ['A long message which is repeated.'] * 10
+
+def test_serializers(tmpdir):
+ stuff = dict(objects = [['BaseObject', dict(id = 1, properties = dict(name = 'Thing'))]], next_id = 2)
+ for name, serializer in serializers.serializers.items():
+  filename = str(tmpdir.join('test' + serializer.extensions[0]))
+  assert serializers.for_filename(filename) is serializer
+  with open(filename, serializer.mode('w')) as f:
+   serializer.dump(stuff, f)
+  assert serializers.detect(filename) is serializer
+  with open(filename, serializer.mode('r')) as f:
+   assert serializer.load(f) == stuff
+ assert serializers.for_filename('DB.txt') is serializers.serializers['json']
+ assert serializers.for_filename('DB.json', 'binary') is serializers.serializers['binary']
+ with pytest.raises(ValueError):
+  serializers.serializers['binary'].load(io.BytesIO(b'{}'))
+
+def test_binary_database(tmpdir):
+ filename = str(tmpdir.join('db.lmb'))
+ db.clear()
+ room = RoomObject('Binary Room')
+ thing = BaseObject('Binary Thing')
+ thing.move(room)
+ db.dump(filename)
+ assert serializers.detect(filename) is serializers.serializers['binary']
+ db.clear()
+ db.load(filename)
+ thing = db.objects[thing.id]
+ assert thing.name == 'Binary Thing' and thing.location.name == 'Binary Room'
+ db.clear()
+
+def test_streaming(monkeypatch):
+ monkeypatch.setattr(serializers, 'chunk_size', 7) # Make values cross the ends of chunks.
+ header = dict(next_id = 123456789, server_config = dict(name = 'Test', limits = [1.5, None, True]))
+ records = [['BaseObject', dict(id = x, properties = dict(name = 'Object %s' % x, description = 'Shared description'))] for x in range(50)]
+ for name, serializer in serializers.serializers.items():
+  f = io.BytesIO() if serializer.binary else io.StringIO()
+  assert serializer.write(f, header, (r for r in records)) == len(records)
+  f.seek(0)
+  found = list(serializer.read(f))
+  assert found == list(header.items()) + [('objects', r) for r in records]
+  f.seek(0)
+  assert serializer.load(f) == dict(header, objects = records)
+
+def test_whole_documents(monkeypatch):
+ """Files with the objects first, or with a counted list of objects, can still be read."""
+ monkeypatch.setattr(serializers, 'chunk_size', 5)
+ stuff = dict(objects = [['BaseObject', dict(id = 1)], ['RoomObject', dict(id = 2)]], next_id = 3)
+ f = io.StringIO(json.dumps(stuff, indent = 1))
+ assert serializers.serializers['json'].load(f) == stuff
+ assert serializers.serializers['json'].load(io.StringIO('{}')) == {}
+ e = Encoder()
+ e.buffer += serializers.MAGIC
+ e.encode(stuff)
+ assert serializers.serializers['binary'].load(io.BytesIO(bytes(e.buffer))) == stuff
+ with pytest.raises(ValueError):
+  serializers.serializers['binary'].load(io.BytesIO(bytes(e.buffer[:-3])))
+ with pytest.raises(ValueError):
+  serializers.serializers['json'].load(io.StringIO(json.dumps(stuff)[:-3]))
+
+def test_copy_dumps(tmpdir):
+ db.clear()
+ thing = BaseObject('Copied')
+ for copy in (False, True):
+  db.server_config['copy_dumps'] = copy
+  for extension in ('.json', '.lmb'):
+   filename = str(tmpdir.join('copy%s%s' % (copy, extension)))
+   assert db.dump(filename)['objects'] == len(db.objects)
+   with open(filename, serializers.detect(filename).mode('r')) as f:
+    assert [y['id'] for x, y in serializers.detect(filename).load(f)['objects']] == [thing.id]
+ db.server_config['copy_dumps'] = False
+ thing.destroy()
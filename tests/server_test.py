@@ -3,6 +3,9 @@ import sys, pytest
 sys.path.insert(0, '.')
 
 import server
+from twisted.internet.task import Clock
+from twisted.internet.error import ConnectionDone
+from twisted.python.failure import Failure
 
 def test_server_name():
  assert server.server_name()
@@ -21,3 +24,182 @@ def test_clear_config():
  server.clear_config('test')
  with pytest.raises(KeyError):
   server.get_config('test')
+
+class FakeHost(object):
+ host = '127.0.0.1'
+ port = 4000
+
+class FakeTransport(object):
+ hostname = '127.0.0.1'
+ 
+ def __init__(self, protocol = None):
+  self.protocol = protocol
+  self.written = []
+  self.connected = True
+  self.aborted = False
+ 
+ def write(self, data):
+  self.written.append(data)
+ 
+ def loseConnection(self):
+  self.connected = False
+ 
+ def abortConnection(self):
+  self.aborted = True
+  self.connected = False
+ 
+ def getHost(self):
+  return FakeHost()
+
+def connect():
+ """Return a protocol which has made a connection, but hasn't logged in yet."""
+ p = server.ServerProtocol()
+ p.transport = FakeTransport(p)
+ p.tries = 0
+ server.connections[p.transport] = None
+ return p
+
+def login(player):
+ """Return a protocol with player attached to it."""
+ p = connect()
+ p.attach(player)
+ assert player.transport is p.transport
+ return p
+
+def log_in_again(player):
+ """Return a protocol which is taking player over from its current connection."""
+ p = connect()
+ p.post_login(player)
+ assert p.state == server.WAITING
+ p.take_over(player) # post_login schedules this on the event loop thread.
+ return p
+
+def disconnect(p):
+ p.connectionLost(Failure(ConnectionDone()))
+
+@pytest.fixture
+def clock(monkeypatch):
+ c = Clock()
+ monkeypatch.setattr(server.backend, 'clock', c)
+ return c
+
+def test_buffered_output():
+ p = server.ServerProtocol()
+ p.transport = FakeTransport()
+ p.hold_output()
+ p.sendLine('First line.')
+ p.sendLine('Second line.', True)
+ assert not p.transport.written
+ p.release_output()
+ p.flush()
+ assert p.transport.written == [b'First line.\r\nSecond line.\r\n']
+ assert not p.transport.connected
+
+def test_create_player(monkeypatch):
+ p = server.ServerProtocol()
+ p.transport = FakeTransport()
+ p.tries = 0
+ p.create_username()
+ for line in [b'creator', b'secret', b'secret', b'test creator']:
+  p.lineReceived(line)
+ assert p.state == server.CREATE_SEX
+ room = server.objects.RoomObject('Start Room')
+ server.db.objects_config['start_room'] = room
+ to_password = server.passwords.to_password
+ held = []
+ def hash(*args):
+  held.append(bool(getattr(server.locks.local, 'held', None)))
+  return to_password(*args)
+ monkeypatch.setattr(server.passwords, 'to_password', hash)
+ queued = []
+ monkeypatch.setattr(server.auth_pool, 'submit', lambda key, func, *args: queued.append((func, args)))
+ p.lineReceived(b'2')
+ assert p.state == server.WAITING
+ for func, args in queued:
+  func(*args)
+ assert held == [False] # Hashing doesn't lock the world.
+ del server.db.objects_config['start_room']
+ player = server.db.players_by_uid['creator']
+ assert player.location is room
+ assert player.name == 'Test Creator'
+ assert player.authenticate('creator', 'secret')
+ assert isinstance(player._pwd, str)
+ player.destroy()
+ room.destroy()
+
+def test_throttling():
+ server.db.server_config['command_limits']['NORMAL'] = [2, 1]
+ server.db.server_config['command_queue_length'] = 2
+ p = server.ServerProtocol()
+ p.transport = FakeTransport()
+ submitted = []
+ p.submit_line = submitted.append
+ try:
+  for x in range(5):
+   p.lineReceived(str(x))
+ finally:
+  server.db.server_config['command_limits']['NORMAL'] = [20, 5]
+  server.db.server_config['command_queue_length'] = 50
+ assert submitted == ['0', '1']
+ assert list(p.throttled_lines) == ['2', '3']
+ assert p.dropped == 1
+ assert p.throttle_call is not None
+ p.bucket.tokens = 2.0
+ p.throttle_call.cancel()
+ p.release_throttled()
+ assert submitted == ['0', '1', '2', '3']
+ assert p.throttle_call is None and not p.dropped
+
+def test_take_over(clock):
+ player = server.objects.PlayerObject('Taken over')
+ old = login(player)
+ new = log_in_again(player)
+ assert player.transport is old.transport
+ old.flush()
+ assert b'Redirecting' in b''.join(old.transport.written)
+ assert not old.transport.connected
+ assert new.state == server.WAITING
+ disconnect(old)
+ assert old.transport not in server.connections
+ assert player.transport is new.transport
+ assert server.connections[new.transport] is player
+ assert new.state == server.READY
+ assert not clock.getDelayedCalls() # The timeout was cancelled.
+ disconnect(new)
+ player.destroy()
+
+def test_take_over_timed_out(clock):
+ player = server.objects.PlayerObject('Stuck')
+ old = login(player)
+ new = log_in_again(player)
+ clock.advance(server.get_config('takeover_timeout') - 1)
+ assert player.transport is old.transport and not old.transport.aborted
+ clock.advance(1)
+ assert old.transport.aborted
+ assert server.connections[old.transport] is None
+ assert player.transport is new.transport
+ assert server.connections[new.transport] is player
+ disconnect(old) # Happens after the abort, and mustn't detach player from new.
+ assert player.transport is new.transport
+ disconnect(new)
+ player.destroy()
+
+def test_take_over_race(clock):
+ """A third connection gets the player first, so post_login goes round again and takes over from it."""
+ player = server.objects.PlayerObject('Popular')
+ old = login(player)
+ third = log_in_again(player)
+ new = log_in_again(player)
+ disconnect(old) # Third's Deferred fires first.
+ assert player.transport is third.transport
+ assert new.state == server.WAITING
+ new.take_over(player)
+ third.flush()
+ assert b'Redirecting' in b''.join(third.transport.written)
+ assert not third.transport.connected
+ disconnect(third)
+ assert player.transport is new.transport
+ assert new.state == server.READY
+ assert not clock.getDelayedCalls()
+ disconnect(new)
+ player.destroy()
@@ -0,0 +1,49 @@
+import sys, os, json, threading
+
+sys.path.insert(0, '.')
+
+import server, db
+from snapshots import Snapshotter
+from objects import *
+
+def test_dump_result(tmpdir):
+ filename = str(tmpdir.join('result.json'))
+ result = db.dump(filename)
+ assert result['filename'] == filename and result['objects'] == len(db.objects)
+ assert result['size'] == os.path.getsize(filename)
+ assert 0 <= result['paused'] <= result['duration']
+ assert not os.path.isfile(filename + '.tmp')
+
+def test_snapshot(tmpdir):
+ filename = str(tmpdir.join('snapshot.json'))
+ s = Snapshotter()
+ done = threading.Event()
+ results = []
+ def callback(result):
+  results.append(result)
+  done.set()
+ o = BaseObject('Captured')
+ with db.snapshot_lock: # Stop the snapshot from finishing.
+  assert s.start(filename, callback)
+  assert not s.start(filename) # Only one at a time.
+  assert s.stats()['busy']
+ assert done.wait(10)
+ assert results[0]['filename'] == filename
+ with open(filename, 'r') as f:
+  assert o.id in [y['id'] for x, y in json.load(f)['objects']]
+ stats = s.stats()
+ assert not stats['busy'] and stats['taken'] == 1 and stats['last'] is results[0]
+ assert stats['max_duration'] >= stats['average_pause']
+ o.destroy()
+
+def test_failure(tmpdir):
+ s = Snapshotter()
+ done = threading.Event()
+ results = []
+ def callback(result):
+  results.append(result)
+  done.set()
+ assert s.start(str(tmpdir.join('missing', 'snapshot.json')), callback)
+ assert done.wait(10)
+ assert isinstance(results[0], Exception)
+ assert s.stats()['failed'] == 1 and not s.stats()['busy']
@@ -0,0 +1,36 @@
+import sys
+
+sys.path.insert(0, '.')
+
+import suggest
+
+def command(name, access = 0):
+ f = lambda obj: None
+ f.name = name
+ f.access = access
+ return f
+
+def test_distance():
+ assert suggest.distance('', '') == 0
+ assert suggest.distance('kitten', 'sitting') == 3
+ assert suggest.distance('uptime', '@uptime') == 1
+ assert suggest.distance('abc', '') == 3
+
+def test_deletions():
+ assert suggest.deletions('abc', 0) == set(['abc'])
+ assert suggest.deletions('abc', 1) == set(['abc', 'bc', 'ac', 'ab'])
+ assert suggest.deletions('ab', 3) == set(['ab', 'a', 'b', ''])
+
+def test_suggest():
+ i = suggest.Index()
+ quit, uptime, shutdown, say = command('quit @quit'), command('@uptime'), command('@shutdown', 30), command('say " \'')
+ for f in [quit, uptime, shutdown, say]:
+  i.add(f)
+ assert i.suggest('@quti') == ['@quit']
+ assert i.suggest('uptime') == ['@uptime']
+ assert i.suggest('@shutdwon') == ['@shutdown']
+ assert i.suggest('@shutdwon', lambda f: f.access < 30) == []
+ assert i.suggest('sya') == ['say']
+ assert i.suggest('x') == []
+ i.discard(uptime)
+ assert i.suggest('uptime') == []
@@ -0,0 +1,27 @@
+import sys, zlib
+
+sys.path.insert(0, '.')
+
+import telnet
+
+def test_command():
+ assert telnet.command(telnet.WILL, telnet.COMPRESS2) == b'\xff\xfbV'
+
+def test_parser():
+ p = telnet.Parser()
+ assert p.feed(b'hello\r\n') == (b'hello\r\n', [])
+ assert p.feed(b'he\xff\xfdVllo') == (b'hello', [(telnet.DO, telnet.COMPRESS2)])
+ assert p.feed(b'a\xff') == (b'a', [])
+ assert p.feed(b'\xfe') == (b'', [])
+ assert p.feed(b'\x18b') == (b'b', [(telnet.DONT, 24)])
+ assert p.feed(b'\xff\xff\xff\xfa\x18\x00xterm\xff\xf0c') == (b'\xffc', [])
+
+def test_compressor():
+ c = telnet.Compressor(6)
+ d = zlib.decompressobj()
+ text = b'You see nothing special.\r\n' * 20
+ assert d.decompress(c.compress(text)) == text
+ assert d.decompress(c.compress(b'More.\r\n')) == b'More.\r\n'
+ assert c.ratio() < 1.0
+ d.decompress(c.finish())
+ assert d.eof
@@ -0,0 +1,43 @@
+import sys
+
+sys.path.insert(0, '.')
+
+import throttle, db
+from objects.players import NORMAL, BUILDER, WIZARD
+
+def test_bucket():
+ b = throttle.TokenBucket(3, 10)
+ assert [b.take() for x in range(4)] == [True, True, True, False]
+ assert 0 < b.delay() <= 0.1
+ b.tokens = 0.5
+ b.last -= 0.05
+ assert b.take()
+ assert not b.take()
+
+def test_unlimited():
+ for burst, rate in [(0, 0), (5, 0), (0, 5)]:
+  b = throttle.TokenBucket(burst, rate)
+  assert all(b.take() for x in range(100))
+  assert b.delay() == 0.0
+
+def test_configure():
+ b = throttle.TokenBucket(10, 1)
+ b.configure(2, 1)
+ assert b.tokens == 2.0
+ b.configure(20, 1)
+ assert b.tokens <= 3.0
+
+def test_configure_from_unlimited():
+ """A connection which is given limits after having none (like a wizard being demoted) starts with a full bucket."""
+ b = throttle.TokenBucket(0, 0)
+ b.configure(3, 1)
+ assert [b.take() for x in range(4)] == [True, True, True, False]
+
+def test_limits():
+ assert throttle.limits(NORMAL) == tuple(db.server_config['command_limits']['NORMAL'])
+ assert throttle.limits(WIZARD) == (0, 0)
+ limits = db.server_config['command_limits'].pop('BUILDER')
+ try:
+  assert throttle.limits(BUILDER) == throttle.limits(NORMAL)
+ finally:
+  db.server_config['command_limits']['BUILDER'] = limits
@@ -0,0 +1,53 @@
+import sys
+
+sys.path.insert(0, '.')
+
+import timers
+
+def test_fire():
+ w = timers.Wheel(slots = 8)
+ fired = []
+ t = w.timer(3, fired.append, 'fired')
+ assert t.active()
+ w.tick(2)
+ assert not fired
+ w.tick()
+ assert fired == ['fired']
+ assert not t.active()
+ assert w.stats()['live'] == 0
+
+def test_rounds():
+ w = timers.Wheel(slots = 4)
+ fired = []
+ w.timer(10, fired.append, 1)
+ w.tick(9)
+ assert not fired
+ w.tick()
+ assert fired == [1]
+
+def test_reset():
+ w = timers.Wheel(slots = 8)
+ fired = []
+ t = w.timer(2, fired.append, 1)
+ w.tick()
+ t.reset()
+ w.tick()
+ assert not fired
+ w.tick()
+ assert fired == [1]
+ t.reset(1)
+ assert w.stats()['live'] == 1
+ w.tick()
+ assert fired == [1, 1]
+
+def test_cancel():
+ w = timers.Wheel(slots = 8)
+ fired = []
+ t = w.timer(1, fired.append, 1)
+ t.cancel()
+ t.cancel()
+ w.tick(8)
+ assert not fired
+ stats = w.stats()
+ assert stats['cancelled'] == 1
+ assert stats['live'] == 0
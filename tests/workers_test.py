@@ -0,0 +1,82 @@
+import sys, threading
+
+sys.path.insert(0, '.')
+
+from workers import WorkerPool
+
+def test_unstarted():
+ p = WorkerPool(2)
+ results = []
+ p.submit('key', results.append, 1)
+ assert results == [1]
+
+def test_ordering():
+ p = WorkerPool(4)
+ p.start()
+ results = {}
+ done = threading.Event()
+ def f(key, value):
+  results.setdefault(key, []).append(value)
+  if sum(len(x) for x in results.values()) == 400:
+   done.set()
+ for x in range(100):
+  for key in 'abcd':
+   p.submit(key, f, key, x)
+ assert done.wait(10)
+ for key in 'abcd':
+  assert results[key] == list(range(100))
+ stats = p.stats()
+ assert stats['completed'] == 400
+ assert stats['pending'] == 0
+ p.stop()
+
+def test_errors():
+ p = WorkerPool(1)
+ p.start()
+ done = threading.Event()
+ def f():
+  raise RuntimeError('Testing.')
+ p.submit('key', f)
+ p.submit('key', done.set)
+ assert done.wait(10)
+ assert p.stats()['errors'] == 1
+ p.stop()
+
+def test_discard():
+ p = WorkerPool(1)
+ p.start()
+ release = threading.Event()
+ results = []
+ p.submit('key', release.wait)
+ p.submit('key', results.append, 1)
+ p.discard('key')
+ assert not p.depth('key')
+ release.set()
+ p.stop()
+ assert not results
+
+def test_outstanding():
+ p = WorkerPool(1)
+ p.start()
+ release, started = threading.Event(), threading.Event()
+ p.submit('key', lambda: (started.set(), release.wait()))
+ p.submit('key', lambda: None)
+ assert started.wait(1)
+ assert p.depth('key') == 1
+ assert p.outstanding('key') == 2
+ release.set()
+ p.stop()
+
+def test_discard_then_submit():
+ """A key which is discarded and submitted again while one of its tasks is executing still gets its new tasks executed."""
+ p = WorkerPool(1)
+ p.start()
+ release, started, done = threading.Event(), threading.Event(), threading.Event()
+ p.submit('key', lambda: (started.set(), release.wait()))
+ assert started.wait(1)
+ p.submit('key', lambda: None)
+ p.discard('key')
+ p.submit('key', done.set)
+ release.set()
+ assert done.wait(5)
+ p.stop()
@@ -0,0 +1,58 @@
+import sys, time
+
+sys.path.insert(0, '.')
+
+import world
+
+def test_not_running():
+ w = world.World(10)
+ assert w.submit(None, lambda x: x * 2, 4) == 8
+ assert not w.pending()
+
+def test_tick():
+ w = world.World(10)
+ w.running = True # Queue intents without starting the thread.
+ applied = []
+ def fail():
+  raise RuntimeError('Testing.')
+ w.submit('a', applied.append, 1)
+ w.submit('b', applied.append, 2)
+ w.submit('b', fail)
+ w.submit('a', applied.append, 3)
+ w.discard('b')
+ assert w.pending() == 2
+ w.submit('b', fail)
+ w.tick()
+ assert applied == [1, 3]
+ s = w.stats()
+ assert s['ticks'] == 1 and s['applied'] == 3 and s['errors'] == 1 and s['max_batch'] == 3
+ assert s['budget'] == 0.1
+ w.tick()
+ assert w.stats()['average_batch'] == 1.5
+
+def test_thread():
+ w = world.World(100)
+ applied = []
+ w.start()
+ try:
+  w.submit(None, applied.append, 1)
+  for x in range(100):
+   if applied:
+    break
+   time.sleep(0.01)
+ finally:
+  w.stop()
+ assert applied == [1]
+ assert w.ticks >= 1
+
+def test_pending_for_key():
+ w = world.World(10)
+ w.running = True
+ w.submit('a', lambda: None)
+ w.submit('a', lambda: None)
+ w.submit('b', lambda: None)
+ assert w.pending('a') == 2 and w.pending() == 3
+ w.discard('b')
+ assert not w.pending('b')
+ w.tick()
+ assert not w.pending('a') and not w.keys
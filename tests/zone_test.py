@@ -11,3 +11,9 @@ def test_dump():
  assert z.dump()
 def test_load():
  z.load(z.dump()[1])
+
+def test_submit_reset(monkeypatch):
+ submitted = []
+ monkeypatch.setattr(server.pool, 'submit', lambda key, func: submitted.append((key, func)))
+ z.submit_reset()
+ assert submitted == [(z, z._reset)]
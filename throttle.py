@@ -0,0 +1,65 @@
+"""
+Command rate limiting.
+
+Each connection has a TokenBucket. A line can be executed straight away if there is a token to take, otherwise it has to wait for the bucket to refill. The size of the bucket (how many lines can be sent in a burst) and how quickly it refills depend on the access level of the connected player, and are set in server_config['command_limits'].
+"""
+
+import db, objects.players as players
+from time import time
+
+stats = dict(
+ queued = 0, # Lines which had to wait for a token.
+ dropped = 0, # Lines which were thrown away because too many were waiting.
+ throttled = 0, # The number of times a connection started being throttled.
+)
+
+class TokenBucket(object):
+ """A bucket which holds up to burst tokens, and gains rate tokens per second. If either is 0, the bucket never runs out."""
+ def __init__(self, burst, rate):
+  self.burst = burst
+  self.rate = rate
+  self.tokens = float(burst)
+  self.last = time() # When tokens was last brought up to date.
+ 
+ def configure(self, burst, rate):
+  """Change the size of the bucket and how fast it fills."""
+  if (burst, rate) != (self.burst, self.rate):
+   was_unlimited = self.unlimited()
+   self.refill()
+   self.burst = burst
+   self.rate = rate
+   if was_unlimited: # Tokens weren't being counted, so start with a full bucket.
+    self.tokens = float(burst)
+   else:
+    self.tokens = min(self.tokens, float(burst))
+ 
+ def unlimited(self):
+  return not (self.burst and self.rate)
+ 
+ def refill(self):
+  now = time()
+  if self.rate:
+   self.tokens = min(float(self.burst), self.tokens + (now - self.last) * self.rate)
+  self.last = now
+ 
+ def take(self):
+  """Take a token, returning True if there was one to take."""
+  if self.unlimited():
+   return True
+  self.refill()
+  if self.tokens >= 1:
+   self.tokens -= 1
+   return True
+  return False
+ 
+ def delay(self):
+  """Return the number of seconds until there will be a token to take."""
+  if self.unlimited():
+   return 0.0
+  self.refill()
+  return max(0.0, (1 - self.tokens) / self.rate)
+
+def limits(access):
+ """Return (burst, rate) for players with the given access level. Levels without limits of their own use the limits for NORMAL."""
+ config = db.server_config['command_limits']
+ return tuple(config.get(players.access_name(access)) or config.get('NORMAL') or (0, 0))
@@ -0,0 +1,139 @@
+"""
+A hashed timing wheel for timers which are reset or cancelled far more often than they fire, like login timeouts and zone resets.
+
+The wheel has a fixed number of slots, each holding a doubly linked list of timers, and moves on one slot every resolution seconds. A timer is created once and then moved between slots, so scheduling, resetting and cancelling a timer are O(1) and don't allocate anything.
+
+Timers can be reset or cancelled from any thread. Callbacks are called from the event loop thread.
+"""
+
+import logging, threading
+from backends import backend
+
+logger = logging.getLogger('Timers')
+
+class Timer(object):
+ """A timer on a Wheel. Create these with Wheel.timer."""
+ __slots__ = ['wheel', 'delay', 'callback', 'args', 'kwargs', 'rounds', 'prev', 'next']
+ def __init__(self, wheel, delay, callback, *args, **kwargs):
+  self.wheel = wheel
+  self.delay = delay # The default number of seconds to wait before calling callback.
+  self.callback = callback
+  self.args = args
+  self.kwargs = kwargs
+  self.rounds = 0 # The number of times the wheel must go round before this timer fires.
+  self.prev = None # The previous timer in the slot, or None if this timer isn't scheduled.
+  self.next = None
+ 
+ def active(self):
+  """Return True if this timer is waiting to fire."""
+  return self.prev is not None
+ 
+ def reset(self, delay = None):
+  """(Re)schedule this timer to fire after delay seconds, or after self.delay seconds if delay is None."""
+  self.wheel.schedule(self, self.delay if delay is None else delay)
+ 
+ def cancel(self):
+  """Stop this timer from firing. Does nothing if it isn't scheduled."""
+  self.wheel.unschedule(self)
+
+class Wheel(object):
+ """A hashed timing wheel."""
+ def __init__(self, slots = 512, resolution = 1.0):
+  self.resolution = resolution # The number of seconds between ticks.
+  self.slots = []
+  for x in range(slots):
+   head = Timer(self, None, None) # A sentinel which is never scheduled itself.
+   head.prev = head.next = head
+   self.slots.append(head)
+  self.position = 0 # The slot which was processed last.
+  self.lock = threading.Lock()
+  self.loop = None # The looping call which drives this wheel.
+  self.live = 0 # The number of timers waiting to fire.
+  self.max_live = 0 # The highest number of timers which have been waiting at once.
+  self.scheduled = 0 # The number of times a timer was scheduled or reset.
+  self.cancelled = 0 # The number of times a scheduled timer was cancelled.
+  self.fired = 0 # The number of timers which have fired.
+ 
+ def timer(self, delay, callback, *args, **kwargs):
+  """Create a timer which will call callback(*args, **kwargs) after delay seconds, and return it."""
+  t = Timer(self, delay, callback, *args, **kwargs)
+  self.schedule(t, delay)
+  return t
+ 
+ def _unlink(self, timer):
+  """Remove timer from its slot. The lock must be held."""
+  timer.prev.next = timer.next
+  timer.next.prev = timer.prev
+  timer.prev = timer.next = None
+  self.live -= 1
+ 
+ def schedule(self, timer, delay):
+  """Move timer so it fires after delay seconds."""
+  ticks = max(1, int(-(-delay // self.resolution)))
+  with self.lock:
+   if timer.prev is not None:
+    self._unlink(timer)
+   head = self.slots[(self.position + ticks) % len(self.slots)]
+   timer.rounds = (ticks - 1) // len(self.slots)
+   timer.prev = head.prev
+   timer.next = head
+   head.prev.next = timer
+   head.prev = timer
+   self.live += 1
+   self.max_live = max(self.live, self.max_live)
+   self.scheduled += 1
+ 
+ def unschedule(self, timer):
+  """Stop timer from firing."""
+  with self.lock:
+   if timer.prev is not None:
+    self._unlink(timer)
+    self.cancelled += 1
+ 
+ def tick(self, count = 1):
+  """Move the wheel on count slots, firing any timers which are due."""
+  due = []
+  with self.lock:
+   for x in range(count):
+    self.position = (self.position + 1) % len(self.slots)
+    head = self.slots[self.position]
+    timer = head.next
+    while timer is not head:
+     next = timer.next
+     if timer.rounds:
+      timer.rounds -= 1
+     else:
+      self._unlink(timer)
+      due.append(timer)
+     timer = next
+   self.fired += len(due)
+  for timer in due:
+   try:
+    timer.callback(*timer.args, **timer.kwargs)
+   except Exception as e:
+    logger.critical('While firing timer %s, the following exception was raised:', timer.callback)
+    logger.exception(e)
+ 
+ def start(self):
+  """Start ticking. Must be called from the event loop thread."""
+  self.loop = backend.looping_call(self.resolution, self.tick)
+  logger.info('Timing wheel started with %s slots of %s second%s.', len(self.slots), self.resolution, '' if self.resolution == 1 else 's')
+ 
+ def stop(self):
+  """Stop ticking."""
+  if self.loop is not None:
+   self.loop.stop()
+  self.loop = None
+ 
+ def stats(self):
+  """Return a dictionary of statistics about this wheel."""
+  with self.lock:
+   return dict(
+    live = self.live,
+    max_live = self.max_live,
+    scheduled = self.scheduled,
+    cancelled = self.cancelled,
+    fired = self.fired,
+   )
+
+wheel = Wheel() # The wheel used by the server.
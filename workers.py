@@ -0,0 +1,157 @@
+"""
+Worker threads.
+
+A WorkerPool runs a fixed number of threads which execute tasks submitted for a key (the server uses the connection's protocol). Tasks for the same key are executed one at a time in the order they were submitted, while tasks for different keys run in parallel. Keys with pending work are served round-robin, so one busy key cannot hog the pool.
+
+A pool with no threads passes its tasks to the event loop thread instead, so they are executed in the order they were submitted without any threads at all.
+"""
+
+import logging, threading
+from backends import backend
+from collections import deque
+from time import time
+
+logger = logging.getLogger('Workers')
+
+local = threading.local() # Information about the task the current thread is executing.
+
+def current_wait():
+ """Return the number of seconds the task being executed by this thread waited in the queue, or 0.0 if this thread is not executing a queued task. The world loop sets this too."""
+ return getattr(local, 'wait', 0.0)
+
+class WorkerPool(object):
+ """A fixed-size pool of threads with a FIFO queue per key."""
+ def __init__(self, size, name = 'Worker'):
+  self.size = size # The number of threads to start.
+  self.name = name # Used to name threads.
+  self.threads = []
+  self.running = False
+  self.queues = {} # key: deque of pending tasks.
+  self.ready = deque() # Keys with pending tasks which are not being executed right now.
+  self.busy = set() # Keys which have a task executing right now.
+  self.condition = threading.Condition()
+  self.submitted = 0 # The number of tasks submitted.
+  self.started = 0 # The number of tasks which have left the queue.
+  self.completed = 0 # The number of tasks which have finished.
+  self.errors = 0 # The number of tasks which raised an exception.
+  self.pending = 0 # The number of tasks waiting to be executed.
+  self.max_pending = 0 # The highest number of tasks which have been waiting at once.
+  self.total_wait = 0.0 # The total number of seconds tasks have spent in the queue.
+  self.max_wait = 0.0 # The longest a task has waited in the queue.
+ 
+ def start(self):
+  """Start the worker threads."""
+  with self.condition:
+   if self.running:
+    return logger.warning('%s pool already started.', self.name)
+   self.running = True
+  if not self.size:
+   return logger.info('%s tasks will be executed on the event loop thread.', self.name)
+  for x in range(self.size):
+   t = threading.Thread(target = self.work, name = '%s %s' % (self.name, x + 1))
+   t.daemon = True
+   self.threads.append(t)
+   t.start()
+  logger.info('Started %s %s thread%s.', self.size, self.name.lower(), '' if self.size == 1 else 's')
+ 
+ def stop(self):
+  """Stop the worker threads once they have finished what they are doing. Pending tasks are discarded."""
+  with self.condition:
+   self.running = False
+   self.queues.clear()
+   self.ready.clear()
+   self.pending = 0
+   self.condition.notify_all()
+  self.threads = []
+ 
+ def submit(self, key, func, *args, **kwargs):
+  """Queue func(*args, **kwargs) to be called after every other task submitted for key. If the pool has not been started, func is called immediately. If the pool has no threads, func is called from the event loop thread."""
+  if not self.running:
+   return func(*args, **kwargs)
+  if not self.size:
+   return backend.call_from_thread(func, *args, **kwargs)
+  with self.condition:
+   queue = self.queues.get(key)
+   if queue is None:
+    queue = self.queues[key] = deque()
+   queue.append((time(), func, args, kwargs))
+   self.submitted += 1
+   self.pending += 1
+   self.max_pending = max(self.pending, self.max_pending)
+   if len(queue) == 1 and key not in self.busy:
+    self.ready.append(key)
+    self.condition.notify()
+ 
+ def discard(self, key):
+  """Throw away any tasks still waiting for key. A task which is already executing is left alone."""
+  with self.condition:
+   queue = self.queues.pop(key, None)
+   if queue:
+    self.pending -= len(queue)
+    queue.clear()
+    try:
+     self.ready.remove(key)
+    except ValueError:
+     pass # It's executing right now.
+ 
+ def depth(self, key):
+  """Return the number of tasks waiting for key."""
+  with self.condition:
+   return len(self.queues.get(key, ()))
+ 
+ def outstanding(self, key):
+  """Return the number of tasks for key which are waiting or executing."""
+  with self.condition:
+   return len(self.queues.get(key, ())) + (key in self.busy)
+ 
+ def work(self):
+  """The main loop for each worker thread."""
+  while True:
+   with self.condition:
+    while self.running and not self.ready:
+     self.condition.wait()
+    if not self.running:
+     return
+    key = self.ready.popleft()
+    queue = self.queues[key]
+    queued, func, args, kwargs = queue.popleft()
+    self.busy.add(key)
+    self.pending -= 1
+    self.started += 1
+    wait = time() - queued
+    self.total_wait += wait
+    self.max_wait = max(wait, self.max_wait)
+   local.wait = wait
+   try:
+    func(*args, **kwargs)
+   except Exception as e:
+    with self.condition:
+     self.errors += 1
+    logger.critical('While executing %s from the %s queue, the following exception was raised:', func, self.name.lower())
+    logger.exception(e)
+   finally:
+    local.wait = 0.0
+    with self.condition:
+     self.busy.discard(key)
+     self.completed += 1
+     queue = self.queues.get(key) # If key was discarded and submitted again while func was executing, this is a new queue.
+     if queue:
+      self.ready.append(key) # Go to the back of the line so other keys get a turn.
+      self.condition.notify()
+     elif queue is not None:
+      del self.queues[key]
+ 
+ def stats(self):
+  """Return a dictionary of statistics about this pool."""
+  with self.condition:
+   return dict(
+    threads = self.size,
+    keys = len(self.queues),
+    pending = self.pending,
+    max_pending = self.max_pending,
+    submitted = self.submitted,
+    completed = self.completed,
+    errors = self.errors,
+    average_wait = self.total_wait / self.started if self.started else 0.0,
+    max_wait = self.max_wait,
+   )
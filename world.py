@@ -0,0 +1,134 @@
+"""
+The world loop.
+
+Normally lines from connections are executed by the command worker pool, several at once, and zone resets are executed on the event loop thread. Nothing stops two of them changing the same objects at the same time.
+
+When the server is started with --tick-rate, everything which changes the world is handed to a World as an intent instead. A single world thread wakes up tick_rate times a second and applies every intent which arrived since the last tick, in the order they arrived. Only one intent runs at a time, so none of them need locks, at the cost of lines waiting up to one tick before they are executed.
+
+Tick durations are recorded so the time taken by the slowest ticks can be compared with the budget of 1 / tick_rate seconds.
+"""
+
+import logging, threading, options, metrics, workers
+from collections import deque
+from time import time, sleep
+
+logger = logging.getLogger('World')
+
+class World(object):
+ """Applies intents from a single thread at a fixed rate."""
+ def __init__(self, rate):
+  self.rate = rate # The number of ticks per second.
+  self.intents = deque() # (queued, key, func, args, kwargs) tuples waiting for the next tick.
+  self.lock = threading.Lock() # Used when changing self.intents or self.keys.
+  self.keys = {} # key: the number of intents for key which are waiting or being applied.
+  self.thread = None
+  self.running = False
+  self.ticks = 0
+  self.applied = 0 # The number of intents which have been applied.
+  self.errors = 0 # The number of intents which raised an exception.
+  self.overruns = 0 # The number of ticks which took longer than the budget.
+  self.max_batch = 0 # The most intents applied in a single tick.
+  self.durations = metrics.Histogram() # Seconds taken by each tick.
+ 
+ def budget(self):
+  """Return the number of seconds each tick is allowed to take."""
+  return 1.0 / self.rate
+ 
+ def start(self):
+  """Start the world thread."""
+  if self.running:
+   return logger.warning('World loop already started.')
+  self.running = True
+  self.thread = threading.Thread(target = self.run, name = 'World')
+  self.thread.daemon = True
+  self.thread.start()
+  logger.info('World loop started at %s ticks per second.', self.rate)
+ 
+ def stop(self):
+  """Stop the world thread once the current tick has finished. Pending intents are discarded."""
+  self.running = False
+  with self.lock:
+   self.intents.clear()
+   self.keys.clear()
+  self.thread = None
+ 
+ def submit(self, key, func, *args, **kwargs):
+  """Queue func(*args, **kwargs) to be applied on the next tick. Key is used by discard. If the world loop is not running, func is called immediately."""
+  if not self.running:
+   return func(*args, **kwargs)
+  with self.lock:
+   self.intents.append((time(), key, func, args, kwargs))
+   self.keys[key] = self.keys.get(key, 0) + 1
+ 
+ def discard(self, key):
+  """Throw away any intents still waiting for key."""
+  with self.lock:
+   self.intents = deque(intent for intent in self.intents if intent[1] is not key)
+   self.keys.pop(key, None)
+ 
+ def pending(self, key = None):
+  """Return the number of intents waiting for the next tick, or the number waiting or being applied for key if key is not None."""
+  with self.lock:
+   if key is None:
+    return len(self.intents)
+   return self.keys.get(key, 0)
+ 
+ def finished(self, key):
+  with self.lock:
+   if key in self.keys:
+    self.keys[key] -= 1
+    if not self.keys[key]:
+     del self.keys[key]
+ 
+ def run(self):
+  """The main loop for the world thread."""
+  next_tick = time()
+  while self.running:
+   next_tick += self.budget()
+   self.tick()
+   delay = next_tick - time()
+   if delay > 0:
+    sleep(delay)
+   else:
+    self.overruns += 1
+    next_tick = time() # Don't try to catch up, or one slow tick would cause a burst of them.
+ 
+ def tick(self):
+  """Apply every intent which has been submitted so far."""
+  started = time()
+  with self.lock:
+   batch, self.intents = self.intents, deque()
+  for queued, key, func, args, kwargs in batch:
+   workers.local.wait = started - queued
+   try:
+    func(*args, **kwargs)
+   except Exception as e:
+    self.errors += 1
+    logger.critical('While applying %s, the following exception was raised:', func)
+    logger.exception(e)
+   finally:
+    self.finished(key)
+  workers.local.wait = 0.0
+  self.ticks += 1
+  self.applied += len(batch)
+  self.max_batch = max(self.max_batch, len(batch))
+  self.durations.record(time() - started)
+ 
+ def stats(self):
+  """Return a dictionary of statistics about the world loop."""
+  return dict(
+   rate = self.rate,
+   budget = self.budget(),
+   ticks = self.ticks,
+   pending = self.pending(),
+   applied = self.applied,
+   errors = self.errors,
+   average_batch = float(self.applied) / self.ticks if self.ticks else 0.0,
+   max_batch = self.max_batch,
+   average = self.durations.mean(),
+   p99 = self.durations.percentile(0.99),
+   max = self.durations.max or 0.0,
+   overruns = self.overruns,
+  )
+
+loop = World(options.args.tick_rate)